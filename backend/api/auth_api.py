@@ -15,6 +15,7 @@ from core.auth_utils import (
 from datetime import datetime, timezone
 import logging
 import uuid
+from core.dashboard_metrics import dashboard_metrics
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 security = HTTPBearer()
@@ -125,6 +126,7 @@ async def register(
         }
         
         await db.users.insert_one(new_user)
+        await dashboard_metrics.increment(new_user["tenant_id"], total_users=1)
         logger.info(f"New user registered: {user_data.email} by admin {admin_user['email']}")
         
         # Return user without password
@@ -4,12 +4,20 @@ FastAPI router for regulatory change impact analysis
 """
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import logging
 import json
+import asyncio
+import uuid
 from core.change_impact_service_mongo import get_change_impact_service
 from core.auth_utils import get_current_user_from_token
+from core.dashboard_metrics import dashboard_metrics
+from core.delta_hunks import delta_hunk_text
+from core.gap_result_store import gap_result_store
+from core.run_memo import rows_digest, run_memo
+from core.score_matrix import SCORE_MATRIX_TOP_N
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/impact", tags=["change_impact"])
@@ -18,6 +26,16 @@ security = HTTPBearer()
 # Database will be injected
 db = None
 
+# Largest page GET /results/{run_id} serves
+MAX_RESULTS_PAGE_SIZE = 1000
+
+# Streaming /analyze: response media types, and gap result writes allowed in flight
+STREAM_MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'sse': 'text/event-stream'}
+MAX_PENDING_STREAM_WRITES = 4
+
+# Persistence tasks that outlive their streaming response
+_background_tasks = set()
+
 def set_database(database):
     """Set database instance"""
     global db
@@ -52,6 +70,258 @@ class IngestQSPRequest(BaseModel):
     sections: List[QSPSection]
 
 
+class IncrementalAnalyzeRequest(BaseModel):
+    run_id: str
+    document_number: Optional[str] = None  # e.g. "7.3-3"
+    doc_id: Optional[str] = None
+
+
+def _impact_identity(item: Dict[str, Any]) -> tuple:
+    """Identity of a (delta, QSP section) pair; equal identity means an unchanged result row"""
+    return (
+        item.get('delta_index'),
+        item.get('match_type'),
+        item.get('qsp_doc_id'),
+        item.get('qsp_section_key'),
+        item.get('qsp_content_hash')
+    )
+
+
+# Gap result row fields that aren't part of the analyzed impact: bookkeeping and reviewer state
+ROW_ONLY_FIELDS = (
+    'id', 'run_id', 'tenant_id', 'user_id', 'impact_index',
+    'is_reviewed', 'custom_rationale', 'created_at', 'updated_at'
+)
+
+
+def _gap_result_row(run_id: str, tenant_id: str, user_id: str, idx: int, impact: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the full gap result row for one impact of /analyze or
+    /analyze_full_hierarchy (normalized by gap_result_store on save)
+    """
+    from datetime import datetime, timezone
+    
+    row = {
+        'id': str(uuid.uuid4()),
+        'run_id': run_id,
+        'tenant_id': tenant_id,
+        'user_id': user_id,
+        'impact_index': idx,
+        'regulatory_clause': impact.get('regulatory_clause'),
+        'reg_clause': impact.get('reg_clause'),
+        'regulatory_doc': impact.get('regulatory_doc'),
+        'reg_title': impact.get('reg_title'),
+        'change_type': impact.get('change_type'),
+        'impact_level': impact.get('impact_level'),
+        'match_type': impact.get('match_type'),
+        'confidence': impact.get('confidence'),
+        'qsp_doc': impact.get('qsp_doc'),
+        'qsp_clause': impact.get('qsp_clause'),
+        'qsp_text': impact.get('qsp_text'),
+        'qsp_text_full': impact.get('qsp_text_full'),
+        'old_text': impact.get('old_text'),
+        'new_text': impact.get('new_text'),
+        'rationale': impact.get('rationale'),
+        'similarity_score': impact.get('similarity_score'),
+        'reference_context': impact.get('reference_context', ''),
+        'reference_line': impact.get('reference_line', 0),
+        'delta_index': impact.get('delta_index'),
+        'qsp_doc_id': impact.get('qsp_doc_id'),
+        'qsp_section_key': impact.get('qsp_section_key'),
+        'qsp_content_hash': impact.get('qsp_content_hash'),
+        'is_reviewed': False,  # Default to not reviewed
+        'custom_rationale': '',  # Empty by default
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+    if 'hierarchy_trace' in impact:
+        # Full hierarchy analysis
+        row.update({
+            'hierarchy_trace': impact.get('hierarchy_trace', {}),
+            'reasoning': impact.get('reasoning', {}),
+            'total_documents_affected': impact.get('total_documents_affected', 0)
+        })
+    else:
+        row['downstream_impacts'] = impact.get('downstream_impacts', {'forms': [], 'work_instructions': []})  # NEW: Save cascade data
+    return row
+
+
+def _impact_from_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """The analyzed impact a hydrated gap result row was built from, without reviewer state"""
+    return {field: value for field, value in row.items() if field not in ROW_ONLY_FIELDS}
+
+
+def _enrich_delta(delta: Dict[str, Any], diff_data: Dict[str, Any]):
+    """Add old/new text (limit to 1000 chars) and other metadata of the stored diff to a delta"""
+    delta['old_text'] = diff_data.get('old_text', '')[:1000] if diff_data.get('old_text') else ''
+    delta['new_text'] = diff_data.get('new_text', '')[:1000] if diff_data.get('new_text') else ''
+    delta['regulatory_doc'] = diff_data.get('regulatory_doc', 'ISO 14971:2020')
+    delta['reg_title'] = diff_data.get('reg_title', diff_data.get('title', ''))
+    # Hunks come from the diff's full text (stored, or derived for diffs stored
+    # before hunk_text existed), never from the truncated text above
+    delta['hunk_text'] = delta_hunk_text(diff_data)
+
+
+async def _memo_key(service, tenant_id: str, kind: str, deltas: List[Dict[str, Any]]) -> str:
+    """Run memo key of an analysis over the tenant's current QSP corpus"""
+    corpus_version = await service.get_corpus_version(tenant_id)
+    return run_memo.memo_key(
+        tenant_id, kind, deltas, corpus_version, service.impact_threshold, service.analysis_top_k,
+        service.delta_embedding_mode, service.hunk_weight
+    )
+
+
+async def _memoized_run(tenant_id: str, key: str) -> Optional[tuple]:
+    """
+    (stored response fields, impacts) of a memoized run, or None if unknown or
+    its rows changed; impacts are rebuilt from the run's rows in the shape the
+    analysis returned them, without reviewer edits
+    """
+    memo = await run_memo.lookup(tenant_id, key)
+    if memo is None:
+        return None
+    rows = await db.gap_results.find(
+        {'tenant_id': tenant_id, 'run_id': memo['run_id']},
+        {'_id': 0}
+    ).sort('impact_index', 1).to_list(length=None)
+    if rows_digest(rows) != memo.get('rows_digest'):
+        # Rows were patched (incremental analysis), replaced or removed since the run was memoized
+        await run_memo.forget(key)
+        return None
+    await gap_result_store.hydrate(tenant_id, rows)
+    logger.info(f"Reusing memoized run {memo['run_id']} ({len(rows)} impacts)")
+    return memo['response'], [_impact_from_row(row) for row in rows]
+
+
+def _stream_event(stream_format: str, event: str, data: Dict[str, Any]) -> str:
+    """Frame one event as an NDJSON line or a Server-Sent Event"""
+    if stream_format == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+    return json.dumps({'event': event, **data}, default=str) + "\n"
+
+
+async def _finish_gap_writes(tenant_id: str, run_id: str, writes: List[asyncio.Task]) -> int:
+    """Wait for a streamed run's gap result writes; returns the number of rows saved"""
+    results = await asyncio.gather(*writes, return_exceptions=True)
+    saved = 0
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error(f"Failed to persist gap results for run {run_id}: {result}")
+        else:
+            saved += result
+    if saved:
+        logger.info(f"Saved {saved} streamed gap results for run {run_id}")
+        await dashboard_metrics.update_parts(tenant_id, 'gaps')
+    return saved
+
+
+async def _stream_analysis(
+    tenant_id: str,
+    user_id: str,
+    deltas: List[Dict[str, Any]],
+    stream_format: str,
+    memo_key: str,
+    memoized: Optional[tuple] = None
+):
+    """
+    Emit a run event, one impacts event per delta as it completes and a final
+    summary (or error) event. Each delta's rows are written to gap_results in
+    the background while later deltas are analyzed; if the client disconnects,
+    analysis stops but rows already produced are still saved.
+    """
+    service = get_change_impact_service()
+
+    if memoized is not None:
+        response, impacts = memoized
+        run_id = response['run_id']
+        # Streamed impacts carry their row position
+        for impact_index, impact in enumerate(impacts):
+            impact['impact_index'] = impact_index
+        yield _stream_event(stream_format, 'run', {'run_id': run_id, 'total_deltas': len(deltas), 'memoized': True})
+        # Like a fresh run: one event per delta, including deltas without impacts
+        by_delta: Dict[int, List[Dict[str, Any]]] = {}
+        for impact in impacts:
+            by_delta.setdefault(impact.get('delta_index'), []).append(impact)
+        for delta_index in range(len(deltas)):
+            yield _stream_event(stream_format, 'impacts', {
+                'run_id': run_id,
+                'delta_index': delta_index,
+                'impacts': by_delta.get(delta_index, [])
+            })
+        yield _stream_event(stream_format, 'summary', {
+            'success': True,
+            'run_id': run_id,
+            'total_changes_analyzed': len(deltas),
+            'total_impacts_found': len(impacts),
+            'saved_results': len(impacts),
+            'summary': service._generate_summary(impacts),
+            'memoized': True
+        })
+        return
+
+    run_id = str(uuid.uuid4())
+    writes: List[asyncio.Task] = []
+    saved_rows: List[Dict[str, Any]] = []
+    summary = None
+    total_impacts = 0
+    error = None
+    finished = False
+
+    yield _stream_event(stream_format, 'run', {'run_id': run_id, 'total_deltas': len(deltas)})
+
+    try:
+        try:
+            async for delta_result in service.stream_with_cascade(tenant_id, deltas, run_id=run_id):
+                impacts = delta_result['impacts']
+                rows = []
+                for impact in impacts:
+                    impact['impact_index'] = total_impacts
+                    rows.append(_gap_result_row(run_id, tenant_id, user_id, total_impacts, impact))
+                    total_impacts += 1
+
+                saved_rows.extend({'impact_index': row['impact_index'], 'id': row['id']} for row in rows)
+                if rows:
+                    # Bound rows held by unfinished writes
+                    pending = [task for task in writes if not task.done()]
+                    if len(pending) >= MAX_PENDING_STREAM_WRITES:
+                        await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    writes.append(asyncio.create_task(gap_result_store.save(rows)))
+
+                summary = service._generate_summary(impacts, summary)
+                yield _stream_event(stream_format, 'impacts', delta_result)
+        except Exception as e:
+            logger.error(f"Streaming impact analysis failed for run {run_id}: {e}")
+            error = str(e)
+
+        saved = await _finish_gap_writes(tenant_id, run_id, writes)
+        finished = True
+
+        if error is None and saved == total_impacts:
+            await run_memo.record(tenant_id, memo_key, run_id, rows_digest(saved_rows), {
+                'success': True,
+                'run_id': run_id,
+                'total_impacts_found': total_impacts
+            })
+
+        if error is not None:
+            yield _stream_event(stream_format, 'error', {'run_id': run_id, 'detail': error, 'saved_results': saved})
+        else:
+            yield _stream_event(stream_format, 'summary', {
+                'success': True,
+                'run_id': run_id,
+                'total_changes_analyzed': len(deltas),
+                'total_impacts_found': total_impacts,
+                'saved_results': saved,
+                'summary': summary or service._generate_summary([])
+            })
+    finally:
+        if not finished:
+            # Client went away mid-stream: keep persisting what was produced
+            task = asyncio.create_task(_finish_gap_writes(tenant_id, run_id, writes))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+
 @router.post("/ingest_qsp")
 async def ingest_qsp_document(
     request: IngestQSPRequest,
@@ -109,6 +379,7 @@ async def ingest_qsp_document(
 @router.post("/analyze")
 async def analyze_change_impact(
     request: AnalyzeRequest,
+    stream: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
@@ -116,6 +387,11 @@ async def analyze_change_impact(
     Fetches full diff_results from MongoDB to get old/new regulatory text
     Saves results to gap_results collection for persistence
     
+    Query params:
+    - stream: 'ndjson' or 'sse' to stream each delta's impacts as soon as they
+      are computed ("run", "impacts" per delta, then "summary" or "error" events);
+      results are saved in the background
+    
     Request body:
     {
         "deltas": [
@@ -136,22 +412,17 @@ async def analyze_change_impact(
         if not request.deltas:
             raise HTTPException(status_code=400, detail="No deltas provided")
         
+        if stream is not None and stream not in STREAM_MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail="stream must be 'ndjson' or 'sse'")
+        
         logger.info(f"Analyzing {len(request.deltas)} regulatory changes for tenant {tenant_id}")
         
         # Convert Pydantic models to dicts
         deltas = [d.dict() for d in request.deltas]
         
         # Try to enrich deltas with full diff data from MongoDB
-        # Look for the most recent diff_result for this tenant
-        from motor.motor_asyncio import AsyncIOMotorClient
-        import os
-        mongo_url = os.environ.get('MONGO_URL')
-        db_name = os.environ.get('DB_NAME', 'compliance_checker')
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[db_name]
-        
         # Find most recent diff_result for this tenant
-        diff_result = await mongo_client[db_name].diff_results.find_one(
+        diff_result = await db.diff_results.find_one(
             {'tenant_id': tenant_id},
             sort=[('created_at', -1)]
         )
@@ -167,11 +438,22 @@ async def analyze_change_impact(
                 clause_id = delta.get('clause_id')
                 if clause_id in diff_lookup:
                     diff_data = diff_lookup[clause_id]
-                    # Add old/new text (limit to 1000 chars)
-                    delta['old_text'] = diff_data.get('old_text', '')[:1000] if diff_data.get('old_text') else ''
-                    delta['new_text'] = diff_data.get('new_text', '')[:1000] if diff_data.get('new_text') else ''
-                    delta['regulatory_doc'] = diff_data.get('regulatory_doc', 'ISO 14971:2020')
-                    delta['reg_title'] = diff_data.get('reg_title', diff_data.get('title', ''))
+                    _enrich_delta(delta, diff_data)
+        
+        # Same deltas against an unchanged corpus: reuse the stored run
+        memo_key = await _memo_key(service, tenant_id, 'cascade', deltas)
+        memoized = await _memoized_run(tenant_id, memo_key)
+        
+        if stream is not None:
+            return StreamingResponse(
+                _stream_analysis(tenant_id, current_user['id'], deltas, stream, memo_key, memoized),
+                media_type=STREAM_MEDIA_TYPES[stream],
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+        
+        if memoized is not None:
+            response, impacts = memoized
+            return {**response, 'impacts': impacts, 'memoized': True}
         
         # Use analyze_with_cascade to include downstream impacts (Forms/WIs)
         cascade_result = await service.analyze_with_cascade(
@@ -193,49 +475,22 @@ async def analyze_change_impact(
         }
         
         # Save results to gap_results collection for persistence
-        if impacts_list:
-            import uuid
-            from datetime import datetime, timezone
-            
+        gap_rows = [
+            _gap_result_row(run_id, tenant_id, current_user['id'], idx, impact)
+            for idx, impact in enumerate(impacts_list)
+        ]
+        if gap_rows:
             # Save each impact as a separate document for easy updates
-            for idx, impact in enumerate(impacts_list):
-                gap_result = {
-                    'id': str(uuid.uuid4()),
-                    'run_id': run_id,
-                    'tenant_id': tenant_id,
-                    'user_id': current_user['id'],
-                    'impact_index': idx,
-                    'regulatory_clause': impact.get('regulatory_clause'),
-                    'reg_clause': impact.get('reg_clause'),
-                    'change_type': impact.get('change_type'),
-                    'impact_level': impact.get('impact_level'),
-                    'qsp_doc': impact.get('qsp_doc'),
-                    'qsp_clause': impact.get('qsp_clause'),
-                    'qsp_text': impact.get('qsp_text'),
-                    'qsp_text_full': impact.get('qsp_text_full'),
-                    'old_text': impact.get('old_text'),
-                    'new_text': impact.get('new_text'),
-                    'rationale': impact.get('rationale'),
-                    'similarity_score': impact.get('similarity_score'),
-                    'downstream_impacts': impact.get('downstream_impacts', {'forms': [], 'work_instructions': []}),  # NEW: Save cascade data
-                    'is_reviewed': False,  # Default to not reviewed
-                    'custom_rationale': '',  # Empty by default
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                    'updated_at': datetime.now(timezone.utc).isoformat()
-                }
-                
-                # Upsert to avoid duplicates on re-run
-                await mongo_client[db_name].gap_results.update_one(
-                    {
-                        'tenant_id': tenant_id,
-                        'run_id': run_id,
-                        'impact_index': idx
-                    },
-                    {'$set': gap_result},
-                    upsert=True
-                )
+            await gap_result_store.save(gap_rows)
             
             logger.info(f"Saved {len(impacts_list)} gap results (with downstream impacts) to database")
+            await dashboard_metrics.update_parts(tenant_id, 'gaps')
+        
+        await run_memo.record(tenant_id, memo_key, run_id, rows_digest(gap_rows), {
+            'success': True,
+            'run_id': run_id,
+            'total_impacts_found': len(impacts_list)
+        })
         
         return result
         
@@ -246,6 +501,107 @@ async def analyze_change_impact(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/analyze_incremental")
+async def analyze_incremental(
+    request: IncrementalAnalyzeRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Patch a stored /analyze run after a single QSP revision was re-mapped
+    
+    Only (delta, section) pairs involving the revised document are recomputed.
+    Result rows whose pair is unchanged are left untouched, keeping reviewer
+    edits (is_reviewed, custom_rationale); rows that no longer apply are
+    deleted and new rows are inserted.
+    
+    Request body:
+    {
+        "run_id": "uuid-of-previous-run",
+        "document_number": "7.3-3"    # or "doc_id": "..."
+    }
+    """
+    try:
+        tenant_id = current_user["tenant_id"]
+        service = get_change_impact_service()
+        
+        if not request.doc_id and not request.document_number:
+            raise HTTPException(status_code=400, detail="Provide document_number or doc_id")
+        
+        doc_id = request.doc_id or service.stable_doc_id(tenant_id, request.document_number)
+        
+        result = await service.recompute_document_impacts(
+            tenant_id=tenant_id,
+            run_id=request.run_id,
+            doc_id=doc_id
+        )
+        
+        if not result.get('success'):
+            raise HTTPException(status_code=404, detail=result.get('error', 'Run not found'))
+        
+        existing = await db.gap_results.find(
+            {'tenant_id': tenant_id, 'run_id': request.run_id},
+            {'_id': 0}
+        ).to_list(length=None)
+        existing_by_identity = {_impact_identity(row): row for row in existing}
+        
+        kept_ids = set()
+        new_impacts = []
+        for delta_result in result['deltas']:
+            for impact in delta_result['impacts']:
+                row = existing_by_identity.get(_impact_identity(impact))
+                if row is not None:
+                    kept_ids.add(row['id'])
+                else:
+                    new_impacts.append(impact)
+        
+        stale_rows = [row for row in existing if row['id'] not in kept_ids]
+        if stale_rows:
+            await db.gap_results.delete_many({
+                'tenant_id': tenant_id,
+                'run_id': request.run_id,
+                'id': {'$in': [row['id'] for row in stale_rows]}
+            })
+        
+        # New rows take over freed positions first, then append after the last row
+        free_indices = sorted(row['impact_index'] for row in stale_rows)
+        next_index = max((row['impact_index'] for row in existing), default=-1) + 1
+        new_rows = []
+        for impact in new_impacts:
+            if free_indices:
+                idx = free_indices.pop(0)
+            else:
+                idx = next_index
+                next_index += 1
+            impact['downstream_impacts'] = await service.get_downstream_impacts(tenant_id, impact)
+            new_rows.append(_gap_result_row(request.run_id, tenant_id, current_user['id'], idx, impact))
+        if new_rows:
+            await gap_result_store.save(new_rows)
+        
+        if stale_rows or new_impacts:
+            await dashboard_metrics.update_parts(tenant_id, 'gaps')
+        
+        logger.info(
+            f"Incremental analysis of run {request.run_id}: {len(kept_ids)} kept, "
+            f"{len(stale_rows)} removed, {len(new_impacts)} added"
+        )
+        
+        return {
+            'success': True,
+            'run_id': request.run_id,
+            'doc_id': doc_id,
+            'rows_kept': len(kept_ids),
+            'rows_removed': len(stale_rows),
+            'rows_added': len(new_impacts),
+            'total_impacts_found': len(kept_ids) + len(new_impacts)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Incremental impact analysis failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/report/{run_id}")
 async def get_impact_report(
     run_id: str,
@@ -371,6 +727,92 @@ async def list_analysis_runs(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _validate_sweep_params(threshold: Optional[float], top_k: Optional[int]):
+    if threshold is not None and not 0.0 <= threshold <= 1.0:
+        raise HTTPException(status_code=400, detail="threshold must be between 0 and 1")
+    if top_k is not None and not 1 <= top_k <= SCORE_MATRIX_TOP_N:
+        raise HTTPException(status_code=400, detail=f"top_k must be between 1 and {SCORE_MATRIX_TOP_N}")
+
+
+@router.get("/runs/{run_id}/sweep")
+async def sweep_run_threshold(
+    run_id: str,
+    threshold: Optional[float] = None,
+    top_k: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Re-derive a run's matches at another threshold/top_k from its stored scores
+    Nothing is re-embedded or re-searched; omitted values default to the run's own
+    """
+    try:
+        tenant_id = current_user["tenant_id"]
+        _validate_sweep_params(threshold, top_k)
+        
+        result = await get_change_impact_service().sweep_run(tenant_id, run_id, threshold, top_k)
+        if not result.get('success'):
+            raise HTTPException(status_code=404, detail=result.get('error', 'Run not found'))
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Threshold sweep failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/runs/{run_id}/explain")
+async def explain_run_match(
+    run_id: str,
+    delta_index: int,
+    section_key: Optional[str] = None,
+    section_path: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    threshold: Optional[float] = None,
+    top_k: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Explain why a QSP section did or didn't match a delta of a run
+    
+    Query params:
+    - delta_index: Delta within the run
+    - section_key or section_path (optionally with doc_id): The section to explain
+    - threshold, top_k: Explain against other values than the run used
+    
+    Returns the section's score and rank plus a reason: matched, explicit_reference,
+    below_threshold, outside_top_k, not_referenced, no_embedding, not_in_corpus or no_score_data
+    """
+    try:
+        tenant_id = current_user["tenant_id"]
+        _validate_sweep_params(threshold, top_k)
+        
+        if not section_key and not section_path:
+            raise HTTPException(status_code=400, detail="Provide section_key or section_path")
+        
+        result = await get_change_impact_service().explain_match(
+            tenant_id=tenant_id,
+            run_id=run_id,
+            delta_index=delta_index,
+            section_key=section_key,
+            doc_id=doc_id,
+            section_path=section_path,
+            threshold=threshold,
+            top_k=top_k
+        )
+        if not result.get('success'):
+            raise HTTPException(status_code=404, detail=result.get('error', 'Run not found'))
+        
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Match explanation failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 
 @router.put("/update_result/{result_id}")
 async def update_gap_result(
@@ -384,16 +826,8 @@ async def update_gap_result(
     Used for persisting user's review work
     """
     try:
-        from motor.motor_asyncio import AsyncIOMotorClient
-        import os
-        
         tenant_id = current_user["tenant_id"]
         
-        mongo_url = os.environ.get('MONGO_URL')
-        db_name = os.environ.get('DB_NAME', 'compliance_checker')
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[db_name]
-        
         # Build update dict
         update_data = {}
         if is_reviewed is not None:
@@ -408,18 +842,22 @@ async def update_gap_result(
         from datetime import datetime, timezone
         update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
         
-        # Update in database
-        result = await db.gap_results.update_one(
+        # Update in database, reading the previous review state for the dashboard count
+        previous = await db.gap_results.find_one_and_update(
             {
                 'id': result_id,
                 'tenant_id': tenant_id  # Ensure tenant isolation
             },
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'_id': 0, 'is_reviewed': 1}
         )
         
-        if result.modified_count == 0:
+        if previous is None:
             raise HTTPException(status_code=404, detail="Gap result not found")
         
+        if is_reviewed is not None and bool(previous.get('is_reviewed')) != is_reviewed:
+            await dashboard_metrics.increment(tenant_id, total_reviewed=1 if is_reviewed else -1)
+        
         logger.info(f"Updated gap result {result_id} for tenant {tenant_id}")
         
         return {
@@ -438,32 +876,81 @@ async def update_gap_result(
 @router.get("/results/{run_id}")
 async def get_gap_results(
     run_id: str,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    impact_level: Optional[str] = None,
+    is_reviewed: Optional[bool] = None,
+    qsp_doc: Optional[str] = None,
+    reg_clause: Optional[str] = None,
+    fields: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
     """
     Get saved gap analysis results for a specific run
     Includes review status and custom rationales
+    
+    Query params (all optional; without limit every matching result is returned):
+    - limit: Page size (1-1000); pages follow impact_index order
+    - cursor: next_cursor of the previous page
+    - impact_level, qsp_doc, reg_clause: Comma-separated values to match
+    - is_reviewed: true/false
+    - fields: Comma-separated fields to return (id and impact_index always included)
     """
     try:
-        from motor.motor_asyncio import AsyncIOMotorClient
-        import os
-
         tenant_id = current_user["tenant_id"]
 
-        mongo_url = os.environ.get('MONGO_URL')
-        db_name = os.environ.get('DB_NAME', 'compliance_checker')
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[db_name]
+        if limit is not None and not 1 <= limit <= MAX_RESULTS_PAGE_SIZE:
+            raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_RESULTS_PAGE_SIZE}")
 
-        # Fetch all results for this run
-        results = await db.gap_results.find({
+        query: Dict[str, Any] = {
             'run_id': run_id,
             'tenant_id': tenant_id
-        }).sort('impact_index', 1).to_list(length=None)
-
-        if not results:
+        }
+        for field, value in (('impact_level', impact_level), ('qsp_doc', qsp_doc), ('reg_clause', reg_clause)):
+            if value:
+                values = [v.strip() for v in value.split(',') if v.strip()]
+                query[field] = values[0] if len(values) == 1 else {'$in': values}
+        if is_reviewed is not None:
+            query['is_reviewed'] = is_reviewed
+        filtered = len(query) > 2
+
+        # Keyset pagination: the cursor is the last impact_index returned
+        page_query = dict(query)
+        if cursor is not None:
+            try:
+                page_query['impact_index'] = {'$gt': int(cursor)}
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        projection = None
+        if fields:
+            requested = {f.strip() for f in fields.split(',') if f.strip()} | {'id', 'impact_index'}
+            projection = gap_result_store.projection(requested)
+
+        find = db.gap_results.find(page_query, projection).sort('impact_index', 1)
+        if limit is not None:
+            # One extra row tells whether another page follows
+            find = find.limit(limit + 1)
+        results = await find.to_list(length=None)
+
+        has_more = limit is not None and len(results) > limit
+        if has_more:
+            results = results[:limit]
+
+        if not results and cursor is None and not filtered:
             raise HTTPException(status_code=404, detail="No results found for this run")
 
+        # Rows reference section/delta text by content hash
+        await gap_result_store.hydrate(tenant_id, results)
+
+        if fields:
+            results = [{k: v for k, v in result.items() if k in requested} for result in results]
+
+        if limit is None and cursor is None:
+            total = len(results)
+        else:
+            total = await db.gap_results.count_documents(query)
+
         logger.info(f"Retrieved {len(results)} gap results for run {run_id}")
 
         # Convert ObjectId to string for JSON serialization
@@ -474,8 +961,9 @@ async def get_gap_results(
         return {
             'success': True,
             'run_id': run_id,
-            'total_impacts_found': len(results),
-            'impacts': results
+            'total_impacts_found': total,
+            'impacts': results,
+            'next_cursor': str(results[-1]['impact_index']) if has_more else None
         }
 
     except HTTPException:
@@ -518,10 +1006,6 @@ async def analyze_full_hierarchy(
     }
     """
     try:
-        from motor.motor_asyncio import AsyncIOMotorClient
-        import os
-        from datetime import datetime, timezone
-
         tenant_id = current_user["tenant_id"]
         service = get_change_impact_service()
 
@@ -534,11 +1018,7 @@ async def analyze_full_hierarchy(
         deltas = [d.dict() for d in request.deltas]
 
         # Enrich with diff data if available
-        mongo_url = os.environ.get('MONGO_URL')
-        db_name = os.environ.get('DB_NAME', 'compliance_checker')
-        mongo_client = AsyncIOMotorClient(mongo_url)
-
-        diff_result = await mongo_client[db_name].diff_results.find_one(
+        diff_result = await db.diff_results.find_one(
             {'tenant_id': tenant_id},
             sort=[('created_at', -1)]
         )
@@ -549,10 +1029,14 @@ async def analyze_full_hierarchy(
                 clause_id = delta.get('clause_id')
                 if clause_id in diff_lookup:
                     diff_data = diff_lookup[clause_id]
-                    delta['old_text'] = diff_data.get('old_text', '')[:1000] if diff_data.get('old_text') else ''
-                    delta['new_text'] = diff_data.get('new_text', '')[:1000] if diff_data.get('new_text') else ''
-                    delta['regulatory_doc'] = diff_data.get('regulatory_doc', 'ISO 14971:2020')
-                    delta['reg_title'] = diff_data.get('reg_title', diff_data.get('title', ''))
+                    _enrich_delta(delta, diff_data)
+
+        # Same deltas against an unchanged corpus: reuse the stored run
+        memo_key = await _memo_key(service, tenant_id, 'full_hierarchy', deltas)
+        memoized = await _memoized_run(tenant_id, memo_key)
+        if memoized is not None:
+            response, impacts = memoized
+            return {**response, 'impacts': impacts, 'memoized': True}
 
         # Run full hierarchy analysis
         result = await service.analyze_full_hierarchy(
@@ -561,50 +1045,24 @@ async def analyze_full_hierarchy(
         )
 
         # Save results to database
-        if result.get('success') and result.get('impacts'):
-            import uuid
-            run_id = result['run_id']
-
-            for idx, impact in enumerate(result['impacts']):
-                gap_result = {
-                    'id': str(uuid.uuid4()),
-                    'run_id': run_id,
-                    'tenant_id': tenant_id,
-                    'user_id': current_user['id'],
-                    'impact_index': idx,
-                    'regulatory_clause': impact.get('regulatory_clause'),
-                    'reg_clause': impact.get('reg_clause'),
-                    'change_type': impact.get('change_type'),
-                    'impact_level': impact.get('impact_level'),
-                    'match_type': impact.get('match_type'),
-                    'confidence': impact.get('confidence'),
-                    'qsp_doc': impact.get('qsp_doc'),
-                    'qsp_clause': impact.get('qsp_clause'),
-                    'qsp_text': impact.get('qsp_text'),
-                    'qsp_text_full': impact.get('qsp_text_full'),
-                    'old_text': impact.get('old_text'),
-                    'new_text': impact.get('new_text'),
-                    'rationale': impact.get('rationale'),
-                    'hierarchy_trace': impact.get('hierarchy_trace', {}),
-                    'reasoning': impact.get('reasoning', {}),
-                    'total_documents_affected': impact.get('total_documents_affected', 0),
-                    'is_reviewed': False,
-                    'custom_rationale': '',
-                    'created_at': datetime.now(timezone.utc).isoformat(),
-                    'updated_at': datetime.now(timezone.utc).isoformat()
-                }
-
-                await mongo_client[db_name].gap_results.update_one(
-                    {
-                        'tenant_id': tenant_id,
-                        'run_id': run_id,
-                        'impact_index': idx
-                    },
-                    {'$set': gap_result},
-                    upsert=True
-                )
+        gap_rows = [
+            _gap_result_row(result['run_id'], tenant_id, current_user['id'], idx, impact)
+            for idx, impact in enumerate(result.get('impacts', []))
+        ] if result.get('success') else []
+        if gap_rows:
+            await gap_result_store.save(gap_rows)
 
             logger.info(f"Saved {len(result['impacts'])} full hierarchy results to database")
+            await dashboard_metrics.update_parts(tenant_id, 'gaps')
+
+        if result.get('success'):
+            await run_memo.record(
+                tenant_id,
+                memo_key,
+                result['run_id'],
+                rows_digest(gap_rows),
+                {k: v for k, v in result.items() if k != 'impacts'}
+            )
 
         return result
 
@@ -632,16 +1090,8 @@ async def get_document_hierarchy(
     With their relationships for building a tree view.
     """
     try:
-        from motor.motor_asyncio import AsyncIOMotorClient
-        import os
-
         tenant_id = current_user["tenant_id"]
 
-        mongo_url = os.environ.get('MONGO_URL')
-        db_name = os.environ.get('DB_NAME', 'compliance_checker')
-        mongo_client = AsyncIOMotorClient(mongo_url)
-        db = mongo_client[db_name]
-
         # Fetch all hierarchy documents
         docs = await db.document_hierarchy.find({
             'tenant_id': tenant_id
@@ -4,7 +4,8 @@ Handles upload and processing of ISO, FDA, and other regulatory documents
 """
 import logging
 from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from typing import Iterator, Optional
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from core.auth import get_current_user
@@ -12,6 +13,7 @@ from core.rag_service import rag_service
 from core.audit_logger import audit_logger
 from models.regulatory import RegulatoryFramework
 import io
+import itertools
 from docx import Document as DocxDocument
 
 logger = logging.getLogger(__name__)
@@ -25,28 +27,33 @@ def set_database(database):
     global db
     db = database
 
-async def extract_text_from_file(file_content: bytes, filename: str) -> str:
-    """Extract text from uploaded file"""
+def iter_text_from_file(file_content: bytes, filename: str) -> Iterator[str]:
+    """
+    Extract text from uploaded file lazily, one page (PDF) or block of
+    paragraphs (DOCX) at a time, so large documents never exist as one string
+    """
     file_ext = filename.lower().split('.')[-1]
     
+    if file_ext == 'docx':
+        doc = DocxDocument(io.BytesIO(file_content))
+        paragraphs = doc.paragraphs
+        for start in range(0, len(paragraphs), 200):
+            yield '\n'.join(para.text for para in paragraphs[start:start + 200])
+    elif file_ext == 'pdf':
+        # Extract text from PDF using PyPDF2
+        import PyPDF2
+        pdf_file = io.BytesIO(file_content)
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        for page in pdf_reader.pages:
+            yield page.extract_text() + "\n"
+    else:
+        # txt, or try UTF-8 decode as fallback
+        yield file_content.decode('utf-8', errors='ignore')
+
+async def extract_text_from_file(file_content: bytes, filename: str) -> str:
+    """Extract text from uploaded file"""
     try:
-        if file_ext == 'docx':
-            doc = DocxDocument(io.BytesIO(file_content))
-            return '\n'.join([para.text for para in doc.paragraphs])
-        elif file_ext == 'pdf':
-            # Extract text from PDF using PyPDF2
-            import PyPDF2
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            text_content = ""
-            for page in pdf_reader.pages:
-                text_content += page.extract_text() + "\n"
-            return text_content
-        elif file_ext == 'txt':
-            return file_content.decode('utf-8', errors='ignore')
-        else:
-            # Try UTF-8 decode as fallback
-            return file_content.decode('utf-8', errors='ignore')
+        return '\n'.join(iter_text_from_file(file_content, filename))
     except Exception as e:
         logger.error(f"Text extraction failed for {filename}: {e}")
         raise HTTPException(status_code=400, detail=f"Could not extract text from {filename}: {str(e)}")
@@ -56,11 +63,16 @@ async def upload_regulatory_document(
     file: UploadFile = File(...),
     framework: str = Form(...),
     doc_name: Optional[str] = Form(None),
+    shared: bool = Form(False),
     current_user: dict = Depends(get_current_user)
 ):
     """
     Upload a regulatory document (ISO, FDA, MDR, etc.)
     Will be chunked and added to RAG system for compliance checking
+    
+    Documents are private to the tenant by default. Pass shared=true for
+    published standards: they go to the cross-tenant corpus, where a text
+    already embedded for another tenant is referenced, not re-embedded.
     """
     try:
         tenant_id = current_user["tenant_id"]
@@ -75,27 +87,40 @@ async def upload_regulatory_document(
         # Read file
         content = await file.read()
         
-        # Extract text
-        text_content = await extract_text_from_file(content, file.filename)
+        # Extract text lazily; read ahead only far enough to reject empty documents
+        pages = iter_text_from_file(content, file.filename)
+        head = []
+        head_chars = 0
+        try:
+            for page in pages:
+                head.append(page)
+                head_chars += len(page)
+                if head_chars >= 100:
+                    break
+        except Exception as e:
+            logger.error(f"Text extraction failed for {file.filename}: {e}")
+            raise HTTPException(status_code=400, detail=f"Could not extract text from {file.filename}: {str(e)}")
         
-        if len(text_content) < 100:
+        if head_chars < 100:
             raise HTTPException(status_code=400, detail="Document too short or could not extract text")
         
         # Generate doc_id
         import uuid
         doc_id = f"reg_{framework}_{str(uuid.uuid4())[:8]}"
         
-        # Add to RAG system
-        result = rag_service.add_regulatory_document(
+        # Add to RAG system (embedding runs in a worker thread, not on the event loop)
+        result = await run_in_threadpool(
+            rag_service.add_regulatory_document,
             tenant_id=tenant_id,
             doc_id=doc_id,
             doc_name=doc_name or file.filename,
-            content=text_content,
+            content=itertools.chain(head, pages),
             framework=framework,
             metadata={
                 'uploaded_by': user_id,
                 'filename': file.filename
-            }
+            },
+            shared=shared
         )
         
         # Store metadata in MongoDB
@@ -107,8 +132,10 @@ async def upload_regulatory_document(
             'filename': file.filename,
             'uploaded_by': user_id,
             'chunks_count': result['chunks_added'],
+            'chunks_failed': result['chunks_failed'],
+            'shared': result['shared'],
             'file_size': len(content),
-            'char_count': len(text_content)
+            'char_count': result['total_chars']
         }
         await db.regulatory_documents.insert_one(reg_doc_meta)
         
@@ -125,7 +152,10 @@ async def upload_regulatory_document(
             }
         )
         
-        logger.info(f"Uploaded regulatory doc: {file.filename} ({result['chunks_added']} chunks)")
+        logger.info(
+            f"Uploaded regulatory doc: {file.filename} ({result['chunks_added']} chunks"
+            f"{', deduplicated' if result.get('deduplicated') else ''})"
+        )
         
         return {
             'success': True,
@@ -133,7 +163,10 @@ async def upload_regulatory_document(
             'doc_name': doc_name or file.filename,
             'framework': framework,
             'chunks_added': result['chunks_added'],
-            'total_chars': result['total_chars']
+            'chunks_failed': result['chunks_failed'],
+            'failed_chunk_ids': result['failed_chunk_ids'],
+            'total_chars': result['total_chars'],
+            'shared': result['shared']
         }
         
     except HTTPException:
@@ -142,6 +175,114 @@ async def upload_regulatory_document(
         logger.error(f"Regulatory document upload failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/ingest-progress")
+async def get_ingest_progress(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Progress of regulatory documents currently being chunked and embedded
+    """
+    try:
+        tenant_id = current_user["tenant_id"]
+        in_progress = rag_service.get_ingest_progress(tenant_id)
+        
+        return {
+            'success': True,
+            'count': len(in_progress),
+            'ingestions': in_progress
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get ingest progress: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search-cache-stats")
+async def get_search_cache_stats(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Hit-rate metrics of the regulatory search result cache
+    Admin only: the cache is shared by every tenant
+    """
+    try:
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Admin access required")
+        
+        return {
+            'success': True,
+            'cache': rag_service.get_search_cache_stats()
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get search cache stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/index-profiles")
+async def get_index_profiles(
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Available HNSW index profiles and the one the tenant's collection uses
+    """
+    try:
+        tenant_id = current_user["tenant_id"]
+        return {
+            'success': True,
+            'profiles': rag_service.get_index_profiles(),
+            'tenant_profile': rag_service.resolve_index_profile(tenant_id),
+            'shared_profile': rag_service.resolve_index_profile(None)
+        }
+        
+    except Exception as e:
+        logger.error(f"Failed to get index profiles: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/index-profile")
+async def set_index_profile(
+    profile: str = Form(...),
+    scope: str = Form("tenant"),
+    rebuild: bool = Form(True),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Assign an index profile and rebuild affected collections with it
+    
+    scope is "tenant" (the caller's collection), or "framework:<name>" /
+    "shared" (affecting every tenant). Admin only: a rebuild copies the
+    whole collection.
+    """
+    try:
+        tenant_id = current_user["tenant_id"]
+        
+        if current_user.get("role") != "admin":
+            raise HTTPException(status_code=403, detail="Admin access required")
+        
+        if scope == "tenant":
+            scope = f"tenant:{tenant_id}"
+        
+        try:
+            result = await run_in_threadpool(rag_service.assign_index_profile, scope, profile, rebuild)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        await audit_logger.log_action(
+            tenant_id=tenant_id,
+            user_id=current_user["id"],
+            action="set_index_profile",
+            target=scope,
+            metadata=result
+        )
+        
+        return {'success': True, **result}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to set index profile: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/check-compliance")
 async def check_compliance(
     qsp_doc_id: str = Form(...),
@@ -481,45 +622,8 @@ async def get_chunking_quality_metrics(
                 'metrics': {}
             }
         
-        # Calculate metrics
-        total_chunks = sum(doc['chunk_count'] for doc in docs)
-        avg_chunks_per_doc = total_chunks // len(docs) if docs else 0
-        
-        # Get detailed chunk size distribution
-        from core.rag_service import rag_service as rag
-        collection_name = f"regulatory_{tenant_id}".replace("-", "_")
-        try:
-            collection = rag.chroma_client.get_collection(collection_name)
-            results = collection.get()
-            
-            chunk_lengths = [len(doc) for doc in results['documents']]
-            avg_chunk_length = sum(chunk_lengths) // len(chunk_lengths) if chunk_lengths else 0
-            min_chunk_length = min(chunk_lengths) if chunk_lengths else 0
-            max_chunk_length = max(chunk_lengths) if chunk_lengths else 0
-            
-            # Analyze section headers
-            section_headers = [meta.get('section_header', '') for meta in results['metadatas']]
-            unique_sections = len(set(h for h in section_headers if h))
-            
-            metrics = {
-                'total_documents': len(docs),
-                'total_chunks': total_chunks,
-                'avg_chunks_per_doc': avg_chunks_per_doc,
-                'avg_chunk_length': avg_chunk_length,
-                'min_chunk_length': min_chunk_length,
-                'max_chunk_length': max_chunk_length,
-                'unique_sections': unique_sections,
-                'documents': docs
-            }
-            
-        except Exception as e:
-            logger.warning(f"Could not get detailed metrics: {e}")
-            metrics = {
-                'total_documents': len(docs),
-                'total_chunks': total_chunks,
-                'avg_chunks_per_doc': avg_chunks_per_doc,
-                'documents': docs
-            }
+        # Registry-backed stats: O(documents), no chunk text is read
+        metrics = rag_service.get_chunking_stats(tenant_id)
         
         return {
             'success': True,
@@ -12,6 +12,7 @@ from core.reference_extractor import reference_extractor
 from core.traceability_engine import TraceabilityEngine
 from core.regulatory_knowledge_base import get_all_clauses, get_clauses_by_framework, get_clause_by_id
 from core.audit_logger import audit_logger
+from core.change_impact_service_mongo import bump_corpus_version
 from models.regulatory import (
     RegulatoryFramework, DocumentType, DocumentReference, 
     RegulatoryCitation, ComplianceMatrix, ImpactAnalysis
@@ -157,6 +158,8 @@ async def process_document_for_traceability(
             
             result = await db.document_references.insert_one(doc_ref.model_dump())
             ref_ids.append(str(result.inserted_id))
+        if ref_ids:
+            await bump_corpus_version(db, tenant_id)
         
         # Store regulatory citations
         cit_ids = []
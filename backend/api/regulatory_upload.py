@@ -13,6 +13,7 @@ from datetime import datetime
 from core.iso_diff_processor import get_iso_diff_processor
 from core.auth_utils import get_current_user_from_token
 from core.file_validator import validate_file_upload, sanitize_filename
+from core.dashboard_metrics import dashboard_metrics
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 logger = logging.getLogger(__name__)
@@ -253,6 +254,7 @@ async def process_iso_diff(
         }
         
         await db.diff_results.insert_one(diff_document)
+        await dashboard_metrics.record_diff(tenant_id, deltas)
         
         logger.info(f"✅ Diff processing complete: {len(deltas)} changes detected, stored in MongoDB")
         
@@ -548,125 +550,132 @@ async def map_clauses(
                 detail="No QSP documents found. Please upload QSP documents first."
             )
         
-        # Clear existing QSP sections for this tenant to avoid duplicates
-        # This ensures idempotency - can run clause mapping multiple times
-        if db is not None:
-            result = await db.qsp_sections.delete_many({"tenant_id": tenant_id})
-            logger.info(f"Cleared {result.deleted_count} existing QSP sections for tenant {tenant_id}")
-        
         parser = get_qsp_parser()
         impact_service = get_change_impact_service()
         
+        # One document per QSP number: if several revisions of the same QSP
+        # are on disk, the most recently uploaded file wins
+        latest_files = {}
+        for file_path in tenant_dir.iterdir():
+            if file_path.is_file():
+                document_number = parser.extract_document_number(file_path.name)
+                previous = latest_files.get(document_number)
+                if previous is None or file_path.stat().st_mtime > previous.stat().st_mtime:
+                    if previous is not None:
+                        logger.warning(f"Skipping older revision {previous.name} of QSP {document_number}")
+                    latest_files[document_number] = file_path
+                else:
+                    logger.warning(f"Skipping older revision {file_path.name} of QSP {document_number}")
+        
         total_documents = 0
         total_clauses = 0
+        total_embedded = 0
+        mapped_doc_ids = []
+        failed_doc_ids = []
         
         # Process each QSP document
-        for file_path in tenant_dir.iterdir():
-            if file_path.is_file():
-                try:
-                    # Parse document
-                    with open(file_path, 'rb') as f:
-                        file_content = f.read()
-                    
-                    parsed_data = parser.parse_file(file_content, file_path.name)
-                    
-                    # Ingest into change impact service for semantic matching
-                    import uuid
-                    doc_id = str(uuid.uuid4())
-                    
-                    # Convert clauses to sections format expected by impact service
-                    sections = []
-                    for clause in parsed_data.get('clauses', []):
-                        # Use clause number if available, otherwise use document number
-                        clause_id = clause.get('clause')
-                        if not clause_id or clause_id == 'Unknown' or clause_id == 'None' or clause_id is None:
-                            # Fallback to document number (e.g., "7.4-2" from filename)
-                            clause_id = parsed_data.get('document_number', 'Unknown')
-                        
-                        sections.append({
-                            'section_path': clause_id,
-                            'heading': clause.get('title', ''),
-                            'text': clause.get('text', ''),
-                            'version': parsed_data.get('revision', '')
-                        })
-                    
-                    result = impact_service.ingest_qsp_document(
-                        tenant_id=tenant_id,
-                        doc_id=doc_id,
-                        doc_name=f"{parsed_data['document_number']} {parsed_data['filename']}",
-                        sections=sections
-                    )
+        for document_number, file_path in latest_files.items():
+            try:
+                # Parse document
+                with open(file_path, 'rb') as f:
+                    file_content = f.read()
+                
+                parsed_data = parser.parse_file(file_content, file_path.name)
+                
+                # Stable doc_id so a re-uploaded revision diffs against its previous sections
+                doc_id = impact_service.stable_doc_id(tenant_id, parsed_data['document_number'])
+                mapped_doc_ids.append(doc_id)
+                
+                # Convert clauses to sections format expected by impact service
+                sections = []
+                for clause in parsed_data.get('clauses', []):
+                    # Use clause number if available, otherwise use document number
+                    clause_id = clause.get('clause')
+                    if not clause_id or clause_id == 'Unknown' or clause_id == 'None' or clause_id is None:
+                        # Fallback to document number (e.g., "7.4-2" from filename)
+                        clause_id = parsed_data.get('document_number', 'Unknown')
                     
-                    logger.info(f"Ingest result: {result}")
-                    logger.info(f"Has pending operations: {hasattr(impact_service, '_pending_mongo_operations')}")
+                    sections.append({
+                        'section_path': clause_id,
+                        'heading': clause.get('title', ''),
+                        'text': clause.get('text', ''),
+                        'version': parsed_data.get('revision', '')
+                    })
+                
+                # Only added/changed sections are embedded, removed ones are deleted
+                result = await impact_service.sync_qsp_document(
+                    tenant_id=tenant_id,
+                    doc_id=doc_id,
+                    doc_name=f"{parsed_data['document_number']} {parsed_data['filename']}",
+                    sections=sections
+                )
+                
+                # Re-extract regulatory references only when the document changed
+                doc_changed = result['added'] or result['changed'] or result['removed']
+                if db is not None and doc_changed:
+                    from core.regulatory_reference_extractor import RegulatoryReferenceExtractor
+                    reference_extractor = RegulatoryReferenceExtractor()
                     
-                    # Handle MongoDB persistence if there are pending operations
-                    if hasattr(impact_service, '_pending_mongo_operations'):
-                        pending = impact_service._pending_mongo_operations
+                    all_references = []
+                    for section in result['sections']:
+                        references = reference_extractor.extract_references(
+                            qsp_text=section['text'],
+                            qsp_id=section['doc_id'],
+                            qsp_section=section.get('section_path', '')
+                        )
                         
-                        logger.info(f"About to persist {pending['count']} sections to MongoDB")
+                        # Add tenant_id and doc_name to each reference
+                        for ref in references:
+                            ref['tenant_id'] = tenant_id
+                            ref['doc_name'] = section['doc_name']
                         
-                        # Clear existing sections for this doc first (idempotency)
-                        delete_result = await db.qsp_sections.delete_many({
-                            'tenant_id': pending['tenant_id'],
-                            'doc_id': pending['doc_id']
+                        all_references.extend(references)
+                    
+                    try:
+                        # Clear existing references for this doc first
+                        await db.regulatory_references.delete_many({
+                            'tenant_id': tenant_id,
+                            'qsp_id': doc_id
                         })
-                        logger.info(f"Deleted {delete_result.deleted_count} existing sections")
                         
-                        # Insert new sections
-                        if pending['sections']:
-                            insert_result = await db.qsp_sections.insert_many(pending['sections'])
-                            logger.info(f"Inserted {len(insert_result.inserted_ids)} sections to MongoDB")
-                            
-                            # NEW: Extract regulatory references from sections
-                            from core.regulatory_reference_extractor import RegulatoryReferenceExtractor
-                            reference_extractor = RegulatoryReferenceExtractor()
-                            
-                            all_references = []
-                            for section in pending['sections']:
-                                references = reference_extractor.extract_references(
-                                    qsp_text=section['text'],
-                                    qsp_id=section['doc_id'],
-                                    qsp_section=section.get('section_path', '')
-                                )
-                                
-                                # Add tenant_id and doc_name to each reference
-                                for ref in references:
-                                    ref['tenant_id'] = pending['tenant_id']
-                                    ref['doc_name'] = section['doc_name']
-                                
-                                all_references.extend(references)
-                            
-                            # Store references in MongoDB
-                            if all_references:
-                                try:
-                                    # Clear existing references for this doc first
-                                    await db.regulatory_references.delete_many({
-                                        'tenant_id': pending['tenant_id'],
-                                        'qsp_id': pending['doc_id']
-                                    })
-                                    
-                                    # Insert new references
-                                    await db.regulatory_references.insert_many(all_references)
-                                    logger.info(f"✅ Extracted and stored {len(all_references)} regulatory references")
-                                except Exception as e:
-                                    logger.error(f"Failed to store references: {e}")
-                        
-                        logger.info(f"✅ Persisted {pending['count']} sections to MongoDB for {file_path.name}")
-                        
-                        # Clear pending operations
-                        delattr(impact_service, '_pending_mongo_operations')
-                    else:
-                        logger.warning(f"No pending operations found for {file_path.name}")
-                    
-                    total_documents += 1
-                    total_clauses += result['sections_embedded']
-                    
-                    logger.info(f"Mapped {result['sections_embedded']} clauses from {file_path.name}")
-                    
-                except Exception as e:
-                    logger.error(f"Failed to map clauses from {file_path.name}: {e}")
-                    continue
+                        if all_references:
+                            await db.regulatory_references.insert_many(all_references)
+                            logger.info(f"✅ Extracted and stored {len(all_references)} regulatory references")
+                    except Exception as e:
+                        logger.error(f"Failed to store references: {e}")
+                    await impact_service.invalidate_corpus(tenant_id)
+                
+                total_documents += 1
+                total_clauses += result['total_sections']
+                total_embedded += result['sections_embedded']
+                
+                logger.info(
+                    f"Mapped {result['total_sections']} clauses from {file_path.name} "
+                    f"({result['sections_embedded']} re-embedded)"
+                )
+                
+            except Exception as e:
+                logger.error(f"Failed to map clauses from {file_path.name}: {e}")
+                # Still uploaded: its previously mapped sections are kept
+                failed_doc_ids.append(impact_service.stable_doc_id(tenant_id, document_number))
+                continue
+        
+        # Drop sections and references of QSPs that are no longer uploaded
+        if db is not None and total_documents > 0:
+            uploaded_doc_ids = mapped_doc_ids + failed_doc_ids
+            stale = await db.qsp_sections.delete_many({
+                'tenant_id': tenant_id,
+                'doc_id': {'$nin': uploaded_doc_ids}
+            })
+            stale_references = await db.regulatory_references.delete_many({
+                'tenant_id': tenant_id,
+                'qsp_id': {'$nin': uploaded_doc_ids}
+            })
+            if stale.deleted_count or stale_references.deleted_count:
+                await impact_service.invalidate_corpus(tenant_id)
+            if stale.deleted_count:
+                logger.info(f"Removed {stale.deleted_count} sections of QSPs no longer uploaded")
+                await dashboard_metrics.update_parts(tenant_id, 'sections')
         
         if total_documents == 0:
             raise HTTPException(
@@ -674,12 +683,16 @@ async def map_clauses(
                 detail="Failed to map any QSP documents. Please check document format."
             )
         
-        logger.info(f"✅ Clause mapping complete: {total_documents} docs, {total_clauses} clauses")
+        logger.info(
+            f"✅ Clause mapping complete: {total_documents} docs, {total_clauses} clauses, "
+            f"{total_embedded} sections embedded"
+        )
         
         return {
             'success': True,
             'total_qsp_documents': total_documents,
             'total_clauses_mapped': total_clauses,
+            'sections_embedded': total_embedded,
             'message': f'Successfully mapped {total_clauses} clauses from {total_documents} QSP documents'
         }
         
@@ -711,8 +724,11 @@ async def delete_all_qsp_documents(
         
         # Clear MongoDB qsp_sections for this tenant
         if db is not None:
+            from core.change_impact_service_mongo import get_change_impact_service
             result = await db.qsp_sections.delete_many({"tenant_id": tenant_id})
+            await get_change_impact_service().invalidate_corpus(tenant_id)
             logger.info(f"Cleared {result.deleted_count} QSP sections for tenant {tenant_id}")
+            await dashboard_metrics.update_parts(tenant_id, 'sections')
         
         return {
             'success': True,
@@ -738,22 +754,32 @@ async def delete_qsp_document(
         if not tenant_dir.exists():
             raise HTTPException(status_code=404, detail="No QSP documents found")
         
+        from core.qsp_parser import get_qsp_parser
+        from core.change_impact_service_mongo import get_change_impact_service
+        
         # Find and delete the file
-        deleted = False
+        deleted_path = None
         for file_path in tenant_dir.glob("*"):
             if file_path.name == filename or filename in file_path.name:
                 file_path.unlink()
-                deleted = True
+                deleted_path = file_path
                 logger.info(f"Deleted QSP document: {file_path.name}")
                 break
         
-        if not deleted:
+        if deleted_path is None:
             raise HTTPException(status_code=404, detail=f"Document '{filename}' not found")
         
-        # Clear MongoDB qsp_sections for this tenant to force re-mapping
+        # Clear only this QSP's sections; other documents keep their embeddings
         if db is not None:
-            await db.qsp_sections.delete_many({"tenant_id": tenant_id})
-            logger.info(f"Cleared QSP sections for tenant {tenant_id}")
+            impact_service = get_change_impact_service()
+            document_number = get_qsp_parser().extract_document_number(deleted_path.name)
+            doc_id = impact_service.stable_doc_id(tenant_id, document_number)
+            result = await db.qsp_sections.delete_many({"tenant_id": tenant_id, "doc_id": doc_id})
+            await db.regulatory_references.delete_many({"tenant_id": tenant_id, "qsp_id": doc_id})
+            await impact_service.invalidate_corpus(tenant_id)
+            if result.deleted_count:
+                await dashboard_metrics.increment(tenant_id, total_mappings=-result.deleted_count, total_documents=-1)
+            logger.info(f"Cleared {result.deleted_count} QSP sections for {document_number}")
         
         return {
             'success': True,
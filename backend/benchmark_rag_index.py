@@ -0,0 +1,158 @@
+"""
+Benchmark HNSW index profiles against a tenant's regulatory corpus
+Measures build time, recall@k versus exact brute-force search, and p50/p99
+query latency, so a profile can be chosen before migrating a collection
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+import chromadb
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from core.rag_service import rag_service
+
+
+def load_corpus(tenant_id: str, shared: bool):
+    """Stored ids and vectors of a tenant (or the shared) collection"""
+    if shared:
+        collection = rag_service._shared_collection()
+    else:
+        collection = rag_service._tenant_collection(tenant_id)
+    if collection is None:
+        raise SystemExit("❌ Collection not found")
+
+    data = collection.get(include=["embeddings"])
+    return data['ids'], np.asarray(data['embeddings'], dtype=np.float32)
+
+
+def load_queries(vectors: np.ndarray, query_file: str, n_queries: int, seed: int) -> np.ndarray:
+    """Embed queries from a file (one per line), or perturb sampled corpus vectors"""
+    if query_file:
+        with open(query_file) as f:
+            queries = [line.strip() for line in f if line.strip()][:n_queries]
+        return np.asarray(rag_service._get_embeddings(queries), dtype=np.float32)
+
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), size=min(n_queries, len(vectors)), replace=False)]
+    noise = rng.normal(scale=0.02, size=sample.shape).astype(np.float32)
+    return sample + noise
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int, space: str) -> np.ndarray:
+    """Ground-truth top-k row indices for each query"""
+    if space == "l2":
+        scores = -((queries ** 2).sum(1)[:, None] - 2 * queries @ vectors.T + (vectors ** 2).sum(1)[None, :])
+    elif space == "cosine":
+        normed = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        scores = queries @ normed.T / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    else:
+        scores = queries @ vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def percentiles(latencies):
+    ms = np.asarray(latencies) * 1000
+    return float(np.percentile(ms, 50)), float(np.percentile(ms, 99))
+
+
+def benchmark_profile(name, profile, ids, vectors, queries, k):
+    client = chromadb.EphemeralClient()
+    collection = client.create_collection(
+        name=f"bench_{name}",
+        metadata={
+            "hnsw:space": profile['space'],
+            "hnsw:M": profile['M'],
+            "hnsw:construction_ef": profile['construction_ef'],
+            "hnsw:search_ef": profile['search_ef']
+        }
+    )
+
+    start = time.perf_counter()
+    for i in range(0, len(ids), 1000):
+        collection.add(ids=ids[i:i + 1000], embeddings=vectors[i:i + 1000].tolist())
+    build_seconds = time.perf_counter() - start
+
+    truth = exact_neighbours(vectors, queries, k, profile['space'])
+    row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        result = collection.query(query_embeddings=[query.tolist()], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        found = {row_of[chunk_id] for chunk_id in result['ids'][0]}
+        hits += len(found & set(expected.tolist()))
+
+    client.delete_collection(f"bench_{name}")
+    p50, p99 = percentiles(latencies)
+    return {
+        'recall': hits / (len(queries) * k),
+        'p50_ms': p50,
+        'p99_ms': p99,
+        'build_s': build_seconds
+    }
+
+
+def benchmark_brute_force(vectors, queries, k):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        exact_neighbours(vectors, query[None, :], k, "l2")
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = percentiles(latencies)
+    return {'recall': 1.0, 'p50_ms': p50, 'p99_ms': p99, 'build_s': 0.0}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HNSW index profiles on a regulatory corpus")
+    parser.add_argument("--tenant", help="Tenant whose collection to benchmark")
+    parser.add_argument("--shared", action="store_true", help="Benchmark the shared corpus instead")
+    parser.add_argument("--profiles", help="Comma-separated profile names (default: all)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--query-file", help="Text file with one query per line (embedded via OpenAI)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.tenant and not args.shared:
+        parser.error("--tenant or --shared is required")
+
+    available = rag_service.get_index_profiles()
+    names = args.profiles.split(",") if args.profiles else list(available)
+    unknown = [n for n in names if n not in available]
+    if unknown:
+        parser.error(f"Unknown profiles: {', '.join(unknown)}")
+
+    print("🚀 Loading corpus...")
+    ids, vectors = load_corpus(args.tenant, args.shared)
+    if not len(ids):
+        raise SystemExit("❌ Collection is empty")
+    queries = load_queries(vectors, args.query_file, args.queries, args.seed)
+    k = min(args.k, len(ids))
+    print(f"📊 {len(ids)} vectors ({vectors.shape[1]} dims), {len(queries)} queries, k={k}")
+    print()
+
+    results = {'brute_force': benchmark_brute_force(vectors, queries, k)}
+    for name in names:
+        print(f"⏳ Benchmarking {name}...")
+        results[name] = benchmark_profile(name, available[name], ids, vectors, queries, k)
+
+    print()
+    print(f"{'profile':<16}{'recall@' + str(k):>10}{'p50 ms':>10}{'p99 ms':>10}{'build s':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['recall']:>10.3f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['build_s']:>10.2f}")
+    print()
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Verify that every registered hot query is served by an index
+Runs explain() on each query in core/db_indexes.HOT_QUERIES and exits non-zero
+when any of them plans a collection scan
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from core.database import database_provider
+from core.db_indexes import ensure_indexes, verify_query_plans
+
+
+async def main(apply_indexes: bool) -> int:
+    db = database_provider.db
+
+    if apply_indexes:
+        print("🔧 Applying index registry...")
+        await ensure_indexes(db)
+
+    print("🔍 Explaining hot queries...")
+    results = await verify_query_plans(db)
+
+    collscans = [r for r in results if r['collscan']]
+    for r in results:
+        marker = "❌" if r['collscan'] else "✅"
+        print(f"{marker} {r['collection']:<24} {r['query']:<28} {' > '.join(s for s in r['stages'] if s)}")
+
+    print()
+    if collscans:
+        print(f"❌ {len(collscans)} of {len(results)} hot queries use a collection scan")
+        return 1
+    print(f"✅ All {len(results)} hot queries use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flag hot MongoDB queries that plan a collection scan")
+    parser.add_argument("--apply", action="store_true", help="Apply the index registry before checking")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.apply)))
@@ -9,21 +9,39 @@ Supports full 5-level document hierarchy traceability:
   Level 5: Reference Documents (RFD)
 """
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 from openai import OpenAI
 import os
 from datetime import datetime
 import uuid
+import hashlib
 import numpy as np
 import re
-from motor.motor_asyncio import AsyncIOMotorClient
+from core.database import database_provider
 from core.regulatory_reference_extractor import RegulatoryReferenceExtractor
 from core.reference_extractor import reference_extractor
+from core.dashboard_metrics import dashboard_metrics
+from core.score_matrix import section_table, encode_scores, decode_scores, derive_matches, find_position
+from core.delta_hunks import DELTA_EMBEDDING_MODES, delta_hunk_text
 from models.regulatory import DocumentType
 
 logger = logging.getLogger(__name__)
 
 
+async def bump_corpus_version(db, tenant_id: str):
+    """
+    Invalidate memoized analysis runs of a tenant
+    Call after writing anything an analysis reads besides the QSP sections the
+    service syncs itself: regulatory references, the document hierarchy and the
+    forms / WI catalogs
+    """
+    await db.corpus_versions.update_one(
+        {'tenant_id': tenant_id},
+        {'$inc': {'version': 1}, '$set': {'updated_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+
 class ChangeImpactServiceMongo:
     """
     Change impact detection using MongoDB for persistent storage
@@ -40,14 +58,21 @@ class ChangeImpactServiceMongo:
         self.embedding_model = "text-embedding-3-large"
         self.embedding_dimensions = 1536
         self.impact_threshold = 0.60  # Balanced threshold for good matches without too many false positives
+        self.max_stored_candidates = 50  # Above-threshold scores kept per delta for incremental re-analysis
+        self.analysis_top_k = 5  # Matches kept per delta by /analyze and /analyze_full_hierarchy
+        self.delta_embedding_mode = os.getenv("DELTA_EMBEDDING_MODE", "clause")
+        if self.delta_embedding_mode not in DELTA_EMBEDDING_MODES:
+            logger.error(
+                f"⚠️ Invalid DELTA_EMBEDDING_MODE '{self.delta_embedding_mode}' "
+                f"(expected one of {', '.join(DELTA_EMBEDDING_MODES)}); using 'clause'"
+            )
+            self.delta_embedding_mode = 'clause'
+        self.hunk_weight = float(os.getenv("DELTA_HUNK_WEIGHT", "0.5"))  # Hunk score share in 'weighted' mode
         
-        # MongoDB connection for persistent storage
-        mongo_url = os.environ.get('MONGO_URL')
-        db_name = os.environ.get('DB_NAME', 'compliance_checker')
-        
-        if mongo_url:
-            self.mongo_client = AsyncIOMotorClient(mongo_url)
-            self.db = self.mongo_client[db_name]
+        # MongoDB connection for persistent storage (the application's shared pool)
+        if os.environ.get('MONGO_URL'):
+            self.mongo_client = database_provider.client
+            self.db = database_provider.db
             logger.info("✅ Change Impact Service connected to MongoDB for persistent storage")
         else:
             self.mongo_client = None
@@ -56,6 +81,7 @@ class ChangeImpactServiceMongo:
         
         # In-memory cache (for backwards compatibility and performance)
         self.qsp_sections = {}  # tenant_id -> list of sections with embeddings
+        self._section_tables = {}  # tenant_id -> (cached sections list, score matrix section table id)
     
     def _get_embedding(self, text: str) -> List[float]:
         """Generate embedding using OpenAI"""
@@ -82,6 +108,43 @@ class ChangeImpactServiceMongo:
         b = np.array(b)
         return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
     
+    def _delta_embeddings(
+        self,
+        delta: Dict[str, Any],
+        mode: str
+    ) -> Tuple[Optional[List[float]], Optional[List[float]]]:
+        """
+        (clause embedding, hunk embedding) of a delta under an embedding mode
+        Deltas without hunk text, or whose hunks are the whole clause, only get
+        the clause embedding
+        """
+        change_text = delta['change_text']
+        hunk_text = delta_hunk_text(delta) if mode != 'clause' else ''
+        if not hunk_text.strip() or ' '.join(hunk_text.split()) == ' '.join(change_text.split()):
+            return self._get_embedding(change_text), None
+        if mode == 'hunk':
+            return None, self._get_embedding(hunk_text)
+        return self._get_embedding(change_text), self._get_embedding(hunk_text)
+    
+    def _delta_score(
+        self,
+        clause_embedding: Optional[List[float]],
+        hunk_embedding: Optional[List[float]],
+        section_embedding: List[float],
+        mode: str,
+        hunk_weight: float
+    ) -> float:
+        """Similarity of a delta to a section, combining clause and hunk scores per mode"""
+        if hunk_embedding is None:
+            return self._cosine_similarity(clause_embedding, section_embedding)
+        hunk_score = self._cosine_similarity(hunk_embedding, section_embedding)
+        if clause_embedding is None:
+            return hunk_score
+        clause_score = self._cosine_similarity(clause_embedding, section_embedding)
+        if mode == 'max':
+            return max(clause_score, hunk_score)
+        return hunk_weight * hunk_score + (1 - hunk_weight) * clause_score
+    
     def ingest_qsp_document(
         self,
         tenant_id: str,
@@ -98,6 +161,8 @@ class ChangeImpactServiceMongo:
             
             if tenant_id not in self.qsp_sections:
                 self.qsp_sections[tenant_id] = []
+            # The cached list grows in place, so its section table changes
+            self._section_tables.pop(tenant_id, None)
             
             embedded_sections = []
             
@@ -146,7 +211,177 @@ class ChangeImpactServiceMongo:
         except Exception as e:
             logger.error(f"Failed to ingest QSP document: {e}")
             raise
-    
+
+    @staticmethod
+    def stable_doc_id(tenant_id: str, document_number: str) -> str:
+        """
+        Deterministic doc_id for a QSP, derived from its document number
+        A new revision of the same QSP (e.g. R12 -> R13) keeps the same doc_id
+        """
+        return str(uuid.uuid5(uuid.NAMESPACE_URL, f"qsp:{tenant_id}:{document_number}"))
+
+    @staticmethod
+    def _section_hash(heading: str, text: str) -> str:
+        """Content hash of the exact text that gets embedded for a section"""
+        normalized = ' '.join(f"{heading}: {text}".split())
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+    async def get_corpus_version(self, tenant_id: str) -> int:
+        """Counter bumped on every change to the tenant's QSP sections, references, hierarchy or catalogs"""
+        if self.db is None:
+            return 0
+        doc = await self.db.corpus_versions.find_one({'tenant_id': tenant_id}, {'_id': 0, 'version': 1})
+        return doc['version'] if doc else 0
+
+    async def bump_corpus_version(self, tenant_id: str):
+        if self.db is None:
+            return
+        await bump_corpus_version(self.db, tenant_id)
+
+    async def invalidate_corpus(self, tenant_id: str):
+        """Call after writing a tenant's QSP sections or regulatory references directly"""
+        self.qsp_sections.pop(tenant_id, None)
+        self._section_tables.pop(tenant_id, None)
+        await self.bump_corpus_version(tenant_id)
+
+    async def sync_qsp_document(
+        self,
+        tenant_id: str,
+        doc_id: str,
+        doc_name: str,
+        sections: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Incrementally sync a QSP document's sections with MongoDB
+
+        Sections are keyed by section_path (plus an ordinal for repeated paths)
+        and compared by content hash against what is already stored:
+        - unchanged sections keep their stored embedding
+        - added or changed sections are embedded and upserted
+        - sections no longer present are deleted
+
+        Returns counts per bucket plus the full list of current sections
+        (without embeddings) for downstream reference extraction.
+        """
+        if self.db is None:
+            result = self.ingest_qsp_document(tenant_id, doc_id, doc_name, sections)
+            return {**result, 'added': result['sections_embedded'], 'changed': 0,
+                    'unchanged': 0, 'removed': 0,
+                    'sections': [{**s, 'doc_id': doc_id, 'doc_name': doc_name} for s in sections]}
+
+        try:
+            stored = await self.db.qsp_sections.find(
+                {'tenant_id': tenant_id, 'doc_id': doc_id},
+                {'_id': 0, 'section_key': 1, 'content_hash': 1, 'doc_name': 1}
+            ).to_list(length=None)
+            stored_hashes = {s['section_key']: s.get('content_hash') for s in stored if s.get('section_key')}
+
+            now = datetime.utcnow()
+            path_counts: Dict[str, int] = {}
+            current_keys = set()
+            current_sections = []
+            upserts = 0
+            added = changed = unchanged = 0
+
+            for section in sections:
+                section_path = section.get('section_path', '')
+                ordinal = path_counts.get(section_path, 0)
+                path_counts[section_path] = ordinal + 1
+                section_key = f"{section_path}#{ordinal}"
+                current_keys.add(section_key)
+
+                content_hash = self._section_hash(section['heading'], section['text'])
+                section_data = {
+                    'section_key': section_key,
+                    'doc_id': doc_id,
+                    'doc_name': doc_name,
+                    'section_path': section_path,
+                    'heading': section['heading'],
+                    'text': section['text'],
+                    'version': section.get('version', 'unknown'),
+                    'content_hash': content_hash,
+                    'tenant_id': tenant_id
+                }
+                current_sections.append(section_data)
+
+                if stored_hashes.get(section_key) == content_hash:
+                    unchanged += 1
+                    continue
+
+                if section_key in stored_hashes:
+                    changed += 1
+                else:
+                    added += 1
+
+                embedding = self._get_embedding(f"{section['heading']}: {section['text']}")
+                await self.db.qsp_sections.update_one(
+                    {'tenant_id': tenant_id, 'doc_id': doc_id, 'section_key': section_key},
+                    {
+                        '$set': {**section_data, 'embedding': embedding, 'updated_at': now},
+                        '$setOnInsert': {'section_id': str(uuid.uuid4()), 'created_at': now}
+                    },
+                    upsert=True
+                )
+                upserts += 1
+
+            removed_keys = [k for k in stored_hashes if k not in current_keys]
+            if removed_keys:
+                await self.db.qsp_sections.delete_many({
+                    'tenant_id': tenant_id,
+                    'doc_id': doc_id,
+                    'section_key': {'$in': removed_keys}
+                })
+
+            # Legacy rows written before section keys existed can't be diffed
+            legacy = await self.db.qsp_sections.delete_many({
+                'tenant_id': tenant_id,
+                'doc_id': doc_id,
+                'section_key': {'$exists': False}
+            })
+
+            # Revision/filename may change without touching content
+            if unchanged:
+                await self.db.qsp_sections.update_many(
+                    {'tenant_id': tenant_id, 'doc_id': doc_id},
+                    {'$set': {'doc_name': doc_name, 'version': sections[0].get('version', 'unknown') if sections else 'unknown'}}
+                )
+
+            # Cached sections are now stale, reload from MongoDB on next analysis
+            self.qsp_sections.pop(tenant_id, None)
+            self._section_tables.pop(tenant_id, None)
+            renamed = any(s.get('doc_name') != doc_name for s in stored)
+            if upserts or removed_keys or legacy.deleted_count or renamed:
+                await self.bump_corpus_version(tenant_id)
+
+            # The document now has exactly current_keys sections
+            await dashboard_metrics.increment(
+                tenant_id,
+                total_mappings=len(current_keys) - len(stored),
+                total_documents=int(bool(current_keys)) - int(bool(stored))
+            )
+
+            logger.info(
+                f"Synced {doc_name}: {added} added, {changed} changed, "
+                f"{unchanged} unchanged, {len(removed_keys)} removed ({upserts} embedded)"
+            )
+
+            return {
+                'success': True,
+                'doc_id': doc_id,
+                'doc_name': doc_name,
+                'sections_embedded': upserts,
+                'total_sections': len(current_sections),
+                'added': added,
+                'changed': changed,
+                'unchanged': unchanged,
+                'removed': len(removed_keys),
+                'sections': current_sections
+            }
+
+        except Exception as e:
+            logger.error(f"Failed to sync QSP document: {e}")
+            raise
+
     async def detect_impacts_async(
         self,
         tenant_id: str,
@@ -158,19 +393,7 @@ class ChangeImpactServiceMongo:
         Uses MongoDB for persistent storage with in-memory cache
         """
         try:
-            # Get QSP sections for this tenant (try in-memory first, then MongoDB)
-            qsp_sections = self.qsp_sections.get(tenant_id, [])
-            
-            # If not in cache and MongoDB available, load from DB
-            if not qsp_sections and self.db is not None:
-                logger.info(f"Loading QSP sections from MongoDB for tenant {tenant_id}")
-                cursor = self.db.qsp_sections.find({'tenant_id': tenant_id})
-                qsp_sections = await cursor.to_list(length=None)
-                
-                # Cache for future use
-                if qsp_sections:
-                    self.qsp_sections[tenant_id] = qsp_sections
-                    logger.info(f"✅ Loaded {len(qsp_sections)} QSP sections from MongoDB")
+            qsp_sections = await self._load_qsp_sections(tenant_id)
             
             # Call the core detection logic
             return await self._detect_impacts_core(tenant_id, deltas, qsp_sections, top_k)
@@ -179,6 +402,23 @@ class ChangeImpactServiceMongo:
             logger.error(f"Async impact detection failed: {e}")
             raise
     
+    async def _load_qsp_sections(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """QSP sections of a tenant (try in-memory first, then MongoDB)"""
+        qsp_sections = self.qsp_sections.get(tenant_id, [])
+        
+        # If not in cache and MongoDB available, load from DB
+        if not qsp_sections and self.db is not None:
+            logger.info(f"Loading QSP sections from MongoDB for tenant {tenant_id}")
+            cursor = self.db.qsp_sections.find({'tenant_id': tenant_id})
+            qsp_sections = await cursor.to_list(length=None)
+            
+            # Cache for future use
+            if qsp_sections:
+                self.qsp_sections[tenant_id] = qsp_sections
+                logger.info(f"✅ Loaded {len(qsp_sections)} QSP sections from MongoDB")
+        
+        return qsp_sections
+    
     def detect_impacts(
         self,
         tenant_id: str,
@@ -282,6 +522,107 @@ class ChangeImpactServiceMongo:
             logger.error(f"Error finding explicit matches: {e}")
             return []
                 
+    @staticmethod
+    def _section_identity(section: Dict[str, Any]) -> str:
+        """Stable per-document identity of a QSP section (section_key when synced, else section_id)"""
+        return section.get('section_key') or section.get('section_id') or section.get('section_path', '')
+
+    def _build_impact(
+        self,
+        delta: Dict[str, Any],
+        match: Dict[str, Any],
+        delta_index: int
+    ) -> Dict[str, Any]:
+        """Build the impact record for one (delta, matched QSP section) pair"""
+        clause_id = delta['clause_id']
+        change_type = delta.get('change_type', 'modified')
+        
+        # Extract regulatory text fields from delta (increased to 1000 chars)
+        old_text = delta.get('old_text', '')[:1000] if delta.get('old_text') else 'N/A'
+        new_text = delta.get('new_text', '')[:1000] if delta.get('new_text') else 'N/A'
+        regulatory_doc = delta.get('regulatory_doc', 'ISO 14971:2020')  # Default if not provided
+        reg_title = delta.get('reg_title', '')
+        
+        section = match['qsp_section']
+        confidence = match['confidence']
+        
+        # Determine impact level based on confidence and change type
+        if confidence >= 0.9 or match['match_type'] == 'explicit_reference':
+            impact_level = 'High'
+        elif confidence >= 0.75:
+            impact_level = 'Medium'
+        else:
+            impact_level = 'Low'
+        
+        # Extract document number from doc_name
+        doc_name = section['doc_name']
+        doc_number_match = re.match(r'^(\d+\.\d+-\d+|\d+\.\d+)', doc_name)
+        qsp_doc = doc_number_match.group(1) if doc_number_match else doc_name.split()[0]
+        
+        # Generate specific rationale based on match type
+        # Will be implemented in Task 7 - for now use simple rationale
+        if match['match_type'] == 'explicit_reference':
+            rationale = (
+                f"HIGH CONFIDENCE: This QSP explicitly references {regulatory_doc} Clause {clause_id}. "
+                f"The regulatory requirement has been {change_type}. "
+                f"Review and update Section '{section['heading']}' to maintain compliance. "
+                f"\n\n✓ Reference found at line {match.get('reference_line', 'N/A')}: \"{match.get('reference_context', 'N/A')[:150]}...\""
+            )
+        else:
+            # Semantic similarity rationale
+            if confidence > 0.80:
+                strength = "Strong semantic"
+            elif confidence > 0.75:
+                strength = "Moderate semantic"
+            else:
+                strength = "Potential semantic"
+            
+            if change_type.lower() in ['added', 'new']:
+                rationale = (
+                    f"{strength} match: New regulatory requirement introduced in {regulatory_doc} Clause {clause_id}. "
+                    f"Review QSP section '{section['heading']}' to ensure alignment with new requirements. "
+                    f"\n\n⚠️ MEDIUM CONFIDENCE: Match based on semantic similarity ({confidence*100:.1f}%). Expert review recommended."
+                )
+            elif change_type.lower() == 'modified':
+                rationale = (
+                    f"{strength} match: {regulatory_doc} Clause {clause_id} has been modified. "
+                    f"QSP section '{section['heading']}' may require updates to maintain compliance. "
+                    f"\n\n⚠️ MEDIUM CONFIDENCE: Match based on semantic similarity ({confidence*100:.1f}%). Expert review recommended."
+                )
+            else:
+                rationale = (
+                    f"{strength} match: Change to {regulatory_doc} Clause {clause_id}. "
+                    f"Review QSP section '{section['heading']}' for consistency. "
+                    f"\n\n⚠️ MEDIUM CONFIDENCE: Match based on semantic similarity ({confidence*100:.1f}%). Expert review recommended."
+                )
+        
+        # New unified structure with match metadata
+        return {
+            'regulatory_clause': f"{regulatory_doc} | Clause {clause_id}" + (f" — {reg_title}" if reg_title else ""),
+            'reg_clause': clause_id,
+            'regulatory_doc': regulatory_doc,
+            'reg_title': reg_title,
+            'change_type': change_type.capitalize(),
+            'impact_level': impact_level,
+            'match_type': match['match_type'],  # NEW
+            'confidence': round(confidence, 3),  # NEW
+            'similarity_score': round(match.get('similarity_score', confidence), 3),
+            'qsp_doc': qsp_doc,
+            'qsp_clause': section['section_path'] if section['section_path'] else 'Unknown',
+            'old_text': old_text,
+            'new_text': new_text,
+            'qsp_text': section['text'][:300] if len(section['text']) > 300 else section['text'],
+            'qsp_text_full': section['text'],
+            'rationale': rationale,
+            'reference_context': match.get('reference_context', ''),  # NEW - for explicit matches
+            'reference_line': match.get('reference_line', 0),  # NEW - for explicit matches
+            # Identity of the (delta, section) pair, used for incremental re-analysis
+            'delta_index': delta_index,
+            'qsp_doc_id': section.get('doc_id'),
+            'qsp_section_key': self._section_identity(section),
+            'qsp_content_hash': section.get('content_hash', '')
+        }
+
     async def _detect_impacts_core(
         self,
         tenant_id: str,
@@ -292,6 +633,7 @@ class ChangeImpactServiceMongo:
         """Core impact detection logic"""
         run_id = str(uuid.uuid4())
         all_impacts = []
+        run_deltas = []  # Per-delta score data persisted for incremental re-analysis
         
         if not qsp_sections:
             logger.warning(f"No QSP sections found for tenant {tenant_id}")
@@ -307,167 +649,527 @@ class ChangeImpactServiceMongo:
         
         logger.info(f"Using {len(qsp_sections)} QSP sections for impact analysis")
         
+        table_id = await self._store_section_table(tenant_id, qsp_sections)
+        
         # Process each delta with multi-stage matching
-        for delta in deltas:
-            clause_id = delta['clause_id']
-            change_text = delta['change_text']
-            change_type = delta.get('change_type', 'modified')
+        for delta_index, delta in enumerate(deltas):
+            impacts, run_delta = await self._analyze_delta(
+                tenant_id, run_id, delta, delta_index, qsp_sections, top_k, table_id
+            )
+            all_impacts.extend(impacts)
+            if run_delta is not None:
+                run_deltas.append(run_delta)
+        
+        if self.db is not None and run_deltas:
+            try:
+                await self.db.impact_run_deltas.insert_many(run_deltas)
+            except Exception as e:
+                # Only incremental re-analysis depends on this; the run itself is still valid
+                logger.error(f"Failed to persist per-delta score data for run {run_id}: {e}")
+        
+        logger.info(f"✅ Impact analysis complete: run_id={run_id}, {len(all_impacts)} impacts")
+        
+        return {
+            'success': True,
+            'run_id': run_id,
+            'total_changes_analyzed': len(deltas),
+            'total_impacts_found': len(all_impacts),
+            'threshold': self.impact_threshold,
+            'impacts': all_impacts
+        }
+
+    async def _analyze_delta(
+        self,
+        tenant_id: str,
+        run_id: str,
+        delta: Dict[str, Any],
+        delta_index: int,
+        qsp_sections: List[Dict[str, Any]],
+        top_k: int,
+        table_id: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Multi-stage matching of one delta against the QSP sections
+        Returns (impacts, per-delta score data), or ([], None) for a delta without text
+        """
+        clause_id = delta['clause_id']
+        change_text = delta['change_text']
+        regulatory_doc = delta.get('regulatory_doc', 'ISO 14971:2020')  # Default if not provided
+        change_embedding = None
+        hunk_embedding = None
+        mode = self.delta_embedding_mode
+        candidates = []
+        score_matrix = None
+        explicit_sections = []
+        
+        logger.info(f"Analyzing delta: {regulatory_doc} Clause {clause_id}")
+        
+        # STAGE 1: Check for explicit references FIRST
+        explicit_matches = await self._find_explicit_matches(
+            tenant_id,
+            regulatory_doc,
+            clause_id
+        )
+        
+        # If we found explicit matches, prioritize those
+        if explicit_matches:
+            logger.info(f"✓ Stage 1: Found {len(explicit_matches)} explicit reference(s) for {clause_id}")
+            top_matches = explicit_matches[:top_k]  # Limit to top_k
+            explicit_sections = [{
+                'doc_id': match['qsp_section'].get('doc_id'),
+                'section_key': self._section_identity(match['qsp_section']),
+                'section_path': match['qsp_section'].get('section_path', ''),
+                'doc_name': match['qsp_section'].get('doc_name', ''),
+                'heading': match['qsp_section'].get('heading', '')
+            } for match in explicit_matches]
+        else:
+            # STAGE 2: Fallback to semantic search
+            logger.info(f"Stage 1: No explicit references for {clause_id}, using semantic search")
             
-            # Extract regulatory text fields from delta (increased to 1000 chars)
-            old_text = delta.get('old_text', '')[:1000] if delta.get('old_text') else 'N/A'
-            new_text = delta.get('new_text', '')[:1000] if delta.get('new_text') else 'N/A'
-            regulatory_doc = delta.get('regulatory_doc', 'ISO 14971:2020')  # Default if not provided
-            reg_title = delta.get('reg_title', '')
+            # Generate embedding for the change
+            if not change_text:
+                logger.warning(f"No text available for delta {clause_id}, skipping")
+                return [], None
             
-            logger.info(f"Analyzing delta: {regulatory_doc} Clause {clause_id}")
+            change_embedding, hunk_embedding = self._delta_embeddings(delta, mode)
             
-            # STAGE 1: Check for explicit references FIRST
-            explicit_matches = await self._find_explicit_matches(
-                tenant_id,
-                regulatory_doc,
-                clause_id
-            )
+            # Calculate similarities with all QSP sections
+            similarities = []
+            all_scores = []  # Track all scores for debugging
+            scored_positions = []
+            scored_values = []
             
-            # If we found explicit matches, prioritize those
-            if explicit_matches:
-                logger.info(f"✓ Stage 1: Found {len(explicit_matches)} explicit reference(s) for {clause_id}")
-                top_matches = explicit_matches[:top_k]  # Limit to top_k
-            else:
-                # STAGE 2: Fallback to semantic search
-                logger.info(f"Stage 1: No explicit references for {clause_id}, using semantic search")
-                
-                # Generate embedding for the change
-                if not change_text:
-                    logger.warning(f"No text available for delta {clause_id}, skipping")
+            for position, qsp in enumerate(qsp_sections):
+                if 'embedding' not in qsp:
                     continue
                 
-                change_embedding = self._get_embedding(change_text)
-                
-                # Calculate similarities with all QSP sections
-                similarities = []
-                all_scores = []  # Track all scores for debugging
-                
-                for qsp in qsp_sections:
-                    if 'embedding' not in qsp:
-                        continue
-                    
-                    score = self._cosine_similarity(change_embedding, qsp['embedding'])
-                    all_scores.append((score, qsp['doc_name'], qsp.get('section_path', 'unknown')))
-                    
-                    # Only consider matches above threshold (now 0.75)
-                    if score >= self.impact_threshold:
-                        similarities.append((score, qsp))
-                
-                # Log top similarity scores for debugging (at debug level)
-                all_scores.sort(reverse=True, key=lambda x: x[0])
-                logger.debug(f"Clause {clause_id} top 5 similarity scores:")
-                for i, (score, doc, section) in enumerate(all_scores[:5]):
-                    logger.debug(f"  #{i+1}: {score:.3f} - {doc} | {section}")
-                logger.debug(f"  Current threshold: {self.impact_threshold} | Matches above threshold: {len(similarities)}")
-                
-                # Sort by similarity and take top matches
-                similarities.sort(reverse=True, key=lambda x: x[0])
-                
-                # Create match objects for semantic matches
-                top_matches = [{
-                    'match_type': 'semantic_similarity',
-                    'confidence': score,
-                    'qsp_section': qsp,
-                    'similarity_score': score
-                } for score, qsp in similarities[:top_k]]
+                score = self._delta_score(change_embedding, hunk_embedding, qsp['embedding'], mode, self.hunk_weight)
+                all_scores.append((score, qsp['doc_name'], qsp.get('section_path', 'unknown')))
+                scored_positions.append(position)
+                scored_values.append(score)
                 
-                logger.info(f"Stage 2: Found {len(top_matches)} semantic match(es) for {clause_id}")
+                # Only consider matches above threshold (now 0.75)
+                if score >= self.impact_threshold:
+                    similarities.append((score, qsp))
             
-            # Generate impacts for each match
-            for match in top_matches:
-                section = match['qsp_section']
-                confidence = match['confidence']
-                
-                # Determine impact level based on confidence and change type
-                if confidence >= 0.9 or match['match_type'] == 'explicit_reference':
-                    impact_level = 'High'
-                elif confidence >= 0.75:
-                    impact_level = 'Medium'
-                else:
-                    impact_level = 'Low'
-                
-                # Extract document number from doc_name
-                doc_name = section['doc_name']
-                doc_number_match = re.match(r'^(\d+\.\d+-\d+|\d+\.\d+)', doc_name)
-                qsp_doc = doc_number_match.group(1) if doc_number_match else doc_name.split()[0]
-                
-                # Generate specific rationale based on match type
-                # Will be implemented in Task 7 - for now use simple rationale
-                if match['match_type'] == 'explicit_reference':
-                    rationale = (
-                        f"HIGH CONFIDENCE: This QSP explicitly references {regulatory_doc} Clause {clause_id}. "
-                        f"The regulatory requirement has been {change_type}. "
-                        f"Review and update Section '{section['heading']}' to maintain compliance. "
-                        f"\n\n✓ Reference found at line {match.get('reference_line', 'N/A')}: \"{match.get('reference_context', 'N/A')[:150]}...\""
-                    )
-                else:
-                    # Semantic similarity rationale
-                    if confidence > 0.80:
-                        strength = "Strong semantic"
-                    elif confidence > 0.75:
-                        strength = "Moderate semantic"
-                    else:
-                        strength = "Potential semantic"
-                    
-                    if change_type.lower() in ['added', 'new']:
-                        rationale = (
-                            f"{strength} match: New regulatory requirement introduced in {regulatory_doc} Clause {clause_id}. "
-                            f"Review QSP section '{section['heading']}' to ensure alignment with new requirements. "
-                            f"\n\n⚠️ MEDIUM CONFIDENCE: Match based on semantic similarity ({confidence*100:.1f}%). Expert review recommended."
-                        )
-                    elif change_type.lower() == 'modified':
-                        rationale = (
-                            f"{strength} match: {regulatory_doc} Clause {clause_id} has been modified. "
-                            f"QSP section '{section['heading']}' may require updates to maintain compliance. "
-                            f"\n\n⚠️ MEDIUM CONFIDENCE: Match based on semantic similarity ({confidence*100:.1f}%). Expert review recommended."
-                        )
-                    else:
-                        rationale = (
-                            f"{strength} match: Change to {regulatory_doc} Clause {clause_id}. "
-                            f"Review QSP section '{section['heading']}' for consistency. "
-                            f"\n\n⚠️ MEDIUM CONFIDENCE: Match based on semantic similarity ({confidence*100:.1f}%). Expert review recommended."
-                        )
-                
-                # New unified structure with match metadata
-                all_impacts.append({
-                    'regulatory_clause': f"{regulatory_doc} | Clause {clause_id}" + (f" — {reg_title}" if reg_title else ""),
-                    'reg_clause': clause_id,
-                    'regulatory_doc': regulatory_doc,
-                    'reg_title': reg_title,
-                    'change_type': change_type.capitalize(),
-                    'impact_level': impact_level,
-                    'match_type': match['match_type'],  # NEW
-                    'confidence': round(confidence, 3),  # NEW
-                    'similarity_score': round(match.get('similarity_score', confidence), 3),
-                    'qsp_doc': qsp_doc,
-                    'qsp_clause': section['section_path'] if section['section_path'] else 'Unknown',
-                    'old_text': old_text,
-                    'new_text': new_text,
-                    'qsp_text': section['text'][:300] if len(section['text']) > 300 else section['text'],
-                    'qsp_text_full': section['text'],
-                    'rationale': rationale,
-                    'reference_context': match.get('reference_context', ''),  # NEW - for explicit matches
-                    'reference_line': match.get('reference_line', 0)  # NEW - for explicit matches
-                })
+            # Log top similarity scores for debugging (at debug level)
+            all_scores.sort(reverse=True, key=lambda x: x[0])
+            logger.debug(f"Clause {clause_id} top 5 similarity scores:")
+            for i, (score, doc, section) in enumerate(all_scores[:5]):
+                logger.debug(f"  #{i+1}: {score:.3f} - {doc} | {section}")
+            logger.debug(f"  Current threshold: {self.impact_threshold} | Matches above threshold: {len(similarities)}")
             
-            logger.info(f"Found {len(top_matches)} impacts for {clause_id}")
+            # Sort by similarity and take top matches
+            similarities.sort(reverse=True, key=lambda x: x[0])
+            
+            # Create match objects for semantic matches
+            top_matches = [{
+                'match_type': 'semantic_similarity',
+                'confidence': score,
+                'qsp_section': qsp,
+                'similarity_score': score
+            } for score, qsp in similarities[:top_k]]
+            
+            candidates = [{
+                'doc_id': qsp.get('doc_id'),
+                'section_key': self._section_identity(qsp),
+                'score': score
+            } for score, qsp in similarities[:self.max_stored_candidates]]
+            
+            if table_id is not None:
+                # Top-N of every score, for threshold sweeps and match explanations
+                score_matrix = encode_scores(scored_positions, scored_values, table_id)
+            
+            logger.info(f"Stage 2: Found {len(top_matches)} semantic match(es) for {clause_id}")
         
-        logger.info(f"✅ Impact analysis complete: run_id={run_id}, {len(all_impacts)} impacts")
+        # Generate impacts for each match
+        impacts = [self._build_impact(delta, match, delta_index) for match in top_matches]
+        
+        run_delta = {
+            'tenant_id': tenant_id,
+            'run_id': run_id,
+            'delta_index': delta_index,
+            'delta': delta,
+            'embedding': change_embedding,
+            'hunk_embedding': hunk_embedding,
+            'embedding_mode': mode,
+            'hunk_weight': self.hunk_weight,
+            'candidates': candidates,
+            'score_matrix': score_matrix,
+            'explicit_sections': explicit_sections,
+            'top_k': top_k,
+            'threshold': self.impact_threshold,
+            'created_at': datetime.utcnow()
+        }
+        
+        logger.info(f"Found {len(top_matches)} impacts for {clause_id}")
+        return impacts, run_delta
+
+    async def recompute_document_impacts(
+        self,
+        tenant_id: str,
+        run_id: str,
+        doc_id: str
+    ) -> Dict[str, Any]:
+        """
+        Incrementally recompute a stored run after one QSP document was re-mapped
+
+        Only (delta, section) pairs involving doc_id are rescored, using the
+        stored delta embeddings and the document's current section embeddings.
+        Candidates from other documents are reused from the stored score data,
+        so no other section is rescored and no delta is re-embedded unless its
+        explicit references disappeared.
+
+        Returns the new impacts for every delta of the run, in run order.
+        """
+        if self.db is None:
+            return {'success': False, 'error': 'MongoDB not available for incremental analysis'}
+        
+        run_deltas = await self.db.impact_run_deltas.find(
+            {'tenant_id': tenant_id, 'run_id': run_id},
+            {'_id': 0}
+        ).sort('delta_index', 1).to_list(length=None)
+        
+        if not run_deltas:
+            return {'success': False, 'error': f'No stored score data for run {run_id}'}
+        
+        doc_sections = await self.db.qsp_sections.find(
+            {'tenant_id': tenant_id, 'doc_id': doc_id}
+        ).to_list(length=None)
+        doc_lookup = {self._section_identity(s): s for s in doc_sections}
+        
+        # First pass: rescore the changed document against every delta
+        plans = []
+        for run_delta in run_deltas:
+            delta = run_delta['delta']
+            top_k = run_delta.get('top_k', 5)
+            threshold = run_delta.get('threshold', self.impact_threshold)
+            regulatory_doc = delta.get('regulatory_doc', 'ISO 14971:2020')
+            
+            explicit_matches = await self._find_explicit_matches(tenant_id, regulatory_doc, delta['clause_id'])
+            if explicit_matches:
+                plans.append((run_delta, explicit_matches[:top_k], None))
+                continue
+            
+            # Runs stored before hunk embeddings were clause-only
+            mode = run_delta.get('embedding_mode', 'clause')
+            hunk_weight = run_delta.get('hunk_weight', self.hunk_weight)
+            embedding = run_delta.get('embedding')
+            hunk_embedding = run_delta.get('hunk_embedding')
+            if embedding is None and hunk_embedding is None:
+                if not delta.get('change_text'):
+                    plans.append((run_delta, [], None))
+                    continue
+                embedding, hunk_embedding = self._delta_embeddings(delta, mode)
+            
+            candidates = [c for c in run_delta.get('candidates', []) if c.get('doc_id') != doc_id]
+            for key, section in doc_lookup.items():
+                if 'embedding' not in section:
+                    continue
+                score = self._delta_score(embedding, hunk_embedding, section['embedding'], mode, hunk_weight)
+                if score >= threshold:
+                    candidates.append({'doc_id': doc_id, 'section_key': key, 'score': score})
+            candidates.sort(reverse=True, key=lambda c: c['score'])
+            candidates = candidates[:self.max_stored_candidates]
+            
+            await self.db.impact_run_deltas.update_one(
+                {'tenant_id': tenant_id, 'run_id': run_id, 'delta_index': run_delta['delta_index']},
+                {'$set': {
+                    'embedding': embedding,
+                    'hunk_embedding': hunk_embedding,
+                    'candidates': candidates,
+                    'updated_at': datetime.utcnow()
+                }}
+            )
+            plans.append((run_delta, None, candidates[:top_k]))
+        
+        # Resolve sections of other documents that are needed in one query
+        wanted = {
+            (c['doc_id'], c['section_key'])
+            for _, _, top in plans if top
+            for c in top if c['doc_id'] != doc_id
+        }
+        other_sections = {}
+        if wanted:
+            cursor = self.db.qsp_sections.find(
+                {
+                    'tenant_id': tenant_id,
+                    '$or': [
+                        {'doc_id': d, '$or': [{'section_key': k}, {'section_id': k}]}
+                        for d, k in wanted
+                    ]
+                },
+                {'embedding': 0}
+            )
+            for section in await cursor.to_list(length=None):
+                other_sections[(section['doc_id'], self._section_identity(section))] = section
+        
+        impacts_by_delta = []
+        for run_delta, explicit, top in plans:
+            delta = run_delta['delta']
+            delta_index = run_delta['delta_index']
+            if explicit is not None:
+                matches = explicit
+            else:
+                matches = []
+                for c in top or []:
+                    if c['doc_id'] == doc_id:
+                        section = doc_lookup.get(c['section_key'])
+                    else:
+                        section = other_sections.get((c['doc_id'], c['section_key']))
+                    if section is None:
+                        continue  # Section was removed since the run was stored
+                    matches.append({
+                        'match_type': 'semantic_similarity',
+                        'confidence': c['score'],
+                        'qsp_section': section,
+                        'similarity_score': c['score']
+                    })
+            impacts_by_delta.append({
+                'delta_index': delta_index,
+                'impacts': [self._build_impact(delta, m, delta_index) for m in matches]
+            })
+        
+        logger.info(f"Recomputed run {run_id} for document {doc_id} ({len(doc_sections)} sections)")
         
         return {
             'success': True,
             'run_id': run_id,
-            'total_changes_analyzed': len(deltas),
-            'total_impacts_found': len(all_impacts),
-            'threshold': self.impact_threshold,
-            'impacts': all_impacts
+            'doc_id': doc_id,
+            'deltas': impacts_by_delta
         }
     
+    async def _store_section_table(self, tenant_id: str, qsp_sections: List[Dict[str, Any]]) -> Optional[str]:
+        """Persist the score matrix section table of a corpus (once per distinct corpus)"""
+        if not qsp_sections:
+            return None
+        
+        cached = self.qsp_sections.get(tenant_id) is qsp_sections
+        if cached and tenant_id in self._section_tables:
+            return self._section_tables[tenant_id]
+        
+        table_id, entries = section_table(tenant_id, qsp_sections, self._section_identity)
+        if self.db is not None:
+            try:
+                await self.db.impact_section_tables.update_one(
+                    {'_id': table_id},
+                    {'$setOnInsert': {'tenant_id': tenant_id, 'sections': entries, 'created_at': datetime.utcnow()}},
+                    upsert=True
+                )
+            except Exception as e:
+                # Only threshold sweeps and explanations depend on this; the run itself is still valid
+                logger.error(f"Failed to persist section table for tenant {tenant_id}: {e}")
+                return None
+        
+        if cached:
+            self._section_tables[tenant_id] = table_id
+        return table_id
+    
+    async def _load_run_scores(
+        self,
+        tenant_id: str,
+        run_id: str,
+        delta_index: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, List[Dict[str, Any]]]]:
+        """Stored per-delta score data of a run (in delta order) and the section tables it references"""
+        query: Dict[str, Any] = {'tenant_id': tenant_id, 'run_id': run_id}
+        if delta_index is not None:
+            query['delta_index'] = delta_index
+        run_deltas = await self.db.impact_run_deltas.find(
+            query,
+            {'_id': 0, 'embedding': 0, 'hunk_embedding': 0, 'candidates': 0}
+        ).sort('delta_index', 1).to_list(length=None)
+        
+        table_ids = list({rd['score_matrix']['table'] for rd in run_deltas if rd.get('score_matrix')})
+        tables = {}
+        if table_ids:
+            cursor = self.db.impact_section_tables.find({'_id': {'$in': table_ids}, 'tenant_id': tenant_id})
+            async for table in cursor:
+                tables[table['_id']] = table['sections']
+        return run_deltas, tables
+    
+    async def sweep_run(
+        self,
+        tenant_id: str,
+        run_id: str,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Re-derive a run's matches at another threshold/top_k from its stored scores
+        (defaults are the values the run used). Explicit-reference deltas don't
+        depend on the threshold; only top_k limits them.
+        """
+        if self.db is None:
+            return {'success': False, 'error': 'MongoDB not available for score data'}
+        
+        run_deltas, tables = await self._load_run_scores(tenant_id, run_id)
+        if not run_deltas:
+            return {'success': False, 'error': f'No stored score data for run {run_id}'}
+        
+        deltas_out = []
+        total = 0
+        for run_delta in run_deltas:
+            delta = run_delta['delta']
+            delta_threshold = threshold if threshold is not None else run_delta.get('threshold', self.impact_threshold)
+            delta_top_k = top_k if top_k is not None else run_delta.get('top_k', self.analysis_top_k)
+            entry = {
+                'delta_index': run_delta['delta_index'],
+                'clause_id': delta.get('clause_id'),
+                'change_type': delta.get('change_type'),
+                'threshold': delta_threshold,
+                'top_k': delta_top_k,
+                'match_type': None,
+                'matches': []
+            }
+            
+            if run_delta.get('explicit_sections'):
+                entry['match_type'] = 'explicit_reference'
+                entry['matches'] = [
+                    {**section, 'rank': rank, 'score': 1.0}
+                    for rank, section in enumerate(run_delta['explicit_sections'][:delta_top_k], start=1)
+                ]
+            elif run_delta.get('score_matrix'):
+                matrix = run_delta['score_matrix']
+                sections = tables.get(matrix['table'], [])
+                positions, scores = decode_scores(matrix)
+                matched = derive_matches(scores, delta_threshold, delta_top_k)
+                entry['match_type'] = 'semantic_similarity'
+                entry['matches'] = [
+                    {**sections[position], 'rank': rank, 'score': round(float(score), 3)}
+                    for rank, (position, score) in enumerate(zip(positions[:matched], scores[:matched]), start=1)
+                    if position < len(sections)
+                ]
+            
+            total += len(entry['matches'])
+            deltas_out.append(entry)
+        
+        return {
+            'success': True,
+            'run_id': run_id,
+            'threshold': threshold,
+            'top_k': top_k,
+            'total_impacts_found': total,
+            'deltas': deltas_out
+        }
+    
+    async def explain_match(
+        self,
+        tenant_id: str,
+        run_id: str,
+        delta_index: int,
+        section_key: Optional[str] = None,
+        doc_id: Optional[str] = None,
+        section_path: Optional[str] = None,
+        threshold: Optional[float] = None,
+        top_k: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Why a QSP section did or didn't match one delta of a run, from stored scores"""
+        if self.db is None:
+            return {'success': False, 'error': 'MongoDB not available for score data'}
+        
+        run_deltas, tables = await self._load_run_scores(tenant_id, run_id, delta_index)
+        if not run_deltas:
+            return {'success': False, 'error': f'No stored score data for delta {delta_index} of run {run_id}'}
+        run_delta = run_deltas[0]
+        delta = run_delta['delta']
+        threshold = threshold if threshold is not None else run_delta.get('threshold', self.impact_threshold)
+        top_k = top_k if top_k is not None else run_delta.get('top_k', self.analysis_top_k)
+        
+        result = {
+            'success': True,
+            'run_id': run_id,
+            'delta_index': delta_index,
+            'clause_id': delta.get('clause_id'),
+            'threshold': threshold,
+            'top_k': top_k,
+            'matched': False,
+            'score': None,
+            'rank': None
+        }
+        
+        explicit = run_delta.get('explicit_sections') or []
+        if explicit:
+            position = find_position(explicit, section_key, doc_id, section_path)
+            if position is None:
+                reason = 'not_referenced'
+                explanation = (f"Clause {delta.get('clause_id')} was matched through explicit references only, "
+                               f"and this section does not reference it")
+            else:
+                section = explicit[position]
+                result.update({'section': section, 'rank': position + 1, 'score': 1.0, 'matched': position < top_k})
+                reason = 'explicit_reference' if result['matched'] else 'outside_top_k'
+                explanation = (f"The section explicitly references clause {delta.get('clause_id')}"
+                               + ("" if result['matched'] else f", but {top_k} other referencing sections were kept first"))
+            result.update({'reason': reason, 'explanation': explanation})
+            return result
+        
+        matrix = run_delta.get('score_matrix')
+        if matrix is None:
+            result.update({
+                'reason': 'no_score_data',
+                'explanation': 'No similarity scores were stored for this delta (no change text, or the run predates score storage)'
+            })
+            return result
+        
+        sections = tables.get(matrix['table'], [])
+        position = find_position(sections, section_key, doc_id, section_path)
+        if position is None:
+            result.update({
+                'reason': 'not_in_corpus',
+                'explanation': 'The section was not part of the QSP corpus when the run was analyzed'
+            })
+            return result
+        
+        section = sections[position]
+        result['section'] = section
+        
+        current = await self.db.qsp_sections.find_one(
+            {
+                'tenant_id': tenant_id,
+                'doc_id': section['doc_id'],
+                '$or': [{'section_key': section['section_key']}, {'section_id': section['section_key']}]
+            },
+            {'_id': 0, 'content_hash': 1}
+        )
+        result['section_changed_since_run'] = current is None or current.get('content_hash', '') != section['content_hash']
+        
+        if not section.get('embedded'):
+            result.update({'reason': 'no_embedding', 'explanation': 'The section had no embedding and was not scored'})
+            return result
+        
+        positions, scores = decode_scores(matrix)
+        matched = derive_matches(scores, threshold, top_k)
+        hits = np.nonzero(positions == position)[0]
+        if hits.size:
+            index = int(hits[0])
+            score = float(scores[index])
+            result.update({'rank': index + 1, 'score': round(score, 3), 'matched': index < matched})
+            if index < matched:
+                reason = 'matched'
+                explanation = f"Similarity {score:.3f} ranks #{index + 1}, within top {top_k} and above threshold {threshold}"
+            elif score < threshold:
+                reason = 'below_threshold'
+                explanation = f"Similarity {score:.3f} is below threshold {threshold}"
+            else:
+                reason = 'outside_top_k'
+                explanation = f"Similarity {score:.3f} passes threshold {threshold} but ranks #{index + 1}, outside top {top_k}"
+        else:
+            # Not among the stored top-N: its score is at most the lowest stored one
+            floor = float(scores[-1]) if len(scores) else None
+            result.update({'score_upper_bound': round(floor, 3) if floor is not None else None,
+                           'rank_lower_bound': len(scores) + 1})
+            if floor is None or floor < threshold:
+                reason = 'below_threshold'
+                explanation = f"Similarity is below threshold {threshold}" + (
+                    f" (at most {floor:.3f})" if floor is not None else "")
+            else:
+                reason = 'outside_top_k'
+                explanation = f"Similarity is at most {floor:.3f} and ranks below #{len(scores)}, outside top {top_k}"
+        
+        result.update({'reason': reason, 'explanation': explanation})
+        return result
+    
     def get_report(
         self,
         run_id: str,
@@ -510,7 +1212,7 @@ class ChangeImpactServiceMongo:
             }
         """
         # Step 1: Run existing vector search
-        qsp_impacts = await self.detect_impacts_async(tenant_id, deltas, top_k=5)
+        qsp_impacts = await self.detect_impacts_async(tenant_id, deltas, top_k=self.analysis_top_k)
         
         # Extract the impacts list from the result
         impacts_list = qsp_impacts.get('impacts', [])
@@ -518,28 +1220,7 @@ class ChangeImpactServiceMongo:
         # Step 2: For each QSP section, extract downstream impacts
         if include_downstream:
             for impact in impacts_list:
-                qsp_clause = impact.get('qsp_clause', '')
-                qsp_doc = impact.get('qsp_doc', '')
-                
-                # Get the section from DB to access references
-                section = await self._get_section_by_clause(tenant_id, qsp_clause, qsp_doc)
-                
-                if section and 'references' in section:
-                    refs = section['references']
-                    
-                    # Enrich with names from catalogs
-                    forms = await self._enrich_forms(tenant_id, refs.get('forms', []))
-                    wis = await self._enrich_wis(tenant_id, refs.get('work_instructions', []))
-                    
-                    impact['downstream_impacts'] = {
-                        'forms': forms,
-                        'work_instructions': wis
-                    }
-                else:
-                    impact['downstream_impacts'] = {
-                        'forms': [],
-                        'work_instructions': []
-                    }
+                impact['downstream_impacts'] = await self.get_downstream_impacts(tenant_id, impact)
         
         # Step 3: Generate summary
         summary = self._generate_summary(impacts_list)
@@ -554,6 +1235,79 @@ class ChangeImpactServiceMongo:
             }
         }
     
+    async def stream_with_cascade(
+        self,
+        tenant_id: str,
+        deltas: List[Dict],
+        run_id: Optional[str] = None,
+        top_k: Optional[int] = None,
+        include_downstream: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of analyze_with_cascade
+        
+        Yields {"run_id", "delta_index", "impacts"} for each delta as soon as its
+        impacts (with downstream Forms/WIs) are known, so nothing accumulates
+        across deltas. Per-delta score data is stored as each delta completes.
+        Raises LookupError when the tenant has no QSP sections.
+        """
+        run_id = run_id or str(uuid.uuid4())
+        top_k = top_k or self.analysis_top_k
+        qsp_sections = await self._load_qsp_sections(tenant_id)
+        if not qsp_sections:
+            raise LookupError('No QSP sections found. Please upload and map QSP documents in Tab 2 first.')
+        
+        table_id = await self._store_section_table(tenant_id, qsp_sections)
+        
+        for delta_index, delta in enumerate(deltas):
+            impacts, run_delta = await self._analyze_delta(
+                tenant_id, run_id, delta, delta_index, qsp_sections, top_k, table_id
+            )
+            
+            if include_downstream:
+                for impact in impacts:
+                    impact['downstream_impacts'] = await self.get_downstream_impacts(tenant_id, impact)
+            
+            if self.db is not None and run_delta is not None:
+                try:
+                    await self.db.impact_run_deltas.insert_one(run_delta)
+                except Exception as e:
+                    # Only incremental re-analysis depends on this; the run itself is still valid
+                    logger.error(f"Failed to persist score data of delta {delta_index} for run {run_id}: {e}")
+            
+            yield {
+                'run_id': run_id,
+                'delta_index': delta_index,
+                'impacts': impacts
+            }
+        
+        logger.info(f"✅ Streamed impact analysis complete: run_id={run_id}, {len(deltas)} deltas")
+    
+    async def get_downstream_impacts(self, tenant_id: str, impact: Dict[str, Any]) -> Dict[str, List[Dict]]:
+        """Forms and WIs referenced by the impacted QSP section"""
+        qsp_clause = impact.get('qsp_clause', '')
+        qsp_doc = impact.get('qsp_doc', '')
+        
+        # Get the section from DB to access references
+        section = await self._get_section_by_clause(tenant_id, qsp_clause, qsp_doc)
+        
+        if section and 'references' in section:
+            refs = section['references']
+            
+            # Enrich with names from catalogs
+            forms = await self._enrich_forms(tenant_id, refs.get('forms', []))
+            wis = await self._enrich_wis(tenant_id, refs.get('work_instructions', []))
+            
+            return {
+                'forms': forms,
+                'work_instructions': wis
+            }
+        
+        return {
+            'forms': [],
+            'work_instructions': []
+        }
+    
     async def _get_section_by_clause(self, tenant_id: str, qsp_clause: str, qsp_doc: str) -> Optional[Dict]:
         """Retrieve section from MongoDB by clause and doc"""
         if self.db is None:
@@ -612,28 +1366,24 @@ class ChangeImpactServiceMongo:
         
         return results
     
-    def _generate_summary(self, impacts: List[Dict]) -> Dict:
-        """Generate summary statistics"""
-        total_forms = 0
-        total_wis = 0
-        change_types = {}
+    def _generate_summary(self, impacts: List[Dict], summary: Optional[Dict] = None) -> Dict:
+        """Generate summary statistics (added to summary when given, for streamed batches)"""
+        if summary is None:
+            summary = {'total_qsp_sections': 0, 'total_forms': 0, 'total_wis': 0, 'by_change_type': {}}
+        change_types = summary['by_change_type']
 
         for impact in impacts:
             # Count downstream impacts
             if 'downstream_impacts' in impact:
-                total_forms += len(impact['downstream_impacts'].get('forms', []))
-                total_wis += len(impact['downstream_impacts'].get('work_instructions', []))
+                summary['total_forms'] += len(impact['downstream_impacts'].get('forms', []))
+                summary['total_wis'] += len(impact['downstream_impacts'].get('work_instructions', []))
 
             # Count by change type
             change_type = impact.get('change_type', 'unknown')
             change_types[change_type] = change_types.get(change_type, 0) + 1
 
-        return {
-            'total_qsp_sections': len(impacts),
-            'total_forms': total_forms,
-            'total_wis': total_wis,
-            'by_change_type': change_types
-        }
+        summary['total_qsp_sections'] += len(impacts)
+        return summary
 
     async def analyze_full_hierarchy(
         self,
@@ -657,7 +1407,7 @@ class ChangeImpactServiceMongo:
         analysis_date = datetime.utcnow().isoformat()
 
         # Step 1: Run QSP impact detection (Levels 1-2)
-        qsp_results = await self.detect_impacts_async(tenant_id, deltas, top_k=5)
+        qsp_results = await self.detect_impacts_async(tenant_id, deltas, top_k=self.analysis_top_k)
 
         if not qsp_results.get('success'):
             return {
@@ -668,6 +1418,8 @@ class ChangeImpactServiceMongo:
             }
 
         impacts = qsp_results.get('impacts', [])
+        # Per-delta score data is stored under the QSP detection run
+        run_id = qsp_results.get('run_id', run_id)
 
         # Step 2: For each QSP impact, trace full hierarchy
         full_impacts = []
@@ -0,0 +1,75 @@
+"""
+Clause Index - Resolves changed ISO clauses to the clause mappings covering them
+Replaces per-clause substring scans over every mapping with one trie lookup
+"""
+from typing import Any, Dict, Iterable, List
+
+
+class ClauseIndex:
+    """
+    Trie over the suffixes of every mapped clause title ("7.3.2 Design inputs")
+
+    Gap detection treats a changed clause as covered when it occurs anywhere in
+    a mapping's iso_clause, so "7.3" covers "7.3.2 Design inputs" but also
+    "17.3 ..." and "7.30 ...". Walking a changed clause from the root of a
+    suffix trie answers exactly that substring test in O(len(clause)). Each
+    node records the clause groups passing through it, so a lookup never
+    descends further. Depth is capped at the longest clause that will be
+    looked up, and suffixes starting with a character no lookup starts with
+    are skipped, which keeps the trie small.
+    """
+
+    def __init__(self, mappings: Iterable[Dict[str, Any]], changed_clauses: Iterable[str]):
+        # Mappings grouped by iso_clause, in first-seen order (the order gaps are reported in)
+        self.groups: Dict[str, List[Dict[str, Any]]] = {}
+        for mapping in mappings:
+            self.groups.setdefault(mapping['iso_clause'], []).append(mapping)
+
+        self._clauses = list(self.groups)
+        self._order = {clause: position for position, clause in enumerate(self._clauses)}
+        # Node children by character; the None key holds the positions of the
+        # clauses containing the node's path
+        self._root: Dict[Any, Any] = {None: list(range(len(self._clauses)))}
+
+        changed_clauses = [clause for clause in changed_clauses if clause]
+        depth = max(map(len, changed_clauses), default=0)
+        first_chars = {clause[0] for clause in changed_clauses}
+        for clause in self._clauses:
+            self._insert(clause, depth, first_chars)
+
+    def _insert(self, clause: str, depth: int, first_chars: set):
+        position = self._order[clause]
+        for start in range(len(clause)):
+            if clause[start] not in first_chars:
+                continue
+            node = self._root
+            for char in clause[start:start + depth]:
+                child = node.get(char)
+                if child is None:
+                    child = node[char] = {None: []}
+                # Clauses are inserted in order, so each node's list stays sorted and
+                # a repeat substring of the same clause only ever repeats the tail
+                holders = child[None]
+                if not holders or holders[-1] != position:
+                    holders.append(position)
+                node = child
+
+    def covering_clauses(self, changed_clause: str) -> List[str]:
+        """
+        Mapped clauses containing changed_clause, in first-seen order
+        (changed_clause must be one of the clauses the index was built for)
+        """
+        node = self._root
+        for char in changed_clause:
+            node = node.get(char)
+            if node is None:
+                return []
+        return [self._clauses[position] for position in node[None]]
+
+    def covering_mappings(self, changed_clause: str) -> List[Dict[str, Any]]:
+        """Mappings of every clause containing changed_clause"""
+        return [
+            mapping
+            for clause in self.covering_clauses(changed_clause)
+            for mapping in self.groups[clause]
+        ]
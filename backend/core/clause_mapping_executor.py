@@ -0,0 +1,292 @@
+"""
+Clause Mapping Executor - Concurrent, cached LLM clause mapping
+Bounds in-flight GPT-4o requests, caches responses by content hash, model and
+prompt version (in memory and in MongoDB), and retries timeouts/errors with
+jittered backoff while accounting tokens and latency per call
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from emergentintegrations.llm.chat import LlmChat, UserMessage
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever SYSTEM_MESSAGE or the user prompt changes; invalidates cached responses
+PROMPT_VERSION = "clause-mapping-v1"
+
+SYSTEM_MESSAGE = """You are an expert in ISO 13485 compliance for medical devices.
+            Analyze QSP document sections and map them to relevant ISO 13485:2024 clauses.
+
+            For each mapping, provide:
+            1. The ISO clause number and title
+            2. Confidence score (0.0-1.0) based on relevance
+            3. Evidence text from the QSP that supports the mapping
+            4. Brief explanation of the mapping
+
+            Return results as a JSON array with this structure:
+            [
+                {
+                    "iso_clause": "4.1 General requirements",
+                    "confidence_score": 0.85,
+                    "evidence_text": "relevant excerpt from QSP",
+                    "explanation": "brief explanation of why this maps"
+                }
+            ]"""
+
+
+def build_user_prompt(qsp_content: str, qsp_filename: str, iso_clauses: List[str]) -> str:
+    iso_clauses_text = "\n".join([f"- {clause}" for clause in iso_clauses])
+
+    return f"""Analyze this QSP document content and map it to relevant ISO 13485:2024 clauses:
+
+QSP Document: {qsp_filename}
+Content:
+{qsp_content[:3000]}...
+
+ISO 13485:2024 Key Clauses to consider:
+{iso_clauses_text}
+
+Provide detailed mappings with confidence scores."""
+
+
+def parse_mappings(response: str) -> List[Dict[str, Any]]:
+    """Parse the model's JSON array; raises json.JSONDecodeError on malformed output"""
+    # Clean the response - remove markdown formatting if present
+    clean_response = response.strip()
+    if clean_response.startswith('```json'):
+        clean_response = clean_response[7:]  # Remove ```json
+    if clean_response.endswith('```'):
+        clean_response = clean_response[:-3]  # Remove ```
+    clean_response = clean_response.strip()
+
+    mappings = json.loads(clean_response)
+    return mappings if isinstance(mappings, list) else []
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); the chat client reports no usage"""
+    return max(1, len(text) // 4)
+
+
+class ClauseMappingExecutor:
+    """Runs LLM clause mapping requests with bounded concurrency and a response cache"""
+
+    def __init__(self, db: Optional[AsyncIOMotorDatabase] = None):
+        self.db = db
+        self.collection = db["llm_mapping_cache"] if db is not None else None
+
+        self.provider = "openai"
+        self.model = os.getenv("CLAUSE_MAPPING_MODEL", "gpt-4o")
+        self.max_concurrency = int(os.getenv("CLAUSE_MAPPING_LLM_CONCURRENCY", "4"))
+        self.timeout = float(os.getenv("CLAUSE_MAPPING_LLM_TIMEOUT", "60"))
+        self.max_attempts = int(os.getenv("CLAUSE_MAPPING_LLM_ATTEMPTS", "3"))
+        self.backoff_base = 1.0
+        self.backoff_max = 20.0
+
+        # In-process LRU in front of the MongoDB cache
+        self.memory_cache_size = 2048
+        self._memory_cache: "OrderedDict[str, List[Dict[str, Any]]]" = OrderedDict()
+        # Identical requests in flight share one LLM call
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.stats = {
+            'requests': 0,
+            'cache_hits': 0,
+            'llm_calls': 0,
+            'retries': 0,
+            'timeouts': 0,
+            'failures': 0,
+            'input_tokens': 0,
+            'output_tokens': 0,
+            'llm_seconds': 0.0
+        }
+
+    def set_database(self, db: AsyncIOMotorDatabase):
+        """Set database connection"""
+        self.db = db
+        self.collection = db["llm_mapping_cache"]
+
+    def cache_key(self, user_prompt: str) -> str:
+        """Hash of everything that determines the response"""
+        payload = "\x1f".join([PROMPT_VERSION, self.provider, self.model, SYSTEM_MESSAGE, user_prompt])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_stats(self) -> Dict[str, Any]:
+        calls = self.stats['llm_calls']
+        requests = self.stats['requests']
+        return {
+            **self.stats,
+            'model': self.model,
+            'prompt_version': PROMPT_VERSION,
+            'cache_hit_rate': self.stats['cache_hits'] / requests if requests else 0.0,
+            'avg_llm_latency_ms': self.stats['llm_seconds'] * 1000 / calls if calls else 0.0
+        }
+
+    async def map_section(self, qsp_content: str, qsp_filename: str, iso_clauses: List[str]) -> List[Dict[str, Any]]:
+        """
+        Map one QSP section to ISO clauses
+        Returns [] when the model fails or answers with malformed JSON (not cached)
+        """
+        self.stats['requests'] += 1
+        user_prompt = build_user_prompt(qsp_content, qsp_filename, iso_clauses)
+        key = self.cache_key(user_prompt)
+
+        cached = await self._cache_get(key)
+        if cached is not None:
+            self.stats['cache_hits'] += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats['cache_hits'] += 1
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            mappings = await self._call_llm(user_prompt, qsp_filename)
+            if mappings is not None:
+                await self._cache_put(key, mappings)
+            result = mappings or []
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no duplicate request was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def map_sections(
+        self,
+        sections: List[Tuple[str, str]],
+        qsp_filename: str,
+        iso_clauses: List[str]
+    ) -> List[List[Dict[str, Any]]]:
+        """Map (section_title, section_content) pairs concurrently; results in input order"""
+        async def map_one(section_title: str, section_content: str) -> List[Dict[str, Any]]:
+            try:
+                return await self.map_section(section_content, qsp_filename, iso_clauses)
+            except Exception as e:
+                logger.error(f"Error in AI clause mapping for {qsp_filename} / {section_title}: {e}")
+                return []
+
+        return await asyncio.gather(*(map_one(title, content) for title, content in sections))
+
+    async def _call_llm(self, user_prompt: str, qsp_filename: str) -> Optional[List[Dict[str, Any]]]:
+        """One mapping request with timeout and jittered retries; None if it failed"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async with self._semaphore:
+            for attempt in range(1, self.max_attempts + 1):
+                chat = LlmChat(
+                    api_key=os.environ.get('EMERGENT_LLM_KEY'),
+                    session_id=f"mapping_{uuid.uuid4()}",
+                    system_message=SYSTEM_MESSAGE
+                ).with_model(self.provider, self.model)
+
+                start = time.perf_counter()
+                try:
+                    response = await asyncio.wait_for(
+                        chat.send_message(UserMessage(text=user_prompt)),
+                        timeout=self.timeout
+                    )
+                except Exception as e:
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.stats['timeouts'] += 1
+                        error = f"timed out after {self.timeout:.0f}s"
+                    else:
+                        error = str(e)
+
+                    if attempt == self.max_attempts:
+                        self.stats['failures'] += 1
+                        logger.error(f"AI clause mapping failed for {qsp_filename} after {attempt} attempts: {error}")
+                        return None
+
+                    # Exponential backoff with full jitter
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+                    self.stats['retries'] += 1
+                    logger.warning(f"AI clause mapping attempt {attempt} for {qsp_filename} failed ({error}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+
+                elapsed = time.perf_counter() - start
+                input_tokens = estimate_tokens(SYSTEM_MESSAGE) + estimate_tokens(user_prompt)
+                output_tokens = estimate_tokens(response)
+                self.stats['llm_calls'] += 1
+                self.stats['llm_seconds'] += elapsed
+                self.stats['input_tokens'] += input_tokens
+                self.stats['output_tokens'] += output_tokens
+                logger.info(
+                    f"AI clause mapping {qsp_filename}: {elapsed * 1000:.0f}ms, "
+                    f"~{input_tokens} input / ~{output_tokens} output tokens, attempt {attempt}"
+                )
+
+                try:
+                    return parse_mappings(response)
+                except json.JSONDecodeError:
+                    self.stats['failures'] += 1
+                    logger.error(f"Failed to parse AI response as JSON: {response}")
+                    return None
+
+        return None
+
+    async def _cache_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if key in self._memory_cache:
+            self._memory_cache.move_to_end(key)
+            return self._memory_cache[key]
+
+        if self.collection is None:
+            return None
+        try:
+            doc = await self.collection.find_one({"_id": key}, {"mappings": 1})
+        except Exception as e:
+            logger.warning(f"Clause mapping cache lookup failed: {e}")
+            return None
+        if doc is None:
+            return None
+
+        self._remember(key, doc["mappings"])
+        return doc["mappings"]
+
+    async def _cache_put(self, key: str, mappings: List[Dict[str, Any]]):
+        self._remember(key, mappings)
+        if self.collection is None:
+            return
+        try:
+            await self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "mappings": mappings,
+                    "model": self.model,
+                    "prompt_version": PROMPT_VERSION,
+                    "created_at": datetime.now(timezone.utc).isoformat()
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Clause mapping cache write failed: {e}")
+
+    def _remember(self, key: str, mappings: List[Dict[str, Any]]):
+        self._memory_cache[key] = mappings
+        self._memory_cache.move_to_end(key)
+        while len(self._memory_cache) > self.memory_cache_size:
+            self._memory_cache.popitem(last=False)
+
+
+# Global instance
+clause_mapping_executor = ClauseMappingExecutor()
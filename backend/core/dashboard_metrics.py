@@ -0,0 +1,210 @@
+"""
+Dashboard Metrics - Per-tenant metrics snapshot
+The dashboard reads one snapshot document per tenant. Writers of gap results,
+diffs, QSP sections and users keep it current with $inc updates where the
+change is known, or by recomputing just their part with one projected
+$facet aggregation.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+# Snapshot part -> (source collection, projected fields, $facet branch)
+METRIC_PARTS = {
+    'gaps': (
+        'gap_results',
+        {'is_reviewed': 1, 'created_at': 1},
+        [{'$group': {
+            '_id': None,
+            'total_gaps': {'$sum': 1},
+            'total_reviewed': {'$sum': {'$cond': [{'$eq': ['$is_reviewed', True]}, 1, 0]}},
+            'last_analysis_date': {'$max': '$created_at'}
+        }}]
+    ),
+    'diffs': (
+        'diff_results',
+        {
+            'created_at': 1,
+            # Count change types server-side; deltas themselves never leave MongoDB
+            'new_clauses_count': {'$size': {'$filter': {
+                'input': {'$ifNull': ['$deltas', []]},
+                'cond': {'$in': [{'$toLower': {'$ifNull': ['$$this.change_type', '']}}, ['added', 'new']]}
+            }}},
+            'modified_clauses_count': {'$size': {'$filter': {
+                'input': {'$ifNull': ['$deltas', []]},
+                'cond': {'$eq': [{'$toLower': {'$ifNull': ['$$this.change_type', '']}}, 'modified']}
+            }}}
+        },
+        [
+            {'$sort': {'created_at': -1}},
+            {'$group': {
+                '_id': None,
+                'total_diffs': {'$sum': 1},
+                # Change counts come from the latest diff
+                'new_clauses_count': {'$first': '$new_clauses_count'},
+                'modified_clauses_count': {'$first': '$modified_clauses_count'}
+            }}
+        ]
+    ),
+    'sections': (
+        'qsp_sections',
+        {'doc_id': 1},
+        [
+            {'$group': {'_id': '$doc_id', 'sections': {'$sum': 1}}},
+            {'$group': {
+                '_id': None,
+                'total_documents': {'$sum': {'$cond': [{'$eq': ['$_id', None]}, 0, 1]}},
+                'total_mappings': {'$sum': '$sections'}
+            }}
+        ]
+    ),
+    'users': (
+        'users',
+        {'_id': 1},
+        [{'$group': {'_id': None, 'total_users': {'$sum': 1}}}]
+    ),
+}
+
+# Snapshot fields and their value when a part has no documents
+METRIC_DEFAULTS = {
+    'gaps': {'total_gaps': 0, 'total_reviewed': 0, 'last_analysis_date': None},
+    'diffs': {'total_diffs': 0, 'new_clauses_count': 0, 'modified_clauses_count': 0},
+    'sections': {'total_documents': 0, 'total_mappings': 0},
+    'users': {'total_users': 0},
+}
+
+
+class DashboardMetricsService:
+    """Maintains the dashboard_metrics snapshot collection"""
+
+    def __init__(self, db: Optional[AsyncIOMotorDatabase] = None):
+        self.db = db
+        self.collection = db["dashboard_metrics"] if db is not None else None
+        # Snapshots older than this are recomputed on read, bounding drift from
+        # writers that don't report (scripts, manual fixes)
+        self.max_age_seconds = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE", "3600"))
+
+    def set_database(self, db: AsyncIOMotorDatabase):
+        """Set database connection"""
+        self.db = db
+        self.collection = db["dashboard_metrics"]
+
+    async def get(self, tenant_id: str) -> Dict[str, Any]:
+        """The tenant's metrics snapshot, computed on first use or when stale"""
+        snapshot = await self.collection.find_one({'tenant_id': tenant_id}, {'_id': 0})
+
+        if snapshot is not None:
+            computed_at = snapshot.get('computed_at')
+            if computed_at is not None and computed_at.tzinfo is None:
+                computed_at = computed_at.replace(tzinfo=timezone.utc)
+            if computed_at is not None and (datetime.now(timezone.utc) - computed_at).total_seconds() < self.max_age_seconds:
+                return snapshot
+
+        return await self.refresh(tenant_id)
+
+    async def compute(self, tenant_id: str, parts: List[str]) -> Dict[str, Any]:
+        """Compute snapshot parts with one aggregation across their collections"""
+        pipeline: List[Dict[str, Any]] = []
+        base_collection = None
+
+        for part in parts:
+            collection_name, projection, _ = METRIC_PARTS[part]
+            branch = [
+                {'$match': {'tenant_id': tenant_id}},
+                {'$project': {**projection, '_part': {'$literal': part}}}
+            ]
+            if base_collection is None:
+                base_collection = collection_name
+                pipeline.extend(branch)
+            else:
+                pipeline.append({'$unionWith': {'coll': collection_name, 'pipeline': branch}})
+
+        pipeline.append({'$facet': {
+            part: [{'$match': {'_part': part}}] + METRIC_PARTS[part][2]
+            for part in parts
+        }})
+
+        results = await self.db[base_collection].aggregate(pipeline).to_list(length=1)
+        facets = results[0] if results else {}
+
+        metrics: Dict[str, Any] = {}
+        for part in parts:
+            values = dict(METRIC_DEFAULTS[part])
+            rows = facets.get(part) or []
+            if rows:
+                values.update({k: v for k, v in rows[0].items() if k != '_id'})
+            metrics.update(values)
+        return metrics
+
+    async def refresh(self, tenant_id: str, *parts: str) -> Dict[str, Any]:
+        """Recompute the given parts (all when none are given) and store them"""
+        full = not parts
+        metrics = await self.compute(tenant_id, list(parts) if parts else list(METRIC_PARTS))
+
+        update = {**metrics, 'tenant_id': tenant_id, 'updated_at': datetime.now(timezone.utc)}
+        if full:
+            update['computed_at'] = update['updated_at']
+            return await self.collection.find_one_and_update(
+                {'tenant_id': tenant_id},
+                {'$set': update},
+                upsert=True,
+                projection={'_id': 0},
+                return_document=ReturnDocument.AFTER
+            )
+
+        # A partial refresh only patches an existing snapshot; a missing one
+        # is computed in full by the next read
+        await self.collection.update_one({'tenant_id': tenant_id}, {'$set': update})
+        return metrics
+
+    async def update_parts(self, tenant_id: str, *parts: str):
+        """Recompute parts after writes whose effect on the counts isn't known"""
+        if self.collection is None:
+            return
+        try:
+            await self.refresh(tenant_id, *parts)
+        except Exception as e:
+            logger.warning(f"Dashboard metrics refresh failed for tenant {tenant_id}: {e}")
+
+    async def increment(self, tenant_id: str, **deltas: int):
+        """Apply known count changes to an existing snapshot"""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if self.collection is None or not deltas:
+            return
+        try:
+            await self.collection.update_one(
+                {'tenant_id': tenant_id},
+                {'$inc': deltas, '$set': {'updated_at': datetime.now(timezone.utc)}}
+            )
+        except Exception as e:
+            logger.warning(f"Dashboard metrics update failed for tenant {tenant_id}: {e}")
+
+    async def record_diff(self, tenant_id: str, deltas: List[Dict[str, Any]]):
+        """Account for a newly stored diff, which becomes the latest one"""
+        if self.collection is None:
+            return
+        change_types = [str(delta.get('change_type', '')).lower() for delta in deltas]
+        try:
+            await self.collection.update_one(
+                {'tenant_id': tenant_id},
+                {
+                    '$inc': {'total_diffs': 1},
+                    '$set': {
+                        'new_clauses_count': sum(1 for t in change_types if t in ('added', 'new')),
+                        'modified_clauses_count': sum(1 for t in change_types if t == 'modified'),
+                        'updated_at': datetime.now(timezone.utc)
+                    }
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Dashboard metrics update failed for tenant {tenant_id}: {e}")
+
+
+# Global instance
+dashboard_metrics = DashboardMetricsService()
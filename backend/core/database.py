@@ -0,0 +1,170 @@
+"""
+Database Provider - One application-wide MongoDB client
+Routers and services share a single tuned connection pool instead of opening
+their own clients; pool sizing, timeouts and read preference come from the
+environment, and pool events are counted for monitoring
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Client option -> (environment variable, default, type)
+POOL_OPTIONS = {
+    'maxPoolSize': ('MONGO_MAX_POOL_SIZE', 100, int),
+    'minPoolSize': ('MONGO_MIN_POOL_SIZE', 5, int),
+    'maxIdleTimeMS': ('MONGO_MAX_IDLE_TIME_MS', 300000, int),
+    'maxConnecting': ('MONGO_MAX_CONNECTING', 4, int),
+    'waitQueueTimeoutMS': ('MONGO_WAIT_QUEUE_TIMEOUT_MS', 10000, int),
+    'connectTimeoutMS': ('MONGO_CONNECT_TIMEOUT_MS', 10000, int),
+    'serverSelectionTimeoutMS': ('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000, int),
+    'socketTimeoutMS': ('MONGO_SOCKET_TIMEOUT_MS', 60000, int),
+    'readPreference': ('MONGO_READ_PREFERENCE', 'primary', str),
+    'retryWrites': ('MONGO_RETRY_WRITES', True, lambda v: str(v).lower() in ('1', 'true', 'yes')),
+    'appname': ('MONGO_APP_NAME', 'qsp-compliance-checker', str),
+}
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts connection pool events; pymongo calls these from its own threads"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'connections_created': 0,
+            'connections_closed': 0,
+            'checked_out': 0,
+            'checkout_failures': 0,
+            'pools_cleared': 0
+        }
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.open_connections = 0
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pools_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.counters['connections_created'] += 1
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.counters['connections_closed'] += 1
+            self.open_connections -= 1
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout_failures')
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.counters['checked_out'] += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.in_use -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self.counters,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'open_connections': self.open_connections
+            }
+
+
+class DatabaseProvider:
+    """Lazily creates the shared client on first use"""
+
+    def __init__(self):
+        self.mongo_url: Optional[str] = None
+        self.db_name: Optional[str] = None
+        self.pool_metrics = PoolMetrics()
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._lock = threading.Lock()
+
+    def configure(self, mongo_url: Optional[str] = None, db_name: Optional[str] = None):
+        """Override MONGO_URL / DB_NAME (before the client is first used)"""
+        if mongo_url:
+            self.mongo_url = mongo_url
+        if db_name:
+            self.db_name = db_name
+
+    def client_options(self) -> Dict[str, Any]:
+        options = {}
+        for option, (env_var, default, cast) in POOL_OPTIONS.items():
+            value = os.environ.get(env_var)
+            options[option] = cast(value) if value is not None else default
+        return options
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    options = self.client_options()
+                    self._client = AsyncIOMotorClient(
+                        self.mongo_url or os.environ['MONGO_URL'],
+                        event_listeners=[self.pool_metrics],
+                        **options
+                    )
+                    logger.info(
+                        f"MongoDB client created (pool {options['minPoolSize']}-{options['maxPoolSize']}, "
+                        f"read preference {options['readPreference']})"
+                    )
+        return self._client
+
+    @property
+    def db(self) -> AsyncIOMotorDatabase:
+        return self.client[self.db_name or os.environ['DB_NAME']]
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        options = self.client_options()
+        return {
+            **self.pool_metrics.snapshot(),
+            'max_pool_size': options['maxPoolSize'],
+            'min_pool_size': options['minPoolSize'],
+            'read_preference': options['readPreference']
+        }
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+# Singleton instance
+database_provider = DatabaseProvider()
+
+
+def get_database() -> AsyncIOMotorDatabase:
+    """The shared database handle"""
+    return database_provider.db
@@ -0,0 +1,209 @@
+"""
+Database Indexes - Declarative index registry and query-plan verification
+Indexes for every hot collection are declared here and applied idempotently
+at startup; HOT_QUERIES are the filters/sorts the application issues, and
+verify_query_plans() explains each one to flag collection scans
+"""
+import logging
+from typing import Any, Dict, List
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from core.run_memo import RUN_MEMO_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Server error codes for an existing index with the same name/keys but other options
+INDEX_CONFLICT_CODES = (85, 86)
+DUPLICATE_KEY_CODE = 11000
+
+# Operator-run migrations resolving index failures that need data changes
+INDEX_MIGRATIONS = {
+    'gap_results': 'migrate_gap_results_index.py',
+}
+
+# collection -> indexes (default key-derived names, matching the seed scripts)
+INDEX_REGISTRY: Dict[str, List[IndexModel]] = {
+    'qsp_sections': [
+        IndexModel([('tenant_id', ASCENDING), ('doc_id', ASCENDING), ('section_key', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('doc_id', ASCENDING), ('section_path', ASCENDING)]),
+    ],
+    'regulatory_references': [
+        IndexModel([('tenant_id', ASCENDING), ('standard', ASCENDING), ('clause', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('qsp_id', ASCENDING)]),
+    ],
+    'gap_results': [
+        # Unique so bulk upserts of a run stay idempotent
+        IndexModel([('tenant_id', ASCENDING), ('run_id', ASCENDING), ('impact_index', ASCENDING)], unique=True),
+        IndexModel([('tenant_id', ASCENDING), ('id', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('created_at', DESCENDING)]),
+        # Filtered result pages, keyset on impact_index
+        IndexModel([('tenant_id', ASCENDING), ('run_id', ASCENDING), ('impact_level', ASCENDING), ('impact_index', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('run_id', ASCENDING), ('is_reviewed', ASCENDING), ('impact_index', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('run_id', ASCENDING), ('qsp_doc', ASCENDING), ('impact_index', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('run_id', ASCENDING), ('reg_clause', ASCENDING), ('impact_index', ASCENDING)]),
+    ],
+    'impact_run_deltas': [
+        IndexModel([('tenant_id', ASCENDING), ('run_id', ASCENDING), ('delta_index', ASCENDING)]),
+    ],
+    'document_hierarchy': [
+        IndexModel([('tenant_id', ASCENDING), ('document_id', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('document_type', ASCENDING)]),
+    ],
+    'document_references': [
+        IndexModel([('tenant_id', ASCENDING), ('source_doc_id', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('target_doc_id', ASCENDING)]),
+    ],
+    'regulatory_citations': [
+        IndexModel([('tenant_id', ASCENDING), ('document_id', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('framework', ASCENDING), ('clause_id', ASCENDING)]),
+    ],
+    'audit_logs': [
+        IndexModel([('tenant_id', ASCENDING), ('timestamp', DESCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('action', ASCENDING), ('timestamp', DESCENDING)]),
+    ],
+    'reports': [
+        IndexModel([('tenant_id', ASCENDING), ('created_at', DESCENDING)]),
+        IndexModel([('tenant_id', ASCENDING), ('report_path', ASCENDING)]),
+    ],
+    'diff_results': [
+        IndexModel([('tenant_id', ASCENDING), ('created_at', DESCENDING)]),
+    ],
+    'qsp_documents': [
+        IndexModel([('tenant_id', ASCENDING), ('id', ASCENDING)]),
+    ],
+    'clause_mappings': [
+        IndexModel([('tenant_id', ASCENDING), ('qsp_id', ASCENDING)]),
+    ],
+    'compliance_analyses': [
+        IndexModel([('tenant_id', ASCENDING), ('analysis_date', DESCENDING)]),
+    ],
+    'iso_summaries': [
+        IndexModel([('tenant_id', ASCENDING)]),
+    ],
+    'regulatory_documents': [
+        IndexModel([('tenant_id', ASCENDING), ('doc_id', ASCENDING)]),
+    ],
+    'users': [
+        IndexModel([('id', ASCENDING)]),
+        IndexModel([('email', ASCENDING)]),
+        IndexModel([('tenant_id', ASCENDING)]),
+    ],
+    'tenants': [
+        IndexModel([('id', ASCENDING)]),
+    ],
+    'corpus_versions': [
+        IndexModel([('tenant_id', ASCENDING)], unique=True),
+    ],
+    'run_memos': [
+        IndexModel([('created_at', ASCENDING)], expireAfterSeconds=RUN_MEMO_TTL_SECONDS),
+    ],
+    'dashboard_metrics': [
+        IndexModel([('tenant_id', ASCENDING)], unique=True),
+    ],
+    'forms_catalog': [
+        IndexModel([('tenant_id', ASCENDING), ('form_id', ASCENDING)], unique=True),
+    ],
+    'wi_catalog': [
+        IndexModel([('tenant_id', ASCENDING), ('wi_id', ASCENDING)], unique=True),
+    ],
+}
+
+# Representative hot queries: (name, collection, filter, sort)
+HOT_QUERIES = [
+    ('sections by tenant', 'qsp_sections', {'tenant_id': 't'}, None),
+    ('sections by document', 'qsp_sections', {'tenant_id': 't', 'doc_id': 'd'}, None),
+    ('section upsert', 'qsp_sections', {'tenant_id': 't', 'doc_id': 'd', 'section_key': 'k'}, None),
+    ('section by path', 'qsp_sections', {'tenant_id': 't', 'doc_id': 'd', 'section_path': 'p'}, None),
+    ('references by clause', 'regulatory_references',
+     {'tenant_id': 't', 'standard': 's', 'clause': 'c'}, None),
+    ('references by QSP', 'regulatory_references', {'tenant_id': 't', 'qsp_id': {'$nin': ['q']}}, None),
+    ('gap results of run', 'gap_results', {'tenant_id': 't', 'run_id': 'r'}, [('impact_index', ASCENDING)]),
+    ('gap result page', 'gap_results',
+     {'tenant_id': 't', 'run_id': 'r', 'impact_index': {'$gt': 0}}, [('impact_index', ASCENDING)]),
+    ('gap results by level', 'gap_results',
+     {'tenant_id': 't', 'run_id': 'r', 'impact_level': {'$in': ['High', 'Medium']}}, [('impact_index', ASCENDING)]),
+    ('gap results by review', 'gap_results',
+     {'tenant_id': 't', 'run_id': 'r', 'is_reviewed': True}, [('impact_index', ASCENDING)]),
+    ('gap results by QSP', 'gap_results', {'tenant_id': 't', 'run_id': 'r', 'qsp_doc': 'q'}, [('impact_index', ASCENDING)]),
+    ('gap results by clause', 'gap_results',
+     {'tenant_id': 't', 'run_id': 'r', 'reg_clause': 'c'}, [('impact_index', ASCENDING)]),
+    ('gap result upsert', 'gap_results', {'tenant_id': 't', 'run_id': 'r', 'impact_index': 0}, None),
+    ('gap result by id', 'gap_results', {'tenant_id': 't', 'id': 'i'}, None),
+    ('latest gap result', 'gap_results', {'tenant_id': 't'}, [('created_at', DESCENDING)]),
+    ('run deltas', 'impact_run_deltas', {'tenant_id': 't', 'run_id': 'r'}, [('delta_index', ASCENDING)]),
+    ('run delta', 'impact_run_deltas', {'tenant_id': 't', 'run_id': 'r', 'delta_index': 0}, None),
+    ('hierarchy document', 'document_hierarchy', {'tenant_id': 't', 'document_id': 'd'}, None),
+    ('hierarchy by type', 'document_hierarchy', {'tenant_id': 't', 'document_type': 'QSP'}, None),
+    ('audit log page', 'audit_logs', {'tenant_id': 't'}, [('timestamp', DESCENDING)]),
+    ('audit log by action', 'audit_logs', {'tenant_id': 't', 'action': 'a'}, [('timestamp', DESCENDING)]),
+    ('report list', 'reports', {'tenant_id': 't'}, [('created_at', DESCENDING)]),
+    ('report by path', 'reports', {'tenant_id': 't', 'report_path': 'p'}, None),
+    ('latest diff', 'diff_results', {'tenant_id': 't'}, [('created_at', DESCENDING)]),
+    ('QSP documents', 'qsp_documents', {'tenant_id': 't'}, None),
+    ('clause mappings', 'clause_mappings', {'tenant_id': 't'}, None),
+    ('latest compliance analysis', 'compliance_analyses', {'tenant_id': 't'}, [('analysis_date', DESCENDING)]),
+    ('ISO summary', 'iso_summaries', {'tenant_id': 't'}, None),
+    ('user by id', 'users', {'id': 'u'}, None),
+    ('user by email', 'users', {'email': 'e'}, None),
+    ('dashboard snapshot', 'dashboard_metrics', {'tenant_id': 't'}, None),
+    ('corpus version', 'corpus_versions', {'tenant_id': 't'}, None),
+]
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """
+    Create every registered index (a no-op for indexes that already exist)
+    Failures - including an existing index with other options, or duplicates
+    blocking a unique index - are logged rather than failing startup; indexes
+    and data are never dropped here
+    """
+    created: Dict[str, List[str]] = {}
+    for collection_name, indexes in INDEX_REGISTRY.items():
+        try:
+            created[collection_name] = await db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # Fall back to one at a time so one conflict doesn't block the rest
+            logger.warning(f"Index creation on {collection_name} failed ({e}); retrying individually")
+            created[collection_name] = []
+            for index in indexes:
+                try:
+                    created[collection_name] += await db[collection_name].create_indexes([index])
+                except OperationFailure as index_error:
+                    logger.error(f"Could not create index {index.document['name']} on {collection_name}: {index_error}")
+                    if index_error.code in INDEX_CONFLICT_CODES + (DUPLICATE_KEY_CODE,) and collection_name in INDEX_MIGRATIONS:
+                        logger.error(f"   Run {INDEX_MIGRATIONS[collection_name]} to migrate {collection_name}")
+    logger.info(f"✅ Ensured indexes on {len(INDEX_REGISTRY)} collections")
+    return created
+
+
+def _plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """All stage names of a query plan tree"""
+    stages = [plan.get('stage', '')]
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        stages += _plan_stages(child)
+    return stages
+
+
+async def verify_query_plans(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+    """Explain every hot query; entries with collscan=True have no usable index"""
+    results = []
+    for name, collection_name, query_filter, sort in HOT_QUERIES:
+        command: Dict[str, Any] = {'find': collection_name, 'filter': query_filter}
+        if sort:
+            command['sort'] = dict(sort)
+        explain = await db.command('explain', command, verbosity='queryPlanner')
+        winning_plan = explain['queryPlanner']['winningPlan']
+        stages = _plan_stages(winning_plan)
+        results.append({
+            'query': name,
+            'collection': collection_name,
+            'stages': stages,
+            'collscan': 'COLLSCAN' in stages
+        })
+    return results
@@ -0,0 +1,59 @@
+"""
+Delta Hunks - Changed sentences of modified regulatory clauses
+A modified clause's change_text is the whole new clause, so its embedding is
+dominated by unchanged wording. The hunk text keeps only the sentences that
+differ between old and new text plus a little surrounding context, which makes
+for a smaller embedding input focused on what actually changed.
+"""
+import difflib
+import re
+from typing import Any, Dict, List
+
+# How a delta is embedded for semantic matching: the whole clause text, only
+# its hunk text, or both with the higher / a weighted blend of the two scores
+DELTA_EMBEDDING_MODES = ('clause', 'hunk', 'max', 'weighted')
+
+# Unchanged sentences kept on each side of a change
+HUNK_CONTEXT_SENTENCES = 1
+
+_SENTENCE_END = re.compile(r'(?<=[.;:!?])\s+')
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a clause, whitespace normalized (PDF line breaks fall mid-sentence)"""
+    text = ' '.join(text.split())
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence]
+
+
+def extract_hunks(old_text: str, new_text: str, context: int = HUNK_CONTEXT_SENTENCES) -> List[str]:
+    """
+    Changed passages of a clause, one per group of nearby changes
+    Replaced and inserted sentences are taken from the new text, removed ones
+    from the old text; context sentences come from the new text
+    """
+    old_sentences = split_sentences(old_text)
+    new_sentences = split_sentences(new_text)
+    matcher = difflib.SequenceMatcher(None, old_sentences, new_sentences, autojunk=False)
+
+    hunks = []
+    for group in matcher.get_grouped_opcodes(context):
+        sentences = []
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'delete':
+                sentences.extend(old_sentences[i1:i2])
+            else:
+                sentences.extend(new_sentences[j1:j2])
+        hunks.append(' '.join(sentences))
+    return hunks
+
+
+def delta_hunk_text(delta: Dict[str, Any]) -> str:
+    """
+    Hunk text of a delta: the stored hunk_text, or extracted from old/new text
+    of a modified clause. Empty for added/deleted clauses and whitespace-only changes
+    """
+    if delta.get('hunk_text') is not None:
+        return delta['hunk_text']
+    if delta.get('change_type') != 'modified' or not delta.get('old_text') or not delta.get('new_text'):
+        return ''
+    return '\n'.join(extract_hunks(delta['old_text'], delta['new_text']))
@@ -0,0 +1,193 @@
+"""
+Gap Result Store - Normalized persistence of change impact results
+A gap_results row keeps the per-pair fields (clause, scores, rationale, review
+state) and references the bulky text it was computed from - QSP section text,
+old/new regulatory text, downstream and hierarchy traces - by content hash.
+Referenced content lives once per tenant in gap_snapshots; snapshots are
+immutable, so old runs keep showing the text they were analyzed against.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Reference field -> (snapshot kind, row fields moved into the snapshot)
+SNAPSHOT_GROUPS = {
+    'section_ref': ('section', ('qsp_text_full',)),
+    'delta_ref': ('delta', ('old_text', 'new_text')),
+    'downstream_ref': ('downstream', ('downstream_impacts',)),
+    'hierarchy_ref': ('hierarchy', ('hierarchy_trace',)),
+}
+
+# Row fields rebuilt from hydrated ones instead of being stored -> (source reference, rule)
+DERIVED_FIELDS = {
+    'qsp_text': ('section_ref', lambda row: row['qsp_text_full'][:300] if row.get('qsp_text_full') is not None else None),
+}
+
+DUPLICATE_KEY_CODE = 11000
+
+
+def snapshot_id(tenant_id: str, kind: str, content: Dict[str, Any]) -> str:
+    """Content hash identifying a snapshot"""
+    canonical = json.dumps(content, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(f"{tenant_id}\x1f{kind}\x1f{canonical}".encode('utf-8')).hexdigest()
+
+
+class GapResultStore:
+    """Writes normalized gap_results rows and hydrates them on read"""
+
+    def __init__(self, db: Optional[AsyncIOMotorDatabase] = None):
+        self.db = db
+        # Rows (or snapshot ids) per bulk round trip
+        self.batch_size = int(os.getenv("GAP_RESULTS_BATCH_SIZE", "500"))
+
+    def set_database(self, db: AsyncIOMotorDatabase):
+        """Set database connection"""
+        self.db = db
+
+    def projection(self, fields: Iterable[str]) -> Dict[str, int]:
+        """Stored fields to read so that hydrated rows contain the requested fields"""
+        fields = set(fields)
+        projection = {field: 1 for field in fields}
+        for ref_field, (_, group_fields) in SNAPSHOT_GROUPS.items():
+            if fields.intersection(group_fields):
+                projection[ref_field] = 1
+        for field, (ref_field, _) in DERIVED_FIELDS.items():
+            if field in fields:
+                projection[ref_field] = 1
+        if '_id' not in fields:
+            projection['_id'] = 0
+        return projection
+
+    def normalize(self, row: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Split a full gap result row into the stored row and the snapshots it references
+        Rows already normalized pass through unchanged
+        """
+        stored = dict(row)
+        snapshots = []
+        for ref_field, (kind, fields) in SNAPSHOT_GROUPS.items():
+            if not any(field in row for field in fields):
+                continue
+            content = {field: stored.pop(field, None) for field in fields}
+            ref = snapshot_id(row['tenant_id'], kind, content)
+            stored[ref_field] = ref
+            snapshots.append({'_id': ref, 'tenant_id': row['tenant_id'], 'kind': kind, 'content': content})
+        for field, (ref_field, _) in DERIVED_FIELDS.items():
+            if ref_field in stored:
+                stored.pop(field, None)
+        return stored, snapshots
+
+    async def save_snapshots(self, snapshots: List[Dict[str, Any]]):
+        """Insert snapshots that don't exist yet; existing ones are never modified"""
+        unique = {snapshot['_id']: snapshot for snapshot in snapshots}
+        if not unique:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        operations = [
+            UpdateOne({'_id': ref}, {'$setOnInsert': {**snapshot, 'created_at': now}}, upsert=True)
+            for ref, snapshot in unique.items()
+        ]
+        for start in range(0, len(operations), self.batch_size):
+            try:
+                await self.db.gap_snapshots.bulk_write(operations[start:start + self.batch_size], ordered=False)
+            except BulkWriteError as e:
+                # A concurrent writer inserted the same content first
+                if any(error.get('code') != DUPLICATE_KEY_CODE for error in e.details.get('writeErrors', [])):
+                    raise
+
+    async def save(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Upsert full gap result rows on (tenant_id, run_id, impact_index) with
+        unordered bulk writes; the unique index on that key keeps re-runs idempotent
+        Returns the number of rows written
+        """
+        stored_rows = []
+        snapshots = []
+        for row in rows:
+            stored, row_snapshots = self.normalize(row)
+            stored_rows.append(stored)
+            snapshots.extend(row_snapshots)
+
+        # Snapshots first, so a stored row never references missing content
+        await self.save_snapshots(snapshots)
+
+        written = 0
+        for start in range(0, len(stored_rows), self.batch_size):
+            operations = [
+                UpdateOne(
+                    {
+                        'tenant_id': row['tenant_id'],
+                        'run_id': row['run_id'],
+                        'impact_index': row['impact_index']
+                    },
+                    {'$set': row},
+                    upsert=True
+                )
+                for row in stored_rows[start:start + self.batch_size]
+            ]
+            try:
+                result = await self.db.gap_results.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Two concurrent upserts of the same key can both try to insert; the
+                # loser gets a duplicate key error and succeeds as an update on retry
+                errors = e.details.get('writeErrors', [])
+                if any(error.get('code') != DUPLICATE_KEY_CODE for error in errors):
+                    raise
+                retry = [operations[error['index']] for error in errors]
+                result = await self.db.gap_results.bulk_write(retry, ordered=False)
+                written += len(operations) - len(retry)
+            written += result.upserted_count + result.matched_count
+        return written
+
+    async def hydrate(self, tenant_id: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fill referenced text back into stored rows (in place) with one batched
+        snapshot lookup; legacy rows holding their text inline are left as they are
+        """
+        refs = {
+            row[ref_field]
+            for row in rows
+            for ref_field in SNAPSHOT_GROUPS
+            if row.get(ref_field)
+        }
+        contents: Dict[str, Dict[str, Any]] = {}
+        ref_list = list(refs)
+        for start in range(0, len(ref_list), self.batch_size):
+            cursor = self.db.gap_snapshots.find(
+                {'_id': {'$in': ref_list[start:start + self.batch_size]}, 'tenant_id': tenant_id},
+                {'content': 1}
+            )
+            async for snapshot in cursor:
+                contents[snapshot['_id']] = snapshot['content']
+
+        missing = refs - contents.keys()
+        if missing:
+            logger.warning(f"{len(missing)} gap result snapshots not found for tenant {tenant_id}")
+
+        for row in rows:
+            hydrated = set()
+            for ref_field, (_, fields) in SNAPSHOT_GROUPS.items():
+                ref = row.pop(ref_field, None)
+                if ref is None:
+                    continue
+                hydrated.add(ref_field)
+                content = contents.get(ref, {})
+                for field in fields:
+                    row[field] = content.get(field)
+            for field, (ref_field, derive) in DERIVED_FIELDS.items():
+                if ref_field in hydrated:
+                    row[field] = derive(row)
+        return rows
+
+
+# Singleton instance
+gap_result_store = GapResultStore()
@@ -9,6 +9,8 @@ import logging
 from typing import List, Dict, Any, Tuple
 import json
 
+from core.delta_hunks import extract_hunks
+
 logger = logging.getLogger(__name__)
 
 
@@ -141,6 +143,8 @@ class ISODiffProcessor:
                     'old_text': old_text,
                     'new_text': new_text,
                     'change_text': new_text,
+                    # Changed sentences with context, for hunk-level delta embeddings
+                    'hunk_text': '\n'.join(extract_hunks(old_text, new_text)),
                     'diff_html': diff
                 })
         
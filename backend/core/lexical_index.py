@@ -0,0 +1,194 @@
+"""
+Lexical index for regulatory chunks
+BM25 keyword scoring plus an exact clause-number lookup (e.g. "7.3.2", "820.30(c)")
+that answers clause queries without an embedding call
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Clause identifiers: "7.3.2", "820.30", "820.30(c)", "820.30(c)(1)"
+CLAUSE_PATTERN = r'\d{1,4}(?:\.\d+)+(?:\([a-z0-9]{1,4}\))*|\d{1,4}(?:\([a-z0-9]{1,4}\))+'
+_CLAUSE_QUERY_RE = re.compile(
+    r'^\s*(?:(?:clause|section|sec\.?|§+|part)\s*)?(' + CLAUSE_PATTERN + r')(.*)$',
+    re.IGNORECASE
+)
+_HEADING_CLAUSE_RE = re.compile(
+    r'^\s*(?:(?:clause|section|sec\.?|§+)\s*)?(' + CLAUSE_PATTERN + r')(?=[\s.:)\-]|$)',
+    re.IGNORECASE
+)
+_SUBPARAGRAPH_RE = re.compile(r'^\s*(\([a-z0-9]{1,4}\))+', re.IGNORECASE)
+_TOKEN_RE = re.compile(r'[a-z0-9]+(?:\.[0-9]+)*')
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it',
+    'of', 'on', 'or', 'shall', 'that', 'the', 'this', 'to', 'with', 'which'
+}
+
+# A clause query may carry a short title ("7.3.2 design inputs")
+MAX_CLAUSE_QUERY_WORDS = 6
+
+
+def normalize_clause(clause: str) -> str:
+    return re.sub(r'\s+', '', clause).lower().rstrip('.')
+
+
+def parse_clause_query(query: str) -> Optional[Tuple[str, str]]:
+    """
+    Split a clause lookup query into (clause id, trailing words)
+    Returns None when the query is not a clause lookup
+    """
+    match = _CLAUSE_QUERY_RE.match(query)
+    if not match:
+        return None
+    rest = match.group(2).strip(" .:-")
+    if len(rest.split()) > MAX_CLAUSE_QUERY_WORDS:
+        return None
+    return normalize_clause(match.group(1)), rest
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def extract_clauses(text: str, section_header: str = "") -> List[str]:
+    """
+    Clause ids a chunk defines: the section header's clause and headings at
+    line start; "(c)" sub-paragraphs are qualified by the enclosing clause
+    """
+    clauses = []
+    current = None
+    for line in [section_header] + text.splitlines():
+        match = _HEADING_CLAUSE_RE.match(line)
+        if match:
+            current = normalize_clause(match.group(1))
+            clauses.append(current)
+            continue
+        sub = _SUBPARAGRAPH_RE.match(line)
+        if sub and current and '.' in current:
+            base = current.split('(')[0]
+            clauses.append(normalize_clause(base + sub.group(0)))
+    return list(dict.fromkeys(clauses))
+
+
+class LexicalIndex:
+    """In-memory BM25 + clause index over the chunks of one collection"""
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._chunks: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, set] = {}
+        self._clauses: Dict[str, set] = {}
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]]):
+        """Index chunks (re-indexes ids that are already present)"""
+        with self._lock:
+            self.remove(ids)
+            for chunk_id, text, meta in zip(ids, texts, metadatas):
+                tf = Counter(tokenize(text))
+                clauses = extract_clauses(text, meta.get('section_header', ''))
+                self._chunks[chunk_id] = {
+                    'text': text,
+                    'metadata': meta,
+                    'tf': tf,
+                    'length': sum(tf.values()),
+                    'clauses': clauses
+                }
+                self._total_length += sum(tf.values())
+                for term in tf:
+                    self._postings.setdefault(term, set()).add(chunk_id)
+                for clause in clauses:
+                    self._clauses.setdefault(clause, set()).add(chunk_id)
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            for chunk_id in ids:
+                chunk = self._chunks.pop(chunk_id, None)
+                if chunk is None:
+                    continue
+                self._total_length -= chunk['length']
+                for term in chunk['tf']:
+                    postings = self._postings.get(term)
+                    if postings is not None:
+                        postings.discard(chunk_id)
+                        if not postings:
+                            del self._postings[term]
+                for clause in chunk['clauses']:
+                    holders = self._clauses.get(clause)
+                    if holders is not None:
+                        holders.discard(chunk_id)
+                        if not holders:
+                            del self._clauses[clause]
+
+    def get(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        return self._chunks.get(chunk_id)
+
+    def _bm25(self, terms: List[str], candidates: Optional[set] = None) -> Dict[str, float]:
+        n_chunks = len(self._chunks)
+        if not n_chunks or not terms:
+            return {}
+        avg_length = self._total_length / n_chunks or 1
+        scores: Dict[str, float] = {}
+        for term in set(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_chunks - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id in (postings & candidates if candidates is not None else postings):
+                chunk = self._chunks[chunk_id]
+                tf = chunk['tf'][term]
+                norm = tf + self.k1 * (1 - self.b + self.b * chunk['length'] / avg_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / norm
+        return scores
+
+    def search(
+        self,
+        query: str,
+        n_results: int,
+        allow: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Tuple[str, float]]:
+        """BM25 ranking: [(chunk_id, score)] best first"""
+        with self._lock:
+            scores = self._bm25(tokenize(query))
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            if allow:
+                ranked = [item for item in ranked if allow(self._chunks[item[0]]['metadata'])]
+            return ranked[:n_results]
+
+    def lookup_clause(
+        self,
+        clause: str,
+        rest: str = "",
+        allow: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Tuple[List[Tuple[str, float]], bool]:
+        """
+        Chunks defining a clause; falls back to its sub-clauses
+        ("820.30" finds "820.30(c)"). Ties are ranked by BM25 on the rest
+        of the query, then by position in the document.
+
+        Returns:
+            ([(chunk_id, score)], exact): exact is False for sub-clause matches
+        """
+        with self._lock:
+            holders = set(self._clauses.get(clause, ()))
+            exact = bool(holders)
+            if not exact:
+                for key, ids in self._clauses.items():
+                    if key.startswith(clause + '.') or key.startswith(clause + '('):
+                        holders.update(ids)
+            if allow:
+                holders = {c for c in holders if allow(self._chunks[c]['metadata'])}
+            scores = self._bm25(tokenize(rest), holders) if rest else {}
+            ranked = sorted(
+                ((chunk_id, scores.get(chunk_id, 0.0)) for chunk_id in holders),
+                key=lambda item: (-item[1], self._chunks[item[0]]['metadata'].get('chunk_id', 0))
+            )
+            return ranked, exact
@@ -1,17 +1,45 @@
 """
 RAG Service for Regulatory Compliance
 Uses OpenAI text-embedding-3-large for high-accuracy semantic matching
-ChromaDB for vector storage
+ChromaDB (or the flat NumPy store, see core/vector_store.py) for vector storage
 """
 import logging
-import chromadb
-from chromadb.config import Settings
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Callable, Iterable, Iterator, Union
 import os
+import json
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from openai import OpenAI
 
+from core.lexical_index import LexicalIndex, parse_clause_query
+from core.vector_store import create_vector_store
+
 logger = logging.getLogger(__name__)
 
+# Cross-tenant corpus for public standards, deduplicated by content hash
+SHARED_COLLECTION = "regulatory_shared"
+
+# Distance reported for clause-number lookups, which skip the embedding call:
+# an exact clause match counts as an exact hit (confidence = 1 - distance = 1)
+CLAUSE_MATCH_DISTANCE = 0.0
+# Sub-clauses found for a clause no chunk defines ("820.30" -> "820.30(c)") are
+# related rather than exact, and rank below exact matches
+SUBCLAUSE_MATCH_DISTANCE = 0.2
+
+# HNSW index profiles: distance space, graph degree (M) and construction/search
+# beam widths (ef). Chroma fixes them when a collection is created, so changing
+# a collection's profile rebuilds it. All built-ins keep l2, the space existing
+# distance thresholds (confidence = 1 - distance) were tuned on.
+INDEX_PROFILES = {
+    'default': {'space': 'l2', 'M': 16, 'construction_ef': 100, 'search_ef': 10},
+    'balanced': {'space': 'l2', 'M': 16, 'construction_ef': 200, 'search_ef': 64},
+    'high_recall': {'space': 'l2', 'M': 32, 'construction_ef': 400, 'search_ef': 256},
+    'low_memory': {'space': 'l2', 'M': 8, 'construction_ef': 100, 'search_ef': 32},
+}
+
 class RAGService:
     """RAG service using OpenAI text-embedding-3-large for highest accuracy semantic matching"""
     
@@ -19,30 +47,459 @@ class RAGService:
         self.emergent_key = None
         self.openai_client = None
         self.embedding_model = "text-embedding-3-large"  # 3072 dimensions, highest accuracy
+        self.embedding_batch_size = 64  # Inputs per embeddings request (8000-char chunks stay under the token cap)
+        self.embedding_batch_token_budget = 100_000  # Estimated tokens per ingestion batch (API cap is 300k)
+        self.embedding_max_workers = int(os.getenv("RAG_EMBEDDING_WORKERS", "4"))
+        
+        # In-flight ingestion progress: (tenant_id, doc_id) -> counters
+        self.ingest_progress: Dict[tuple, Dict[str, Any]] = {}
+        self._openai_lock = threading.Lock()
         
-        # Initialize ChromaDB with persistent storage
+        # Initialize the vector store with persistent storage: ChromaDB by
+        # default, or the flat NumPy store (RAG_VECTOR_STORE=numpy)
         persist_dir = os.getenv("CHROMADB_DIR", "./chromadb_data")
         
         try:
-            self.chroma_client = chromadb.PersistentClient(
-                path=persist_dir,
-                settings=Settings(
-                    anonymized_telemetry=False,
-                    allow_reset=True
-                )
-            )
-            logger.info(f"ChromaDB initialized at {persist_dir}")
+            self.vector_store = create_vector_store(os.getenv("RAG_VECTOR_STORE", "chroma"), persist_dir)
         except Exception as e:
-            logger.error(f"Failed to initialize ChromaDB: {e}")
+            logger.error(f"Failed to initialize vector store: {e}")
             raise
+        
+        # Collection handles, cached so hot paths skip the catalog lookup
+        self._collections: Dict[str, Any] = {}
+        self._collections_lock = threading.Lock()
+        
+        self._rebuild_lock = threading.Lock()
+        
+        # BM25/clause indexes per collection, built on first search and then
+        # maintained on upsert/delete
+        self._lexical: Dict[str, LexicalIndex] = {}
+        self._lexical_lock = threading.Lock()
+        self.rrf_k = 60  # Reciprocal-rank fusion constant
+        
+        # Search result cache; keys carry the tenant's corpus version, which is
+        # bumped on every add/delete/reprocess so stale entries are never served
+        self.search_cache_size = int(os.getenv("RAG_SEARCH_CACHE_SIZE", "1024"))
+        self._search_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()
+        self._search_cache_lock = threading.Lock()
+        self._tenant_versions: Dict[str, int] = {}
+        self._search_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        
+        # Document registry: per-tenant document stats and shared-corpus references
+        self._registry_path = os.path.join(persist_dir, "rag_registry.json")
+        self._registry_lock = threading.RLock()
+        self._shared_locks: Dict[str, threading.Lock] = {}
+        self._registry = self._load_registry()
     
-    def _get_embedding(self, text: str) -> List[float]:
+    def _load_registry(self) -> Dict[str, Any]:
+        """Load the document registry persisted next to the ChromaDB data"""
+        registry = {
+            'tenants': {},
+            'shared': {},
+            'indexed_tenants': [],
+            # Custom profiles and assignments: 'tenant:<id>', 'framework:<fw>', 'shared'
+            'index_profiles': {'custom': {}, 'assignments': {}}
+        }
+        try:
+            with open(self._registry_path) as f:
+                registry.update(json.load(f))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to load RAG registry, starting empty: {e}")
+        return registry
+    
+    def _save_registry(self):
+        """Persist the registry atomically (caller holds _registry_lock)"""
+        tmp_path = f"{self._registry_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._registry, f)
+        os.replace(tmp_path, self._registry_path)
+    
+    @staticmethod
+    def _collection_name(tenant_id: str) -> str:
+        return f"regulatory_{tenant_id}".replace("-", "_")
+    
+    @staticmethod
+    def _content_hash(content: Union[str, Iterable[str]]) -> str:
         """
-        Get embedding using OpenAI API
-        Uses text-embedding-3-large (3072 dimensions) for highest accuracy
+        Hash of whitespace-normalized content, identifies identical standards
+        across tenants; pages hash the same as the newline-joined text
+        """
+        if isinstance(content, str):
+            return hashlib.sha256(" ".join(content.split()).encode("utf-8")).hexdigest()
+        
+        digest = hashlib.sha256()
+        started = False
+        for piece in content:
+            normalized = " ".join(piece.split())
+            if not normalized:
+                continue
+            digest.update(((" " if started else "") + normalized).encode("utf-8"))
+            started = True
+        return digest.hexdigest()
+    
+    @staticmethod
+    def _count_chars(content: Union[str, Iterable[str]], counter: Dict[str, int]) -> Iterator[str]:
+        """Pass pieces through, counting characters as if newline-joined"""
+        if isinstance(content, str):
+            content = [content]
+        for i, piece in enumerate(content):
+            counter['chars'] += len(piece) + (1 if i else 0)
+            yield piece
+    
+    def _get_collection(self, name: str, create: bool = False, metadata: Optional[Dict[str, Any]] = None):
+        """
+        Cached collection handle; None if it does not exist and create is False
+        """
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+        
+        with self._collections_lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                try:
+                    collection = self.vector_store.get_collection(name)
+                except Exception:
+                    if not create:
+                        return None
+                    # Profile metadata only applies to new collections; an existing
+                    # collection changes profile through rebuild_collection alone
+                    collection = self.vector_store.get_or_create_collection(name=name, metadata=metadata)
+                self._collections[name] = collection
+        return collection
+    
+    def _tenant_collection(self, tenant_id: str, create: bool = False):
+        return self._get_collection(
+            self._collection_name(tenant_id),
+            create=create,
+            metadata={"tenant_id": tenant_id, **self._profile_metadata(self.resolve_index_profile(tenant_id))}
+        )
+    
+    def _shared_collection(self, create: bool = False):
+        return self._get_collection(
+            SHARED_COLLECTION,
+            create=create,
+            metadata=self._profile_metadata(self.resolve_index_profile(None))
+        )
+    
+    def get_index_profiles(self) -> Dict[str, Dict[str, Any]]:
+        """Built-in and custom index profiles by name"""
+        return {**INDEX_PROFILES, **self._registry['index_profiles']['custom']}
+    
+    def _profile_metadata(self, profile_name: str) -> Dict[str, Any]:
+        """Collection metadata carrying a profile's HNSW parameters"""
+        profile = self.get_index_profiles()[profile_name]
+        return {
+            "hnsw:space": profile['space'],
+            "hnsw:M": profile['M'],
+            "hnsw:construction_ef": profile['construction_ef'],
+            "hnsw:search_ef": profile['search_ef'],
+            "index_profile": profile_name
+        }
+    
+    def resolve_index_profile(self, tenant_id: Optional[str]) -> str:
+        """
+        Profile for a tenant's collection (None: the shared collection)
+        
+        A tenant assignment wins; otherwise the assignment of the framework
+        holding most of the tenant's chunks (collections are per tenant, not
+        per framework); otherwise 'default'.
+        """
+        assignments = self._registry['index_profiles']['assignments']
+        if tenant_id is None:
+            return assignments.get('shared', 'default')
+        if f"tenant:{tenant_id}" in assignments:
+            return assignments[f"tenant:{tenant_id}"]
+        
+        chunks_by_framework: Dict[str, int] = {}
+        for entry in self._registry['tenants'].get(tenant_id, {}).values():
+            if not entry.get('shared'):
+                chunks_by_framework[entry['framework']] = (
+                    chunks_by_framework.get(entry['framework'], 0) + entry.get('chunk_count', 0)
+                )
+        if chunks_by_framework:
+            primary = max(chunks_by_framework, key=chunks_by_framework.get)
+            return assignments.get(f"framework:{primary}", 'default')
+        return 'default'
+    
+    def define_index_profile(self, name: str, space: str, M: int, construction_ef: int, search_ef: int):
+        """Add or replace a custom index profile"""
+        if name in INDEX_PROFILES:
+            raise ValueError(f"Cannot redefine built-in index profile: {name}")
+        if space not in ("l2", "cosine", "ip"):
+            raise ValueError(f"Invalid space: {space}")
+        with self._registry_lock:
+            self._registry['index_profiles']['custom'][name] = {
+                'space': space, 'M': int(M), 'construction_ef': int(construction_ef), 'search_ef': int(search_ef)
+            }
+            self._save_registry()
+    
+    def assign_index_profile(self, scope: str, profile_name: str, rebuild: bool = True) -> Dict[str, Any]:
+        """
+        Assign a profile to 'tenant:<id>', 'framework:<fw>' or 'shared' and,
+        unless rebuild is False, migrate affected collections by rebuilding
         """
+        if profile_name not in self.get_index_profiles():
+            raise ValueError(f"Unknown index profile: {profile_name}")
+        if not (scope == 'shared' or scope.startswith('tenant:') or scope.startswith('framework:')):
+            raise ValueError(f"Invalid scope: {scope}")
+        
+        with self._registry_lock:
+            self._registry['index_profiles']['assignments'][scope] = profile_name
+            self._save_registry()
+        
+        rebuilt = []
+        if rebuild:
+            if scope == 'shared':
+                targets = [(SHARED_COLLECTION, None)]
+            elif scope.startswith('tenant:'):
+                targets = [(self._collection_name(scope[len('tenant:'):]), scope[len('tenant:'):])]
+            else:
+                targets = [(self._collection_name(t), t) for t in list(self._registry['tenants'])]
+            for collection_name, tenant_id in targets:
+                if self.rebuild_collection(collection_name, tenant_id):
+                    rebuilt.append(collection_name)
+        
+        return {'scope': scope, 'profile': profile_name, 'rebuilt': rebuilt}
+    
+    def _collection_exists(self, name: str) -> bool:
         try:
-            # Lazy load OpenAI client
+            self.vector_store.get_collection(name)
+            return True
+        except Exception:
+            return False
+    
+    def _recover_swap(self, collection_name: str):
+        """
+        Restore a collection left set aside by an interrupted swap; refuse to
+        continue while both the collection and its set-aside copy exist
+        """
+        aside_name = f"{collection_name}__previous"
+        if not self._collection_exists(aside_name):
+            return
+        if self._collection_exists(collection_name):
+            raise Exception(
+                f"Both {collection_name} and {aside_name} exist after an interrupted rebuild; "
+                f"drop the one that should not be kept and retry"
+            )
+        with self._collections_lock:
+            self.vector_store.rename_collection(aside_name, collection_name)
+            self._collections.pop(collection_name, None)
+            self._collections.pop(aside_name, None)
+        logger.warning(f"Restored {collection_name} from an interrupted rebuild")
+    
+    def _swap_collection(self, collection_name: str, tmp_name: str):
+        """
+        Replace a collection by tmp_name: set the original aside, move tmp into
+        place, then drop the original. The original is restored if the second
+        step fails, so the collection's data is never only under tmp_name.
+        """
+        aside_name = f"{collection_name}__previous"
+        with self._collections_lock:
+            self._collections.pop(collection_name, None)
+            self._collections.pop(tmp_name, None)
+            self.vector_store.rename_collection(collection_name, aside_name)
+            try:
+                self.vector_store.rename_collection(tmp_name, collection_name)
+            except Exception:
+                self.vector_store.rename_collection(aside_name, collection_name)
+                raise
+            self._collections.pop(aside_name, None)
+        try:
+            self.vector_store.delete_collection(aside_name)
+        except Exception as e:
+            logger.error(f"Rebuilt {collection_name} but could not drop {aside_name}: {e}")
+    
+    def rebuild_collection(self, collection_name: str, tenant_id: Optional[str]) -> bool:
+        """
+        Migrate a collection to its resolved profile: copy every row into a new
+        collection created with the profile's parameters, then swap it in.
+        Vectors are copied, nothing is re-embedded. Returns False when the
+        collection is missing or already on the profile.
+        """
+        with self._rebuild_lock:
+            self._recover_swap(collection_name)
+            old = self._get_collection(collection_name)
+            if old is None:
+                return False
+            
+            metadata = self._profile_metadata(self.resolve_index_profile(tenant_id))
+            if tenant_id is not None:
+                metadata["tenant_id"] = tenant_id
+            if (old.metadata or {}).get("index_profile") == metadata["index_profile"]:
+                return False
+            
+            tmp_name = f"{collection_name}__rebuild"
+            try:
+                self.vector_store.delete_collection(tmp_name)
+            except Exception:
+                pass
+            new = self.vector_store.get_or_create_collection(name=tmp_name, metadata=metadata)
+            
+            total = old.count()
+            copied = 0
+            while copied < total:
+                page = old.get(limit=1000, offset=copied, include=["embeddings", "documents", "metadatas"])
+                if not page['ids']:
+                    break
+                new.upsert(ids=page['ids'], embeddings=page['embeddings'],
+                           documents=page['documents'], metadatas=page['metadatas'])
+                copied += len(page['ids'])
+            
+            if new.count() != old.count():
+                # Rows were written while copying; keep the original
+                self.vector_store.delete_collection(tmp_name)
+                raise Exception(f"{collection_name} changed during rebuild, try again")
+            
+            self._swap_collection(collection_name, tmp_name)
+            
+            affected = [tenant_id] if tenant_id is not None else list(self._registry['tenants'])
+            self._bump_version(*affected)
+            logger.info(f"Rebuilt {collection_name} with index profile {metadata['index_profile']} ({copied} rows)")
+            return True
+    
+    def _bump_version(self, *tenant_ids: str):
+        """Invalidate cached search results of tenants whose corpus changed"""
+        with self._search_cache_lock:
+            for tenant_id in tenant_ids:
+                self._tenant_versions[tenant_id] = self._tenant_versions.get(tenant_id, 0) + 1
+                stale = [key for key in self._search_cache if key[0] == tenant_id]
+                for key in stale:
+                    del self._search_cache[key]
+                self._search_cache_stats['invalidations'] += len(stale)
+    
+    def _search_cache_key(
+        self,
+        tenant_id: str,
+        query_text: str,
+        framework: Optional[str],
+        n_results: int
+    ) -> tuple:
+        return (
+            tenant_id,
+            self._tenant_versions.get(tenant_id, 0),
+            " ".join(query_text.casefold().split()),
+            framework,
+            n_results
+        )
+    
+    def get_search_cache_stats(self) -> Dict[str, Any]:
+        """Hit-rate metrics for the search result cache"""
+        with self._search_cache_lock:
+            stats = dict(self._search_cache_stats)
+            stats['size'] = len(self._search_cache)
+        lookups = stats['hits'] + stats['misses']
+        stats['max_size'] = self.search_cache_size
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats
+    
+    def _tenants_referencing(self, content_hash: str) -> List[str]:
+        return [
+            tenant_id
+            for tenant_id, refs in self._registry['tenants'].items()
+            if any(r.get('shared') and r.get('content_hash') == content_hash for r in refs.values())
+        ]
+    
+    def _lexical_index(self, collection_name: str) -> Optional[LexicalIndex]:
+        """Lexical index for a collection, built from its stored chunks on first use"""
+        index = self._lexical.get(collection_name)
+        if index is not None:
+            return index
+        
+        with self._lexical_lock:
+            index = self._lexical.get(collection_name)
+            if index is None:
+                collection = self._get_collection(collection_name)
+                if collection is None:
+                    return None
+                index = LexicalIndex()
+                if collection.count() > 0:
+                    results = collection.get(include=["documents", "metadatas"])
+                    index.add(results['ids'], results['documents'], results['metadatas'])
+                self._lexical[collection_name] = index
+                logger.info(f"Built lexical index for {collection_name}: {len(index)} chunks")
+        return index
+    
+    def _delete_chunks(self, collection, ids: List[str]):
+        """Delete chunks from a collection and its lexical index"""
+        if not ids:
+            return
+        collection.delete(ids=ids)
+        index = self._lexical.get(collection.name)
+        if index is not None:
+            index.remove(ids)
+    
+    @staticmethod
+    def _chunk_stats(texts: List[str], metadatas: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Chunk count and length statistics kept in the registry"""
+        lengths = [len(t) for t in texts]
+        return {
+            'chunk_count': len(lengths),
+            'total_chunk_chars': sum(lengths),
+            'min_chunk_length': min(lengths) if lengths else 0,
+            'max_chunk_length': max(lengths) if lengths else 0,
+            'sections': sorted({m.get('section_header', '') for m in metadatas} - {''})
+        }
+    
+    def _ensure_tenant_registry(self, tenant_id: str):
+        """
+        One-time backfill of registry entries for chunks ingested before the
+        registry existed; afterwards add/delete/reprocess keep it current
+        """
+        if tenant_id in self._registry['indexed_tenants']:
+            return
+        
+        with self._registry_lock:
+            if tenant_id in self._registry['indexed_tenants']:
+                return
+            
+            collection = self._tenant_collection(tenant_id)
+            entries = self._registry['tenants'].setdefault(tenant_id, {})
+            if collection is not None and collection.count() > 0:
+                results = collection.get(include=["documents", "metadatas"])
+                grouped: Dict[str, Dict[str, list]] = {}
+                for text, meta in zip(results['documents'], results['metadatas']):
+                    group = grouped.setdefault(meta['doc_id'], {'texts': [], 'metadatas': []})
+                    group['texts'].append(text)
+                    group['metadatas'].append(meta)
+                
+                for doc_id, group in grouped.items():
+                    if doc_id in entries:
+                        continue
+                    meta = group['metadatas'][0]
+                    entries[doc_id] = {
+                        'doc_name': meta['doc_name'],
+                        'framework': meta['framework'],
+                        'shared': False,
+                        **self._chunk_stats(group['texts'], group['metadatas'])
+                    }
+                logger.info(f"Backfilled registry for tenant {tenant_id}: {len(grouped)} documents")
+            
+            self._registry['indexed_tenants'].append(tenant_id)
+            self._save_registry()
+    
+    def _tenant_documents(self, tenant_id: str) -> Dict[str, Dict[str, Any]]:
+        """Registry entries for the tenant, with shared references resolved to corpus stats"""
+        self._ensure_tenant_registry(tenant_id)
+        docs = {}
+        for doc_id, entry in list(self._registry['tenants'].get(tenant_id, {}).items()):
+            if entry.get('shared'):
+                corpus = self._registry['shared'].get(entry['content_hash'], {})
+                entry = {**corpus, **entry, 'chunk_count': corpus.get('chunk_count', 0)}
+            docs[doc_id] = entry
+        return docs
+    
+    def _has_documents(self, tenant_id: str) -> bool:
+        """Whether the tenant has private chunks or shared-corpus references"""
+        return any(entry.get('chunk_count', 0) > 0 for entry in self._tenant_documents(tenant_id).values())
+    
+    def _ensure_openai_client(self):
+        """Lazy load the OpenAI client (thread-safe, ingestion embeds from worker threads)"""
+        if self.openai_client is not None:
+            return
+        with self._openai_lock:
             if self.openai_client is None:
                 # Use dedicated OpenAI key for embeddings
                 openai_key = os.getenv("OPENAI_API_KEY")
@@ -50,6 +507,14 @@ class RAGService:
                     raise Exception("OPENAI_API_KEY not found in environment")
                 self.openai_client = OpenAI(api_key=openai_key)
                 logger.info("OpenAI client initialized for embeddings")
+    
+    def _get_embedding(self, text: str) -> List[float]:
+        """
+        Get embedding using OpenAI API
+        Uses text-embedding-3-large (3072 dimensions) for highest accuracy
+        """
+        try:
+            self._ensure_openai_client()
             
             # Clean text - remove excessive whitespace
             text = ' '.join(text.split())
@@ -73,6 +538,45 @@ class RAGService:
             logger.error(f"OpenAI embedding generation failed: {e}")
             raise Exception(f"Failed to generate embedding: {str(e)}")
     
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Get embeddings for several texts with as few OpenAI calls as possible
+        Texts are cleaned/truncated exactly like _get_embedding and sent in
+        batches of embedding_batch_size; output order matches input order
+        """
+        if not texts:
+            return []
+        
+        try:
+            self._ensure_openai_client()
+            
+            cleaned = [' '.join(text.split())[:8000] for text in texts]
+            
+            embeddings = []
+            for start in range(0, len(cleaned), self.embedding_batch_size):
+                batch = cleaned[start:start + self.embedding_batch_size]
+                response = self.openai_client.embeddings.create(
+                    input=batch,
+                    model=self.embedding_model
+                )
+                # Results carry their input index; don't rely on response ordering
+                embeddings.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+            
+            logger.debug(f"Generated {len(embeddings)} embeddings in {-(-len(cleaned) // self.embedding_batch_size)} call(s)")
+            return embeddings
+            
+        except Exception as e:
+            logger.error(f"OpenAI batch embedding generation failed: {e}")
+            raise Exception(f"Failed to generate embeddings: {str(e)}")
+    
+    def get_ingest_progress(self, tenant_id: str) -> List[Dict[str, Any]]:
+        """In-flight regulatory document ingestions for a tenant"""
+        return [
+            {'doc_id': doc_id, **progress}
+            for (tid, doc_id), progress in list(self.ingest_progress.items())
+            if tid == tenant_id
+        ]
+    
     def _clean_text(self, text: str) -> str:
         """
         Clean text before chunking to remove noise
@@ -142,7 +646,34 @@ class RAGService:
         min_chunk_size: int = 1000  # Minimum viable chunk size (~250 tokens)
     ) -> List[Dict[str, Any]]:
         """
-        Improved chunking strategy for regulatory documents
+        Improved chunking strategy for regulatory documents (see _iter_chunks)
+        """
+        chunks = list(self._iter_chunks([text], chunk_size, overlap, min_chunk_size))
+        
+        logger.info(f"Created {len(chunks)} chunks (avg size: {sum(c['length'] for c in chunks) // max(len(chunks), 1)} chars)")
+        
+        return chunks
+    
+    def _iter_paragraphs(self, pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Cleaned paragraphs from a text or page iterator, one piece at a time
+        
+        _clean_text drops blank lines, so paragraphs are the cleaned lines;
+        only one piece (e.g. one PDF page) is held in memory at a time.
+        """
+        for piece in pieces:
+            for para in self._clean_text(piece).split('\n'):
+                yield para
+    
+    def _iter_chunks(
+        self,
+        pieces: Iterable[str],
+        chunk_size: int = 4000,  # ~1000 tokens (optimal for text-embedding-3-large)
+        overlap: int = 800,       # ~20% overlap (~200 tokens)
+        min_chunk_size: int = 1000  # Minimum viable chunk size (~250 tokens)
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Improved chunking strategy for regulatory documents, as a generator
         
         Optimized for OpenAI text-embedding-3-large (2024 best practices):
         - Target: ~1000 tokens per chunk (≈4000 chars)
@@ -156,34 +687,26 @@ class RAGService:
         - Smart overlap to maintain context
         - Filters out non-content elements
         
+        Chunks are yielded as soon as they are complete, so a 1,000-page
+        compilation streamed page by page never exists as one string or as a
+        full chunk list.
+        
         Args:
-            text: Document text
+            pieces: Document text as an iterable of strings (pages, or [text])
             chunk_size: Target characters per chunk (default 4000 ≈ 1000 tokens)
             overlap: Overlap between chunks (default 800 ≈ 200 tokens)
             min_chunk_size: Minimum chunk size to avoid tiny fragments
             
-        Returns:
-            List of chunk dictionaries with text and metadata
+        Yields:
+            Chunk dictionaries with text and metadata
         """
-        import re
-        
-        # Clean text first
-        text = self._clean_text(text)
-        
-        chunks = []
         chunk_id = 0
         
-        # Split into paragraphs first
-        paragraphs = text.split('\n\n')
-        if len(paragraphs) == 1:
-            # If no double newlines, split by single newlines
-            paragraphs = text.split('\n')
-        
         current_chunk = ""
         current_start = 0
         section_header = ""
         
-        for para_idx, para in enumerate(paragraphs):
+        for para in self._iter_paragraphs(pieces):
             para = para.strip()
             if not para or len(para) < 10:
                 continue
@@ -200,7 +723,7 @@ class RAGService:
                         # Add chunk
                         chunk_text = ' '.join(sentences).strip()
                         if chunk_text:
-                            chunks.append({
+                            yield {
                                 'text': chunk_text,
                                 'chunk_id': chunk_id,
                                 'start_char': current_start,
@@ -208,7 +731,7 @@ class RAGService:
                                 'length': len(chunk_text),
                                 'section_header': section_header,
                                 'semantic_unit': 'section'
-                            })
+                            }
                             chunk_id += 1
                     
                     current_chunk = section_header + "\n"
@@ -238,7 +761,7 @@ class RAGService:
                     # Add chunk
                     chunk_text = accumulated.strip()
                     if len(chunk_text) >= min_chunk_size:
-                        chunks.append({
+                        yield {
                             'text': chunk_text,
                             'chunk_id': chunk_id,
                             'start_char': current_start,
@@ -246,7 +769,7 @@ class RAGService:
                             'length': len(chunk_text),
                             'section_header': section_header,
                             'semantic_unit': 'paragraph_group'
-                        })
+                        }
                         chunk_id += 1
                     
                     # Start new chunk with overlap (last few sentences)
@@ -266,7 +789,7 @@ class RAGService:
         
         # Add remaining chunk
         if len(current_chunk.strip()) >= min_chunk_size:
-            chunks.append({
+            yield {
                 'text': current_chunk.strip(),
                 'chunk_id': chunk_id,
                 'start_char': current_start,
@@ -274,11 +797,7 @@ class RAGService:
                 'length': len(current_chunk),
                 'section_header': section_header,
                 'semantic_unit': 'final'
-            })
-        
-        logger.info(f"Created {len(chunks)} chunks (avg size: {sum(c['length'] for c in chunks) // max(len(chunks), 1)} chars)")
-        
-        return chunks
+            }
     
     def _split_into_sentences(self, text: str) -> List[str]:
         """
@@ -316,92 +835,594 @@ class RAGService:
         tenant_id: str,
         doc_id: str,
         doc_name: str,
-        content: str,
+        content: Union[str, Iterable[str]],
         framework: str,
-        metadata: Optional[Dict[str, Any]] = None
+        metadata: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        shared: bool = False
     ) -> Dict[str, Any]:
         """
         Add regulatory document to RAG system
         
+        Content may be a string or an iterator of pages. Chunks are produced
+        lazily, embedded in token-budgeted batches with bounded parallelism
+        and streamed into ChromaDB batch by batch. If some batches fail, the
+        chunks already added are kept and the failures are reported.
+        
+        With shared=True the document goes into the cross-tenant corpus keyed
+        by content hash: identical texts are chunked and embedded once, and
+        the tenant only stores a reference to them.
+        
         Args:
             tenant_id: Tenant ID
             doc_id: Document ID
             doc_name: Document name
-            content: Document content
+            content: Document content, or an iterable of page texts
             framework: Regulatory framework (ISO_13485, FDA_21CFR820, etc.)
             metadata: Additional metadata
+            progress_callback: Called with progress counters after each batch
+            shared: Store in the deduplicated shared corpus (public standards)
             
         Returns:
-            Summary of chunks added
+            Summary of chunks added (and failed)
         """
+        if shared:
+            return self._add_shared_document(
+                tenant_id, doc_id, doc_name, content, framework, metadata, progress_callback
+            )
+        
         try:
-            # Get or create collection for tenant
-            collection_name = f"regulatory_{tenant_id}".replace("-", "_")
+            return self._write_private_document(
+                tenant_id, doc_id, doc_name, content, framework, metadata, progress_callback
+            )
             
+        except Exception as e:
+            logger.error(f"Failed to add regulatory document: {e}")
+            raise
+    
+    def _write_private_document(
+        self,
+        tenant_id: str,
+        doc_id: str,
+        doc_name: str,
+        content: Union[str, Iterable[str]],
+        framework: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        known_embeddings: Optional[Dict[str, List[float]]] = None,
+        existing_chunks: Optional[Dict[str, tuple]] = None
+    ) -> Dict[str, Any]:
+        """Chunk, embed and store a document in the tenant's private collection"""
+        # Get or create collection for tenant
+        self._ensure_tenant_registry(tenant_id)
+        collection_name = self._collection_name(tenant_id)
+        collection = self._tenant_collection(tenant_id, create=True)
+        
+        # Chunk the document lazily, page by page
+        counter = {'chars': 0}
+        chunks = self._iter_chunks(self._count_chars(content, counter))
+        
+        base_meta = {
+            'doc_id': doc_id,
+            'doc_name': doc_name,
+            'framework': framework,
+            'tenant_id': tenant_id,
+            **(metadata or {})
+        }
+        ingest = self._ingest_chunks(
+            collection, doc_id, chunks, base_meta, (tenant_id, doc_id), doc_name, progress_callback,
+            known_embeddings=known_embeddings,
+            existing_chunks=existing_chunks
+        )
+        
+        with self._registry_lock:
+            self._registry['tenants'].setdefault(tenant_id, {})[doc_id] = {
+                'doc_name': doc_name,
+                'framework': framework,
+                'shared': False,
+                **ingest['stats']
+            }
+            self._save_registry()
+        self._bump_version(tenant_id)
+        
+        return {
+            'doc_id': doc_id,
+            'chunks_added': ingest['chunks_added'],
+            'chunks_failed': len(ingest['failed_chunk_ids']),
+            'failed_chunk_ids': ingest['failed_chunk_ids'],
+            'chunks_embedded': ingest['chunks_embedded'],
+            'chunks_reused': ingest['chunks_reused'],
+            'chunks_unchanged': ingest['chunks_unchanged'],
+            'chunk_ids': ingest['chunk_ids'],
+            'total_chars': counter['chars'],
+            'collection': collection_name,
+            'shared': False
+        }
+    
+    def _ingest_chunks(
+        self,
+        collection,
+        id_prefix: str,
+        chunks: Iterable[Dict[str, Any]],
+        base_meta: Dict[str, Any],
+        progress_key: tuple,
+        doc_name: str,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+        known_embeddings: Optional[Dict[str, List[float]]] = None,
+        existing_chunks: Optional[Dict[str, tuple]] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed chunks and add them to a collection
+        
+        Chunks are consumed lazily: they are grouped into token-budgeted
+        batches, embedded in parallel with at most two batches per worker in
+        flight, and each finished batch is upserted into ChromaDB right away.
+        Memory stays bounded by the batch size, not the document size, and a
+        failure keeps earlier batches.
+        
+        Args:
+            known_embeddings: Vectors to reuse, keyed by chunk text hash
+            existing_chunks: chunk id -> (text hash, metadata) already stored;
+                identical chunks are left untouched
+            
+        Returns:
+            chunks_added, failed_chunk_ids, chunks_embedded, chunks_reused,
+            chunks_unchanged, chunk_ids and stats of the stored chunks
+        """
+        known_embeddings = known_embeddings or {}
+        existing_chunks = existing_chunks or {}
+        
+        progress = {
+            'doc_name': doc_name,
+            'total_chunks': 0,  # Grows as the chunker produces chunks
+            'chunks_added': 0,
+            'chunks_failed': 0,
+            'batches_total': 0,
+            'batches_done': 0
+        }
+        self.ingest_progress[progress_key] = progress
+        chunk_ids = []
+        failed_chunk_ids = []
+        counts = {'embedded': 0, 'reused': 0, 'unchanged': 0}
+        stats = self._chunk_stats([], [])
+        sections = set()
+        max_in_flight = max(1, self.embedding_max_workers) * 2
+        
+        def record(text, meta):
+            length = len(text)
+            stats['min_chunk_length'] = min(stats['min_chunk_length'], length) if stats['chunk_count'] else length
+            stats['max_chunk_length'] = max(stats['max_chunk_length'], length)
+            stats['chunk_count'] += 1
+            stats['total_chunk_chars'] += length
+            if meta.get('section_header'):
+                sections.add(meta['section_header'])
+        
+        def upsert(batch, embeddings):
+            ids = [item[0] for item in batch]
+            texts = [item[1] for item in batch]
+            metadatas = [item[2] for item in batch]
+            collection.upsert(ids=ids, embeddings=embeddings, documents=texts, metadatas=metadatas)
+            index = self._lexical.get(collection.name)
+            if index is not None:
+                index.add(ids, texts, metadatas)
+            progress['chunks_added'] += len(batch)
+            for _, text, meta in batch:
+                record(text, meta)
+        
+        def fail(batch, error):
+            logger.error(f"Batch {batch[0][0]}..{batch[-1][0]} of {id_prefix} failed: {error}")
+            failed_chunk_ids.extend(item[0] for item in batch)
+            progress['chunks_failed'] += len(batch)
+        
+        def store_reused(batch):
             try:
-                collection = self.chroma_client.get_collection(collection_name)
-            except:
-                collection = self.chroma_client.create_collection(
-                    name=collection_name,
-                    metadata={"tenant_id": tenant_id}
-                )
+                upsert(batch, [known_embeddings[self._content_hash(item[1])] for item in batch])
+                counts['reused'] += len(batch)
+            except Exception as e:
+                fail(batch, e)
+        
+        def collect(futures, limit):
+            # Upsert finished batches until fewer than `limit` are in flight
+            while len(futures) >= limit and futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = futures.pop(future)
+                    try:
+                        upsert(batch, future.result())
+                        counts['embedded'] += len(batch)
+                    except Exception as e:
+                        fail(batch, e)
+                    
+                    progress['batches_done'] += 1
+                    logger.info(
+                        f"Ingesting {id_prefix}: {progress['chunks_added']}/{progress['total_chunks']} chunks "
+                        f"({progress['batches_done']}/{progress['batches_total']} batches)"
+                    )
+                    if progress_callback:
+                        progress_callback(dict(progress))
+        
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.embedding_max_workers)) as pool:
+                futures = {}
+                embed_batch, embed_tokens, reuse_batch = [], 0, []
+                
+                def submit(batch):
+                    if progress['batches_total'] == 0:
+                        self._ensure_openai_client()
+                    collect(futures, max_in_flight)
+                    futures[pool.submit(self._get_embeddings, [item[1] for item in batch])] = batch
+                    progress['batches_total'] += 1
+                
+                for chunk in chunks:
+                    chunk_id = f"{id_prefix}_chunk_{chunk['chunk_id']}"
+                    text = chunk['text']
+                    
+                    # Metadata: document and caller fields, then chunk positions,
+                    # which caller metadata must not override
+                    chunk_meta = {
+                        **base_meta,
+                        'chunk_id': chunk['chunk_id'],
+                        'start_char': chunk['start_char'],
+                        'end_char': chunk['end_char'],
+                        'section_header': chunk.get('section_header', ''),
+                        'semantic_unit': chunk.get('semantic_unit', 'paragraph')
+                    }
+                    
+                    chunk_ids.append(chunk_id)
+                    progress['total_chunks'] += 1
+                    
+                    # Untouched, reusable (vector known) or to-embed
+                    text_hash = self._content_hash(text)
+                    if existing_chunks.get(chunk_id) == (text_hash, chunk_meta):
+                        counts['unchanged'] += 1
+                        progress['chunks_added'] += 1
+                        record(text, chunk_meta)
+                    elif text_hash in known_embeddings:
+                        reuse_batch.append((chunk_id, text, chunk_meta))
+                        if len(reuse_batch) >= 512:
+                            store_reused(reuse_batch)
+                            reuse_batch = []
+                    else:
+                        # Each batch stays under embedding_batch_token_budget (≈4 chars
+                        # per token) and embedding_batch_size inputs
+                        tokens = min(len(text), 8000) // 4 + 1
+                        if embed_batch and (embed_tokens + tokens > self.embedding_batch_token_budget
+                                            or len(embed_batch) >= self.embedding_batch_size):
+                            submit(embed_batch)
+                            embed_batch, embed_tokens = [], 0
+                        embed_batch.append((chunk_id, text, chunk_meta))
+                        embed_tokens += tokens
+                
+                if reuse_batch:
+                    store_reused(reuse_batch)
+                if embed_batch:
+                    submit(embed_batch)
+                collect(futures, 1)
+        finally:
+            self.ingest_progress.pop(progress_key, None)
+        
+        if chunk_ids and progress['chunks_added'] == 0:
+            raise Exception(f"All {len(chunk_ids)} chunks failed to embed")
+        
+        logger.info(
+            f"Added {progress['chunks_added']} chunks for document {id_prefix} "
+            f"({counts['embedded']} embedded, {counts['reused']} reused, {counts['unchanged']} unchanged)"
+            + (f" ({len(failed_chunk_ids)} failed)" if failed_chunk_ids else "")
+        )
+        
+        stats['sections'] = sorted(sections)
+        return {
+            'chunks_added': progress['chunks_added'],
+            'failed_chunk_ids': failed_chunk_ids,
+            'chunks_embedded': counts['embedded'],
+            'chunks_reused': counts['reused'],
+            'chunks_unchanged': counts['unchanged'],
+            'chunk_ids': chunk_ids,
+            'stats': stats
+        }
+    
+    def _add_shared_document(
+        self,
+        tenant_id: str,
+        doc_id: str,
+        doc_name: str,
+        content: Union[str, Iterable[str]],
+        framework: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Reference (embedding once if needed) a document in the shared corpus
+        
+        Deduplication needs the content hash before chunking, so page
+        iterators are read into a page list first (never joined).
+        """
+        try:
+            if not isinstance(content, str):
+                content = list(content)
+            counter = {'chars': 0}
+            for _ in self._count_chars(content, counter):
+                pass
+            content_hash = self._content_hash(content)
+            failed_chunk_ids = []
+            deduplicated = True
             
-            # Chunk the document
-            chunks = self._chunk_document(content)
+            previous = self._registry['tenants'].get(tenant_id, {}).get(doc_id)
+            if previous and previous.get('content_hash') != content_hash:
+                self._drop_shared_ref(tenant_id, doc_id)
             
-            # Prepare data for ChromaDB
-            chunk_ids = []
-            chunk_texts = []
-            chunk_embeddings = []
-            chunk_metadatas = []
+            # One ingestion per content hash, even if tenants upload concurrently
+            with self._registry_lock:
+                hash_lock = self._shared_locks.setdefault(content_hash, threading.Lock())
             
-            for chunk in chunks:
-                chunk_id = f"{doc_id}_chunk_{chunk['chunk_id']}"
-                chunk_ids.append(chunk_id)
-                chunk_texts.append(chunk['text'])
-                
-                # Generate embedding
-                embedding = self._get_embedding(chunk['text'])
-                chunk_embeddings.append(embedding)
-                
-                # Metadata
-                chunk_meta = {
-                    'doc_id': doc_id,
+            with hash_lock:
+                corpus = self._registry['shared'].get(content_hash)
+                if corpus is None or not corpus.get('complete'):
+                    deduplicated = False
+                    collection = self._shared_collection(create=True)
+                    
+                    chunks = self._iter_chunks([content] if isinstance(content, str) else content)
+                    base_meta = {
+                        'doc_id': f"shared_{content_hash[:16]}",
+                        'doc_name': doc_name,
+                        'framework': framework,
+                        'content_hash': content_hash
+                    }
+                    ingest = self._ingest_chunks(
+                        collection, content_hash, chunks, base_meta,
+                        (tenant_id, doc_id), doc_name, progress_callback
+                    )
+                    failed_chunk_ids = ingest['failed_chunk_ids']
+                    corpus = {
+                        'doc_name': doc_name,
+                        'framework': framework,
+                        'total_chars': counter['chars'],
+                        'complete': not failed_chunk_ids,
+                        **ingest['stats']
+                    }
+                    with self._registry_lock:
+                        self._registry['shared'][content_hash] = corpus
+                        self._save_registry()
+                    # Tenants already referencing an incomplete corpus see new chunks
+                    self._bump_version(*self._tenants_referencing(content_hash))
+                else:
+                    logger.info(f"Reusing shared corpus {content_hash[:12]} for {doc_name} (no embedding)")
+            
+            with self._registry_lock:
+                self._registry['tenants'].setdefault(tenant_id, {})[doc_id] = {
                     'doc_name': doc_name,
                     'framework': framework,
-                    'chunk_id': chunk['chunk_id'],
-                    'start_char': chunk['start_char'],
-                    'end_char': chunk['end_char'],
-                    'tenant_id': tenant_id,
-                    'section_header': chunk.get('section_header', ''),
-                    'semantic_unit': chunk.get('semantic_unit', 'paragraph')
+                    'content_hash': content_hash,
+                    'shared': True,
+                    'metadata': metadata or {}
                 }
-                if metadata:
-                    chunk_meta.update(metadata)
-                
-                chunk_metadatas.append(chunk_meta)
-            
-            # Add to ChromaDB
-            collection.add(
-                ids=chunk_ids,
-                embeddings=chunk_embeddings,
-                documents=chunk_texts,
-                metadatas=chunk_metadatas
-            )
-            
-            logger.info(f"Added {len(chunks)} chunks for document {doc_id}")
+                self._save_registry()
+            self._bump_version(tenant_id)
             
             return {
                 'doc_id': doc_id,
-                'chunks_added': len(chunks),
-                'total_chars': len(content),
-                'collection': collection_name
+                'chunks_added': corpus['chunk_count'],
+                'chunks_failed': len(failed_chunk_ids),
+                'failed_chunk_ids': failed_chunk_ids,
+                'total_chars': counter['chars'],
+                'collection': SHARED_COLLECTION,
+                'shared': True,
+                'deduplicated': deduplicated
             }
             
         except Exception as e:
-            logger.error(f"Failed to add regulatory document: {e}")
+            logger.error(f"Failed to add shared regulatory document: {e}")
             raise
     
+    def _shared_refs(self, tenant_id: str, framework: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Tenant's shared-corpus references, keyed by content hash"""
+        refs = {}
+        for doc_id, ref in self._registry['tenants'].get(tenant_id, {}).items():
+            if not ref.get('shared'):
+                continue
+            if framework and ref['framework'] != framework:
+                continue
+            refs.setdefault(ref['content_hash'], {**ref, 'doc_id': doc_id})
+        return refs
+    
+    @staticmethod
+    def _present_shared(meta: Dict[str, Any], ref: Dict[str, Any], tenant_id: str) -> Dict[str, Any]:
+        """Present a shared chunk under the tenant's own document identity"""
+        return {**meta, **ref['metadata'], 'doc_id': ref['doc_id'], 'doc_name': ref['doc_name'],
+                'framework': ref['framework'], 'tenant_id': tenant_id}
+    
+    def _has_private_documents(self, tenant_id: str, framework: Optional[str] = None) -> bool:
+        return any(
+            not entry.get('shared') and (not framework or entry['framework'] == framework)
+            for entry in self._tenant_documents(tenant_id).values()
+        )
+    
+    def _lexical_search(
+        self,
+        tenant_id: str,
+        query_text: str,
+        framework: Optional[str],
+        depth: int
+    ) -> tuple:
+        """
+        Keyword side of hybrid search over the tenant's private chunks and
+        the shared chunks it references
+        
+        Returns:
+            (clause_hits, keyword_hits): clause_hits is non-empty only for a
+            clause-number query that matched, exact matches before sub-clause
+            ones; both are ranked result lists
+        """
+        clause_query = parse_clause_query(query_text)
+        clause_hits, keyword_hits = [], []
+        scopes = []
+        
+        if self._has_private_documents(tenant_id, framework):
+            scopes.append((
+                self._collection_name(tenant_id),
+                (lambda meta: meta.get('framework') == framework) if framework else None,
+                None
+            ))
+        refs = self._shared_refs(tenant_id, framework)
+        if refs:
+            scopes.append((
+                SHARED_COLLECTION,
+                lambda meta: meta.get('content_hash') in refs,
+                lambda meta: self._present_shared(meta, refs[meta['content_hash']], tenant_id)
+            ))
+        
+        for collection_name, allow, rewrite in scopes:
+            index = self._lexical_index(collection_name)
+            if index is None:
+                continue
+            
+            def to_result(chunk_id, score, distance=None):
+                chunk = index.get(chunk_id)
+                meta = rewrite(chunk['metadata']) if rewrite else chunk['metadata']
+                return {
+                    'chunk_id': chunk_id,
+                    'text': chunk['text'],
+                    'metadata': meta,
+                    'distance': distance,
+                    'keyword_score': round(score, 4),
+                    '_collection': collection_name
+                }
+            
+            if clause_query:
+                matches, exact = index.lookup_clause(clause_query[0], clause_query[1], allow)
+                distance = CLAUSE_MATCH_DISTANCE if exact else SUBCLAUSE_MATCH_DISTANCE
+                clause_hits.extend(to_result(chunk_id, score, distance) for chunk_id, score in matches)
+            keyword_hits.extend(to_result(chunk_id, score) for chunk_id, score in index.search(query_text, depth, allow))
+        
+        clause_hits.sort(key=lambda hit: hit['distance'])
+        keyword_hits.sort(key=lambda hit: hit['keyword_score'], reverse=True)
+        return clause_hits, keyword_hits[:depth]
+    
+    @staticmethod
+    def _l2_distance(distance: Optional[float], space: str) -> Optional[float]:
+        """
+        A distance from a collection's space on the squared-L2 scale, so hits from
+        collections with different profiles compare (and thresholds tuned on l2
+        keep working). Embeddings are unit length: l2^2 = 2 * (1 - cosine), and
+        both cosine and ip distances are 1 - cosine.
+        """
+        if distance is None or space == "l2":
+            return distance
+        return 2 * distance
+    
+    def _fill_distances(self, hits: List[Dict[str, Any]], query_embedding: List[float]):
+        """Compute vector distances for keyword-only hits, on the squared-L2 scale"""
+        by_collection: Dict[str, List[Dict[str, Any]]] = {}
+        for hit in hits:
+            if hit['distance'] is None:
+                by_collection.setdefault(hit['_collection'], []).append(hit)
+        
+        for collection_name, missing in by_collection.items():
+            collection = self._get_collection(collection_name)
+            if collection is None:
+                continue
+            stored = collection.get(ids=[hit['chunk_id'] for hit in missing], include=["embeddings"])
+            vectors = dict(zip(stored['ids'], stored['embeddings']))
+            for hit in missing:
+                vector = vectors.get(hit['chunk_id'])
+                if vector is None:
+                    continue
+                hit['distance'] = sum((a - b) ** 2 for a, b in zip(query_embedding, vector))
+    
+    def _fuse(
+        self,
+        vector_hits: List[Dict[str, Any]],
+        keyword_hits: List[Dict[str, Any]],
+        n_results: int
+    ) -> List[Dict[str, Any]]:
+        """Reciprocal-rank fusion of vector and keyword rankings"""
+        fused: Dict[str, Dict[str, Any]] = {}
+        for source, hits in (('vector', vector_hits), ('keyword', keyword_hits)):
+            for rank, hit in enumerate(hits):
+                entry = fused.get(hit['chunk_id'])
+                if entry is None:
+                    entry = fused[hit['chunk_id']] = {**hit, 'rrf_score': 0.0, 'match': source}
+                else:
+                    entry['match'] = 'both'
+                    entry.setdefault('keyword_score', hit.get('keyword_score'))
+                entry['rrf_score'] += 1.0 / (self.rrf_k + rank + 1)
+        
+        ranked = sorted(fused.values(), key=lambda hit: hit['rrf_score'], reverse=True)[:n_results]
+        for hit in ranked:
+            hit['rrf_score'] = round(hit['rrf_score'], 6)
+        return ranked
+    
+    def _query_collections(
+        self,
+        tenant_id: str,
+        query_embeddings: List[List[float]],
+        framework: Optional[str],
+        n_results: int,
+        with_source: bool = False
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Multi-query search over the tenant's private collection and its view
+        of the shared corpus; results are merged by distance per query, on the
+        squared-L2 scale whatever space each collection's profile uses
+        (with_source keeps the internal '_collection' key on each match)
+        """
+        per_query = [[] for _ in query_embeddings]
+        
+        def collect(results, collection, rewrite=None):
+            if not results['ids']:
+                return
+            space = (collection.metadata or {}).get("hnsw:space", "l2")
+            for q in range(min(len(results['ids']), len(per_query))):
+                for i in range(len(results['ids'][q])):
+                    meta = results['metadatas'][q][i]
+                    if rewrite:
+                        meta = rewrite(meta)
+                    per_query[q].append({
+                        'chunk_id': results['ids'][q][i],
+                        'text': results['documents'][q][i],
+                        'metadata': meta,
+                        'distance': self._l2_distance(
+                            results['distances'][q][i] if 'distances' in results else None, space
+                        ),
+                        '_collection': collection.name
+                    })
+        
+        has_private = self._has_private_documents(tenant_id, framework)
+        collection = self._tenant_collection(tenant_id) if has_private else None
+        if collection is not None:
+            try:
+                collect(collection.query(
+                    query_embeddings=query_embeddings,
+                    n_results=n_results,
+                    where={"framework": framework} if framework else None
+                ), collection)
+            except Exception as e:
+                logger.error(f"Regulatory query failed for tenant {tenant_id}: {e}")
+        
+        refs = self._shared_refs(tenant_id, framework)
+        if refs:
+            hashes = list(refs)
+            where = {"content_hash": hashes[0]} if len(hashes) == 1 else {"content_hash": {"$in": hashes}}
+            
+            def rewrite(meta):
+                return self._present_shared(meta, refs[meta['content_hash']], tenant_id)
+            
+            try:
+                shared = self._shared_collection(create=True)
+                collect(shared.query(query_embeddings=query_embeddings, n_results=n_results, where=where),
+                        shared, rewrite)
+            except Exception as e:
+                logger.error(f"Shared corpus query failed: {e}")
+        
+        for matches in per_query:
+            matches.sort(key=lambda m: m['distance'] if m['distance'] is not None else float('inf'))
+            del matches[n_results:]
+            if not with_source:
+                for match in matches:
+                    match.pop('_collection', None)
+        
+        return per_query
+    
     def search_regulatory_requirements(
         self,
         tenant_id: str,
@@ -412,6 +1433,11 @@ class RAGService:
         """
         Search for relevant regulatory requirements
         
+        Hybrid retrieval: a query that is a clause number ("7.3.2 design
+        inputs", "820.30(c)") is answered from the lexical index without an
+        embedding call; otherwise BM25 and vector rankings are combined with
+        reciprocal-rank fusion.
+        
         Args:
             tenant_id: Tenant ID
             query_text: Search query
@@ -422,46 +1448,86 @@ class RAGService:
             List of matching chunks with scores
         """
         try:
-            collection_name = f"regulatory_{tenant_id}".replace("-", "_")
+            cache_key = self._search_cache_key(tenant_id, query_text, framework, n_results)
+            with self._search_cache_lock:
+                cached = self._search_cache.get(cache_key)
+                if cached is not None:
+                    self._search_cache.move_to_end(cache_key)
+                    self._search_cache_stats['hits'] += 1
+                    return copy.deepcopy(cached)
+                self._search_cache_stats['misses'] += 1
             
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-            except:
+            if not self._has_documents(tenant_id):
                 logger.warning(f"No regulatory documents found for tenant {tenant_id}")
                 return []
             
-            # Generate query embedding
-            query_embedding = self._get_embedding(query_text)
+            depth = max(n_results * 4, 20)
+            clause_hits, keyword_hits = self._lexical_search(tenant_id, query_text, framework, depth)
             
-            # Build where filter
-            where_filter = None
-            if framework:
-                where_filter = {"framework": framework}
-            
-            # Search
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results,
-                where=where_filter
-            )
+            # Clause-number lookups are answered from the index, no embedding call
+            if clause_hits:
+                results = [
+                    {**hit, 'match': 'clause'}
+                    for hit in clause_hits[:n_results]
+                ]
+            else:
+                # Generate query embedding
+                query_embedding = self._get_embedding(query_text)
+                vector_hits = self._query_collections(
+                    tenant_id, [query_embedding], framework, depth, with_source=True
+                )[0]
+                
+                if keyword_hits:
+                    results = self._fuse(vector_hits, keyword_hits, n_results)
+                    self._fill_distances(results, query_embedding)
+                else:
+                    results = vector_hits[:n_results]
             
-            # Format results
-            matches = []
-            if results['ids'] and len(results['ids']) > 0:
-                for i in range(len(results['ids'][0])):
-                    matches.append({
-                        'chunk_id': results['ids'][0][i],
-                        'text': results['documents'][0][i],
-                        'metadata': results['metadatas'][0][i],
-                        'distance': results['distances'][0][i] if 'distances' in results else None
-                    })
+            for result in results:
+                result.pop('_collection', None)
             
-            return matches
+            with self._search_cache_lock:
+                # Skip if the corpus changed while this search ran
+                if cache_key[1] == self._tenant_versions.get(tenant_id, 0):
+                    self._search_cache[cache_key] = copy.deepcopy(results)
+                    while len(self._search_cache) > self.search_cache_size:
+                        self._search_cache.popitem(last=False)
+                        self._search_cache_stats['evictions'] += 1
+            return results
             
         except Exception as e:
             logger.error(f"Search failed: {e}")
             return []
     
+    def search_regulatory_requirements_batch(
+        self,
+        tenant_id: str,
+        query_texts: List[str],
+        framework: Optional[str] = None,
+        n_results: int = 5
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search regulatory requirements for several queries at once
+        
+        Embeds all queries in one batch and issues a single multi-query
+        collection.query; returns one match list per query, in input order.
+        """
+        if not query_texts:
+            return []
+        
+        try:
+            if not self._has_documents(tenant_id):
+                logger.warning(f"No regulatory documents found for tenant {tenant_id}")
+                return [[] for _ in query_texts]
+            
+            query_embeddings = self._get_embeddings(query_texts)
+            
+            return self._query_collections(tenant_id, query_embeddings, framework, n_results)
+            
+        except Exception as e:
+            logger.error(f"Batch search failed: {e}")
+            return [[] for _ in query_texts]
+    
     def compare_documents(
         self,
         tenant_id: str,
@@ -490,15 +1556,15 @@ class RAGService:
             covered_requirements = set()
             confidence_scores = []  # Track all confidence scores for analysis
             
-            # Search for each QSP chunk
-            for chunk in qsp_chunks:
-                results = self.search_regulatory_requirements(
-                    tenant_id=tenant_id,
-                    query_text=chunk['text'],
-                    framework=framework,
-                    n_results=5  # Increased from 3 for better coverage
-                )
-                
+            # Search all QSP chunks with one embedding batch and one multi-query
+            batch_results = self.search_regulatory_requirements_batch(
+                tenant_id=tenant_id,
+                query_texts=[chunk['text'] for chunk in qsp_chunks],
+                framework=framework,
+                n_results=5  # Increased from 3 for better coverage
+            )
+            
+            for chunk, results in zip(qsp_chunks, batch_results):
                 for result in results:
                     # Calculate confidence score (similarity = 1 - distance)
                     confidence = 1 - result.get('distance', 1.0)
@@ -517,14 +1583,8 @@ class RAGService:
                         covered_requirements.add(result['chunk_id'])
             
             # Calculate coverage and confidence statistics
-            collection_name = f"regulatory_{tenant_id}".replace("-", "_")
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-                total_chunks = collection.count()
-                coverage = len(covered_requirements) / total_chunks if total_chunks > 0 else 0
-            except:
-                total_chunks = 0
-                coverage = 0
+            total_chunks = sum(doc.get('chunk_count', 0) for doc in self._tenant_documents(tenant_id).values())
+            coverage = len(covered_requirements) / total_chunks if total_chunks > 0 else 0
             
             # Calculate confidence score statistics
             avg_confidence = sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0
@@ -558,18 +1618,32 @@ class RAGService:
     ) -> bool:
         """
         Delete regulatory document from RAG system
+        
+        For a shared-corpus reference only the tenant's reference is removed;
+        the shared chunks are dropped once no tenant references them.
         """
         try:
-            collection_name = f"regulatory_{tenant_id}".replace("-", "_")
-            collection = self.chroma_client.get_collection(collection_name)
+            if self._drop_shared_ref(tenant_id, doc_id):
+                return True
             
-            # Get all chunk IDs for this document
+            self._ensure_tenant_registry(tenant_id)
+            collection = self._tenant_collection(tenant_id)
+            if collection is None:
+                return False
+            
+            # Get all chunk IDs for this document (ids only, no text)
             results = collection.get(
-                where={"doc_id": doc_id}
+                where={"doc_id": doc_id},
+                include=[]
             )
             
+            with self._registry_lock:
+                if self._registry['tenants'].get(tenant_id, {}).pop(doc_id, None) is not None:
+                    self._save_registry()
+            
             if results['ids']:
-                collection.delete(ids=results['ids'])
+                self._delete_chunks(collection, results['ids'])
+                self._bump_version(tenant_id)
                 logger.info(f"Deleted {len(results['ids'])} chunks for document {doc_id}")
                 return True
             
@@ -579,40 +1653,91 @@ class RAGService:
             logger.error(f"Failed to delete document: {e}")
             return False
     
+    def _drop_shared_ref(self, tenant_id: str, doc_id: str) -> bool:
+        """
+        Remove a tenant's shared-corpus reference, garbage-collecting the
+        shared chunks when it was the last one. Returns False if doc_id is
+        not a shared reference.
+        """
+        with self._registry_lock:
+            ref = self._registry['tenants'].get(tenant_id, {}).get(doc_id)
+            if not ref or not ref.get('shared'):
+                return False
+            
+            del self._registry['tenants'][tenant_id][doc_id]
+            self._save_registry()
+        self._bump_version(tenant_id)
+        
+        self._release_shared_corpus(ref['content_hash'])
+        logger.info(f"Removed shared reference {doc_id} for tenant {tenant_id}")
+        return True
+    
+    def _release_shared_corpus(self, content_hash: str):
+        """Delete shared chunks for a content hash no tenant references any more"""
+        with self._registry_lock:
+            still_referenced = any(
+                r.get('shared') and r.get('content_hash') == content_hash
+                for refs in self._registry['tenants'].values()
+                for r in refs.values()
+            )
+            if still_referenced:
+                return
+            self._registry['shared'].pop(content_hash, None)
+            self._save_registry()
+        
+        try:
+            shared = self._shared_collection(create=True)
+            stale = shared.get(where={"content_hash": content_hash}, include=[])
+            self._delete_chunks(shared, stale['ids'])
+            logger.info(f"Removed unreferenced shared corpus {content_hash[:12]}")
+        except Exception as e:
+            logger.error(f"Failed to remove shared corpus {content_hash[:12]}: {e}")
+    
     def list_regulatory_documents(self, tenant_id: str) -> List[Dict[str, Any]]:
         """
-        List all regulatory documents for tenant
+        List all regulatory documents for tenant (served from the registry)
         """
         try:
-            collection_name = f"regulatory_{tenant_id}".replace("-", "_")
-            
-            try:
-                collection = self.chroma_client.get_collection(collection_name)
-            except:
-                return []
-            
-            # Get all documents
-            results = collection.get()
-            
-            # Group by doc_id
-            docs = {}
-            for i, metadata in enumerate(results['metadatas']):
-                doc_id = metadata['doc_id']
-                if doc_id not in docs:
-                    docs[doc_id] = {
-                        'doc_id': doc_id,
-                        'doc_name': metadata['doc_name'],
-                        'framework': metadata['framework'],
-                        'chunk_count': 0
-                    }
-                docs[doc_id]['chunk_count'] += 1
-            
-            return list(docs.values())
+            return [
+                {
+                    'doc_id': doc_id,
+                    'doc_name': entry['doc_name'],
+                    'framework': entry['framework'],
+                    'chunk_count': entry.get('chunk_count', 0),
+                    'shared': entry.get('shared', False)
+                }
+                for doc_id, entry in self._tenant_documents(tenant_id).items()
+            ]
             
         except Exception as e:
             logger.error(f"Failed to list documents: {e}")
             return []
     
+    def get_chunking_stats(self, tenant_id: str) -> Dict[str, Any]:
+        """
+        Chunk count and length statistics for the tenant's documents,
+        aggregated from the registry without reading chunk text
+        """
+        docs = self._tenant_documents(tenant_id)
+        documents = self.list_regulatory_documents(tenant_id)
+        total_chunks = sum(entry.get('chunk_count', 0) for entry in docs.values())
+        total_chunk_chars = sum(entry.get('total_chunk_chars', 0) for entry in docs.values())
+        non_empty = [entry for entry in docs.values() if entry.get('chunk_count', 0) > 0]
+        sections = set()
+        for entry in docs.values():
+            sections.update(entry.get('sections', []))
+        
+        return {
+            'total_documents': len(docs),
+            'total_chunks': total_chunks,
+            'avg_chunks_per_doc': total_chunks // len(docs) if docs else 0,
+            'avg_chunk_length': total_chunk_chars // total_chunks if total_chunks else 0,
+            'min_chunk_length': min((e.get('min_chunk_length', 0) for e in non_empty), default=0),
+            'max_chunk_length': max((e.get('max_chunk_length', 0) for e in non_empty), default=0),
+            'unique_sections': len(sections),
+            'documents': documents
+        }
+    
     def reprocess_document(
         self,
         tenant_id: str,
@@ -626,9 +1751,10 @@ class RAGService:
         Reprocess a regulatory document with improved chunking strategy
         
         This method:
-        1. Deletes old chunks
-        2. Rechunks with improved strategy
-        3. Regenerates embeddings
+        1. Rechunks with improved strategy
+        2. Reuses stored vectors for chunks whose normalized text is unchanged
+           and embeds only new or changed chunks
+        3. Upserts changed chunks and deletes chunks that no longer exist
         4. Provides before/after comparison
         
         Args:
@@ -643,38 +1769,66 @@ class RAGService:
             Comparison of old vs new chunking
         """
         try:
-            collection_name = f"regulatory_{tenant_id}".replace("-", "_")
-            collection = self.chroma_client.get_collection(collection_name)
-            
-            # Get old chunk count
-            old_results = collection.get(where={"doc_id": doc_id})
-            old_chunk_count = len(old_results['ids']) if old_results['ids'] else 0
-            old_avg_length = 0
-            if old_results['documents']:
-                old_avg_length = sum(len(doc) for doc in old_results['documents']) // max(len(old_results['documents']), 1)
+            # Get old chunk count from the registry
+            old_entry = self._tenant_documents(tenant_id).get(doc_id, {})
+            old_chunk_count = old_entry.get('chunk_count', 0)
+            old_avg_length = old_entry.get('total_chunk_chars', 0) // max(old_chunk_count, 1)
             
             logger.info(f"Reprocessing document {doc_id}: Old chunks={old_chunk_count}, Old avg length={old_avg_length}")
             
-            # Delete old chunks
-            if old_results['ids']:
-                collection.delete(ids=old_results['ids'])
-                logger.info(f"Deleted {len(old_results['ids'])} old chunks")
+            # Old vectors by chunk text hash, and chunk ids already stored
+            known_embeddings = {}
+            existing_chunks = {}
+            if old_entry.get('shared'):
+                # Copy-on-write into the tenant's private collection; the shared
+                # corpus only lends its vectors
+                source = self._shared_collection(create=True)
+                old = source.get(
+                    where={"content_hash": old_entry['content_hash']},
+                    include=["embeddings", "documents"]
+                )
+                for text, embedding in zip(old['documents'], old['embeddings']):
+                    known_embeddings[self._content_hash(text)] = embedding
+            elif old_entry:
+                collection = self._tenant_collection(tenant_id, create=True)
+                old = collection.get(
+                    where={"doc_id": doc_id},
+                    include=["embeddings", "documents", "metadatas"]
+                )
+                for chunk_id, text, embedding, meta in zip(
+                    old['ids'], old['documents'], old['embeddings'], old['metadatas']
+                ):
+                    text_hash = self._content_hash(text)
+                    known_embeddings[text_hash] = embedding
+                    existing_chunks[chunk_id] = (text_hash, meta)
             
-            # Add with new chunking strategy
-            result = self.add_regulatory_document(
-                tenant_id=tenant_id,
-                doc_id=doc_id,
-                doc_name=doc_name,
-                content=content,
-                framework=framework,
-                metadata=metadata
+            # Store with new chunking strategy
+            result = self._write_private_document(
+                tenant_id, doc_id, doc_name, content, framework, metadata,
+                known_embeddings=known_embeddings,
+                existing_chunks=existing_chunks
             )
             
+            # Drop what the new chunking no longer produces
+            if old_entry.get('shared'):
+                # The private entry written above replaced the reference
+                self._release_shared_corpus(old_entry['content_hash'])
+            else:
+                stale_ids = sorted(set(existing_chunks) - set(result['chunk_ids']))
+                if stale_ids:
+                    self._delete_chunks(self._tenant_collection(tenant_id), stale_ids)
+                    self._bump_version(tenant_id)
+                    logger.info(f"Deleted {len(stale_ids)} stale chunks")
+            
             # Calculate improvement
             new_chunk_count = result['chunks_added']
             improvement_ratio = old_chunk_count / max(new_chunk_count, 1)
             
-            logger.info(f"Reprocessed document {doc_id}: New chunks={new_chunk_count}, Improvement ratio={improvement_ratio:.2f}")
+            logger.info(
+                f"Reprocessed document {doc_id}: New chunks={new_chunk_count}, "
+                f"embedded={result['chunks_embedded']}, reused={result['chunks_reused']}, "
+                f"unchanged={result['chunks_unchanged']}, Improvement ratio={improvement_ratio:.2f}"
+            )
             
             return {
                 'doc_id': doc_id,
@@ -684,6 +1838,9 @@ class RAGService:
                 'old_avg_length': old_avg_length,
                 'new_avg_length': result['total_chars'] // max(new_chunk_count, 1),
                 'improvement_ratio': improvement_ratio,
+                'chunks_embedded': result['chunks_embedded'],
+                'chunks_reused': result['chunks_reused'],
+                'chunks_unchanged': result['chunks_unchanged'],
                 'status': 'reprocessed'
             }
             
@@ -0,0 +1,138 @@
+"""
+Run Memo - Reuse of change impact runs for repeated requests
+A run is keyed by a hash of its normalized deltas, the tenant's QSP corpus
+version, the matching threshold, top_k, the delta embedding mode and
+ANALYSIS_VERSION. A request with
+a known key returns the stored run instead of re-embedding and re-searching.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever matching, scoring or the stored row format changes; invalidates memoized runs
+ANALYSIS_VERSION = "impact-v1"
+
+# Memo entries expire after this long (TTL index), bounding reuse across
+# corpus writes that bypass the corpus version (seed scripts, manual fixes)
+RUN_MEMO_TTL_SECONDS = int(os.getenv("RUN_MEMO_TTL_SECONDS", "86400"))
+
+# Delta fields that influence the analysis
+DELTA_FIELDS = ('clause_id', 'change_text', 'change_type', 'old_text', 'new_text', 'hunk_text', 'regulatory_doc', 'reg_title')
+
+
+def normalize_deltas(deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Deltas reduced to the fields that matter, with whitespace and change type case normalized"""
+    normalized = []
+    for delta in deltas:
+        entry = {}
+        for field in DELTA_FIELDS:
+            value = delta.get(field)
+            if isinstance(value, str):
+                value = ' '.join(value.split())
+                if field == 'change_type':
+                    value = value.lower()
+            entry[field] = value
+        normalized.append(entry)
+    return normalized
+
+
+def rows_digest(rows: List[Dict[str, Any]]) -> str:
+    """
+    Hash of a run's gap result row identities (impact_index, id); it changes when
+    rows are patched, replaced or removed, but not when reviewers edit them
+    """
+    identities = sorted(f"{row['impact_index']}\x1f{row['id']}" for row in rows)
+    return hashlib.sha256('\x1e'.join(identities).encode('utf-8')).hexdigest()
+
+
+class RunMemoService:
+    """Maps analysis keys to stored runs (run_memos collection)"""
+
+    def __init__(self, db: Optional[AsyncIOMotorDatabase] = None):
+        self.db = db
+        self.collection = db["run_memos"] if db is not None else None
+
+    def set_database(self, db: AsyncIOMotorDatabase):
+        """Set database connection"""
+        self.db = db
+        self.collection = db["run_memos"]
+
+    @staticmethod
+    def memo_key(
+        tenant_id: str,
+        kind: str,
+        deltas: List[Dict[str, Any]],
+        corpus_version: int,
+        threshold: float,
+        top_k: int,
+        embedding_mode: str = 'clause',
+        hunk_weight: Optional[float] = None
+    ) -> str:
+        """Hash of everything that determines a run's results"""
+        payload = json.dumps({
+            'analysis_version': ANALYSIS_VERSION,
+            'tenant_id': tenant_id,
+            'kind': kind,
+            'deltas': normalize_deltas(deltas),
+            'corpus_version': corpus_version,
+            'threshold': threshold,
+            'top_k': top_k,
+            'embedding_mode': embedding_mode,
+            # Only the weighted mode blends scores
+            'hunk_weight': hunk_weight if embedding_mode == 'weighted' else None
+        }, sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    async def lookup(self, tenant_id: str, key: str) -> Optional[Dict[str, Any]]:
+        """The memo entry for key: {'run_id', 'rows_digest', 'response'}, or None"""
+        if self.collection is None:
+            return None
+        try:
+            return await self.collection.find_one({'_id': key, 'tenant_id': tenant_id})
+        except Exception as e:
+            logger.warning(f"Run memo lookup failed: {e}")
+            return None
+
+    async def record(self, tenant_id: str, key: str, run_id: str, digest: str, response: Dict[str, Any]):
+        """
+        Remember a completed run; digest is the rows_digest of its saved rows and
+        response holds the run's response fields other than the impacts
+        themselves, which are rebuilt from gap_results
+        """
+        if self.collection is None:
+            return
+        try:
+            await self.collection.replace_one(
+                {'_id': key},
+                {
+                    '_id': key,
+                    'tenant_id': tenant_id,
+                    'run_id': run_id,
+                    'rows_digest': digest,
+                    'response': response,
+                    'analysis_version': ANALYSIS_VERSION,
+                    'created_at': datetime.now(timezone.utc)
+                },
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning(f"Failed to memoize run {run_id}: {e}")
+
+    async def forget(self, key: str):
+        if self.collection is None:
+            return
+        try:
+            await self.collection.delete_one({'_id': key})
+        except Exception as e:
+            logger.warning(f"Failed to drop run memo: {e}")
+
+
+# Singleton instance
+run_memo = RunMemoService()
@@ -0,0 +1,98 @@
+"""
+Score Matrix - Compact per-run delta/section similarity scores
+Each analyzed delta keeps its top-N cosine scores as little-endian float16
+with uint32 positions into a section table. Section tables list a corpus's
+sections in analysis order and are content-addressed, so runs over an
+unchanged corpus share one table. Impacts can then be re-derived at another
+threshold/top_k, or a (non-)match explained, without re-embedding anything.
+float16 keeps ~3 significant digits, so scores within ~0.0005 of a threshold
+may fall on either side of it compared to the original run.
+"""
+import hashlib
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Scores kept per delta
+SCORE_MATRIX_TOP_N = int(os.getenv("SCORE_MATRIX_TOP_N", "256"))
+
+SCORE_DTYPE = np.dtype('<f2')
+POSITION_DTYPE = np.dtype('<u4')
+
+
+def section_table(
+    tenant_id: str,
+    qsp_sections: Sequence[Dict[str, Any]],
+    identity: Callable[[Dict[str, Any]], str]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """(content hash, entries) of the section table for sections in analysis order"""
+    entries = [{
+        'doc_id': section.get('doc_id'),
+        'section_key': identity(section),
+        'section_path': section.get('section_path', ''),
+        'doc_name': section.get('doc_name', ''),
+        'heading': section.get('heading', ''),
+        'content_hash': section.get('content_hash', ''),
+        'embedded': 'embedding' in section
+    } for section in qsp_sections]
+
+    digest = hashlib.sha256(tenant_id.encode('utf-8'))
+    for entry in entries:
+        digest.update(
+            f"\x1e{entry['doc_id']}\x1f{entry['section_key']}\x1f{entry['content_hash']}"
+            f"\x1f{entry['doc_name']}\x1f{entry['heading']}\x1f{int(entry['embedded'])}".encode('utf-8')
+        )
+    return digest.hexdigest(), entries
+
+
+def encode_scores(
+    positions: Sequence[int],
+    scores: Sequence[float],
+    table_id: str,
+    top_n: int = SCORE_MATRIX_TOP_N
+) -> Dict[str, Any]:
+    """Keep the top_n scores (with their table positions), best first"""
+    positions = np.asarray(positions, dtype=POSITION_DTYPE)
+    scores = np.asarray(scores, dtype=np.float32)
+    scored_sections = len(scores)
+    if len(scores) > top_n:
+        keep = np.argpartition(-scores, top_n - 1)[:top_n]
+        positions, scores = positions[keep], scores[keep]
+    order = np.argsort(-scores, kind='stable')
+    return {
+        'table': table_id,
+        'positions': positions[order].astype(POSITION_DTYPE).tobytes(),
+        'scores': scores[order].astype(SCORE_DTYPE).tobytes(),
+        # Sections with an embedding; more than were kept when the list was cut at top_n
+        'scored_sections': scored_sections
+    }
+
+
+def decode_scores(matrix: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    """(positions, float32 scores), best first"""
+    positions = np.frombuffer(matrix['positions'], dtype=POSITION_DTYPE)
+    scores = np.frombuffer(matrix['scores'], dtype=SCORE_DTYPE).astype(np.float32)
+    return positions, scores
+
+
+def derive_matches(scores: np.ndarray, threshold: float, top_k: int) -> int:
+    """Number of leading (best) scores that match at threshold/top_k"""
+    return int(min(top_k, np.count_nonzero(scores >= threshold)))
+
+
+def find_position(
+    entries: List[Dict[str, Any]],
+    section_key: Optional[str] = None,
+    doc_id: Optional[str] = None,
+    section_path: Optional[str] = None
+) -> Optional[int]:
+    """Table position of a section, by section_key or section_path (optionally within doc_id)"""
+    for position, entry in enumerate(entries):
+        if doc_id and entry['doc_id'] != doc_id:
+            continue
+        if section_key and entry['section_key'] == section_key:
+            return position
+        if section_path and not section_key and entry['section_path'] == section_path:
+            return position
+    return None
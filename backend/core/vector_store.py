@@ -0,0 +1,438 @@
+"""
+Vector store backends for the RAG service
+ChromaDB (default) or a flat NumPy store: memory-mapped float32 vectors plus an
+append-only JSON row journal, with vectorized metadata filtering
+
+Both expose the Chroma collection API subset RAGService uses: upsert, query,
+get, delete and count with `where` filters ($eq/$ne/$in/$nin/$and/$or), and
+return Chroma-shaped result dicts.
+"""
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ChromaVectorStore:
+    """ChromaDB PersistentClient; its collections already implement the API"""
+
+    backend = "chroma"
+
+    def __init__(self, persist_dir: str):
+        import chromadb
+        from chromadb.config import Settings
+
+        self.client = chromadb.PersistentClient(
+            path=persist_dir,
+            settings=Settings(
+                anonymized_telemetry=False,
+                allow_reset=True
+            )
+        )
+        logger.info(f"ChromaDB initialized at {persist_dir}")
+
+    def get_collection(self, name: str):
+        return self.client.get_collection(name)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None):
+        return self.client.get_or_create_collection(name=name, metadata=metadata)
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name)
+
+    def rename_collection(self, name: str, new_name: str):
+        self.client.get_collection(name).modify(name=new_name)
+
+    def list_collections(self) -> List[str]:
+        return [c.name for c in self.client.list_collections()]
+
+
+def _column_mask(values: np.ndarray, condition: Any) -> np.ndarray:
+    if not isinstance(condition, dict):
+        return values == condition
+    (op, operand), = condition.items()
+    if op == "$eq":
+        return values == operand
+    if op == "$ne":
+        return values != operand
+    if op in ("$in", "$nin"):
+        # Elementwise == per operand: object columns may mix None and str,
+        # which np.isin cannot sort
+        mask = np.zeros(len(values), dtype=bool)
+        for value in operand:
+            mask |= values == value
+        return mask if op == "$in" else ~mask
+    raise ValueError(f"Unsupported where operator: {op}")
+
+
+class NumpyCollection:
+    """
+    One collection, as a generation of files committed by meta.json:
+    vectors.<gen>.f32 (rows x dim, memory-mapped) and rows.<gen>.jsonl, an
+    append-only journal of row writes and deletes replayed on open. Upserts
+    append vectors and journal lines (overwriting existing rows in place),
+    deletes tombstone rows; when over a quarter of the rows are dead, live
+    rows are compacted into the next generation, which becomes current once
+    meta.json is atomically replaced.
+    """
+
+    def __init__(self, path: str, name: str, metadata: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self._lock = threading.RLock()
+        self._columns: Dict[str, np.ndarray] = {}
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._vectors: Optional[np.ndarray] = None
+        self.set_path(path)
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                state = json.load(f)
+        else:
+            os.makedirs(path, exist_ok=True)
+            state = {'metadata': metadata or {}, 'dim': None, 'generation': 0}
+        self.metadata = state['metadata']
+        self._dim = state['dim']
+        self._generation = state['generation']
+        self._replay()
+        self._row = {chunk_id: i for i, chunk_id in enumerate(self._ids) if self._alive[i]}
+        self._vectors = self._open_vectors(self._vectors_path)
+
+    def set_path(self, path: str):
+        """Point the collection at its (possibly renamed) directory"""
+        self.path = path
+        self._meta_path = os.path.join(path, "meta.json")
+        if self._vectors is not None:
+            self._vectors = self._open_vectors(self._vectors_path)
+
+    # Storage
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, f"vectors.{self._generation}.f32")
+
+    @property
+    def _journal_path(self) -> str:
+        return os.path.join(self.path, f"rows.{self._generation}.jsonl")
+
+    def _open_vectors(self, vectors_path: str) -> Optional[np.ndarray]:
+        if not self._dim or not self._ids:
+            return None
+        return np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(len(self._ids), self._dim))
+
+    def _save_meta(self):
+        """Atomically replace meta.json; this commits the current generation"""
+        tmp_path = f"{self._meta_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({'metadata': self.metadata, 'dim': self._dim, 'generation': self._generation}, f)
+        os.replace(tmp_path, self._meta_path)
+
+    def _replay(self):
+        """Rebuild rows from the journal, dropping a write torn by a crash"""
+        if not os.path.exists(self._journal_path):
+            return
+        alive = []
+        good_offset = 0
+        with open(self._journal_path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if 'del' in record:
+                    for row in record['del']:
+                        alive[row] = False
+                elif record['r'] == len(self._ids):
+                    self._ids.append(record['id'])
+                    self._documents.append(record['doc'])
+                    self._metadatas.append(record['meta'])
+                    alive.append(True)
+                else:
+                    self._documents[record['r']] = record['doc']
+                    self._metadatas[record['r']] = record['meta']
+                good_offset += len(line)
+        self._alive = np.array(alive, dtype=bool)
+        if good_offset < os.path.getsize(self._journal_path):
+            with open(self._journal_path, "r+b") as f:
+                f.truncate(good_offset)
+        # Vectors appended without their journal lines
+        if self._dim and os.path.exists(self._vectors_path):
+            size = len(self._ids) * self._dim * 4
+            if os.path.getsize(self._vectors_path) > size:
+                with open(self._vectors_path, "r+b") as f:
+                    f.truncate(size)
+
+    def _journal(self, records: List[Dict[str, Any]]):
+        with open(self._journal_path, "a") as f:
+            f.write(''.join(json.dumps(record) + "\n" for record in records))
+
+    def _append_vectors(self, vectors: np.ndarray):
+        if self._vectors is not None:
+            self._vectors.flush()
+        with open(self._vectors_path, "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+
+    def _compact(self):
+        """Write live rows as the next generation, commit it and remove the previous one"""
+        keep = np.flatnonzero(self._alive)
+        vectors = np.array(self._vectors[keep]) if self._vectors is not None else None
+        old_files = [self._vectors_path, self._journal_path]
+        self._ids = [self._ids[i] for i in keep]
+        self._documents = [self._documents[i] for i in keep]
+        self._metadatas = [self._metadatas[i] for i in keep]
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._row = {chunk_id: i for i, chunk_id in enumerate(self._ids)}
+        self._vectors = None
+
+        self._generation += 1
+        with open(self._vectors_path, "wb") as f:
+            if vectors is not None:
+                f.write(vectors.astype(np.float32).tobytes())
+        with open(self._journal_path, "w") as f:
+            pass
+        self._journal([
+            {'r': row, 'id': chunk_id, 'doc': document, 'meta': meta}
+            for row, (chunk_id, document, meta) in enumerate(zip(self._ids, self._documents, self._metadatas))
+        ])
+        self._save_meta()
+        for old_path in old_files:
+            if os.path.exists(old_path):
+                os.remove(old_path)
+        self._vectors = self._open_vectors(self._vectors_path)
+        logger.info(f"Compacted vector collection {self.name}: {len(keep)} rows")
+
+    # Filtering
+
+    def _column(self, key: str) -> np.ndarray:
+        column = self._columns.get(key)
+        if column is None:
+            column = np.empty(len(self._metadatas), dtype=object)
+            column[:] = [meta.get(key) for meta in self._metadatas]
+            self._columns[key] = column
+        return column
+
+    def _where_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = self._alive.copy()
+        if not where:
+            return mask
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                either = np.zeros(len(self._ids), dtype=bool)
+                for clause in condition:
+                    either |= self._where_mask(clause)
+                mask &= either
+            else:
+                mask &= _column_mask(self._column(key), condition)
+        return mask
+
+    # Collection API
+
+    def count(self) -> int:
+        return len(self._row)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        self.upsert(ids, embeddings, documents, metadatas)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            if self._dim is None:
+                self._dim = int(vectors.shape[1])
+                self._save_meta()
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match collection dimension {self._dim}")
+
+            # An id repeated within the batch takes its last occurrence
+            batch = {chunk_id: i for i, chunk_id in enumerate(ids)}
+            new_rows = []
+            records = []
+            for chunk_id, i in batch.items():
+                row = self._row.get(chunk_id)
+                if row is None:
+                    new_rows.append(i)
+                    continue
+                self._vectors[row] = vectors[i]
+                self._documents[row] = documents[i]
+                self._metadatas[row] = metadatas[i]
+                records.append({'r': row, 'id': chunk_id, 'doc': documents[i], 'meta': metadatas[i]})
+
+            if new_rows:
+                # Vectors before journal lines: replay ignores vectors without a line
+                self._append_vectors(vectors[new_rows])
+                for i in new_rows:
+                    self._row[ids[i]] = len(self._ids)
+                    records.append({'r': len(self._ids), 'id': ids[i], 'doc': documents[i], 'meta': metadatas[i]})
+                    self._ids.append(ids[i])
+                    self._documents.append(documents[i])
+                    self._metadatas.append(metadatas[i])
+                self._alive = np.concatenate([self._alive, np.ones(len(new_rows), dtype=bool)])
+                self._vectors = self._open_vectors(self._vectors_path)
+            else:
+                self._vectors.flush()
+
+            self._columns.clear()
+            self._journal(records)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            rows = [self._row[i] for i in (ids or []) if i in self._row]
+            if where:
+                rows.extend(np.flatnonzero(self._where_mask(where)).tolist())
+            if not rows:
+                return
+            for row in rows:
+                self._alive[row] = False
+                self._row.pop(self._ids[row], None)
+            self._journal([{'del': sorted(set(rows))}])
+            if (~self._alive).sum() > len(self._alive) // 4:
+                self._compact()
+            self._columns.clear()
+
+    def _result(self, rows, include) -> Dict[str, Any]:
+        result = {'ids': [self._ids[r] for r in rows]}
+        if "documents" in include:
+            result['documents'] = [self._documents[r] for r in rows]
+        if "metadatas" in include:
+            result['metadatas'] = [self._metadatas[r] for r in rows]
+        if "embeddings" in include:
+            result['embeddings'] = [self._vectors[r].tolist() for r in rows]
+        return result
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include=("documents", "metadatas")) -> Dict[str, Any]:
+        with self._lock:
+            if ids is not None:
+                rows = [self._row[i] for i in ids if i in self._row]
+                if where:
+                    mask = self._where_mask(where)
+                    rows = [r for r in rows if mask[r]]
+            else:
+                rows = np.flatnonzero(self._where_mask(where)).tolist()
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return self._result(rows, include)
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include=("documents", "metadatas", "distances")) -> Dict[str, Any]:
+        with self._lock:
+            out = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+            rows = np.flatnonzero(self._where_mask(where))
+            queries = np.asarray(query_embeddings, dtype=np.float32)
+            if self._vectors is None or not len(rows):
+                for _ in queries:
+                    for key in out:
+                        out[key].append([])
+                return out
+
+            matrix = self._vectors[rows]
+            space = self.metadata.get("hnsw:space", "l2")
+            if space == "cosine":
+                norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(queries, axis=1)[:, None]
+                distances = 1 - (queries @ matrix.T) / np.maximum(norms, 1e-12)
+            elif space == "ip":
+                distances = 1 - queries @ matrix.T
+            else:
+                distances = (
+                    (queries ** 2).sum(axis=1)[:, None]
+                    - 2 * queries @ matrix.T
+                    + (matrix ** 2).sum(axis=1)[None, :]
+                )
+
+            k = min(n_results, len(rows))
+            for q in range(len(queries)):
+                top = np.argpartition(distances[q], k - 1)[:k]
+                top = top[np.argsort(distances[q][top])]
+                hits = rows[top].tolist()
+                result = self._result(hits, include)
+                out['ids'].append(result['ids'])
+                out['documents'].append(result.get('documents', []))
+                out['metadatas'].append(result.get('metadatas', []))
+                out['distances'].append(distances[q][top].astype(float).tolist())
+            return out
+
+
+class NumpyVectorStore:
+    """Flat, memory-mapped vector store: one directory per collection"""
+
+    backend = "numpy"
+
+    def __init__(self, persist_dir: str):
+        self.root = os.path.join(persist_dir, "numpy_store")
+        os.makedirs(self.root, exist_ok=True)
+        self._collections: Dict[str, NumpyCollection] = {}
+        self._lock = threading.Lock()
+        logger.info(f"NumPy vector store initialized at {self.root}")
+
+    def _path(self, name: str) -> str:
+        if not re.fullmatch(r"[A-Za-z0-9_.\-]+", name):
+            raise ValueError(f"Invalid collection name: {name}")
+        return os.path.join(self.root, name)
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                path = self._path(name)
+                if not os.path.exists(os.path.join(path, "meta.json")):
+                    raise ValueError(f"Collection {name} does not exist.")
+                collection = self._collections[name] = NumpyCollection(path, name)
+            return collection
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> NumpyCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(self._path(name), name, metadata)
+                collection._save_meta()
+                self._collections[name] = collection
+            return collection
+
+    def delete_collection(self, name: str):
+        import shutil
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(self._path(name), ignore_errors=True)
+
+    def rename_collection(self, name: str, new_name: str):
+        with self._lock:
+            collection = self._collections.pop(name, None)
+            os.rename(self._path(name), self._path(new_name))
+            if collection is not None:
+                collection.name = new_name
+                collection.set_path(self._path(new_name))
+                self._collections[new_name] = collection
+
+    def list_collections(self) -> List[str]:
+        return sorted(
+            entry for entry in os.listdir(self.root)
+            if os.path.exists(os.path.join(self.root, entry, "meta.json"))
+        )
+
+
+VECTOR_STORE_BACKENDS = {
+    'chroma': ChromaVectorStore,
+    'numpy': NumpyVectorStore,
+}
+
+
+def create_vector_store(backend: str, persist_dir: str):
+    """Instantiate a vector store backend by name ('chroma' or 'numpy')"""
+    try:
+        store_class = VECTOR_STORE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown vector store backend: {backend} (expected one of {sorted(VECTOR_STORE_BACKENDS)})")
+    return store_class(persist_dir)
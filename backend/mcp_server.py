@@ -22,7 +22,6 @@ import uuid
 import aiofiles
 from docx import Document
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel, Field
 
 from mcp.server import Server
@@ -37,7 +36,9 @@ from mcp.types import (
     LoggingLevel
 )
 
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from core.clause_mapping_executor import clause_mapping_executor
+from core.clause_index import ClauseIndex
+from core.database import database_provider
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -48,9 +49,15 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ.get('DB_NAME', 'test_database')]
+database_provider.configure(
+    mongo_url=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'),
+    db_name=os.environ.get('DB_NAME', 'test_database')
+)
+db = database_provider.db
+clause_mapping_executor.set_database(db)
+
+# QSP documents mapped concurrently by run_clause_mapping
+CLAUSE_MAPPING_CONCURRENCY = int(os.environ.get('CLAUSE_MAPPING_CONCURRENCY', '4'))
 
 # MCP Server instance
 server = Server("qsp-compliance-checker")
@@ -194,65 +201,9 @@ async def parse_document_sections(content: str, filename: str) -> Dict[str, str]
     return sections
 
 async def analyze_clause_mapping(qsp_content: str, qsp_filename: str, iso_clauses: List[str]) -> List[Dict[str, Any]]:
-    """Use AI to map QSP content to ISO clauses"""
+    """Use AI to map QSP content to ISO clauses (cached, concurrency-bounded)"""
     try:
-        # Initialize LLM chat
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=f"mapping_{uuid.uuid4()}",
-            system_message="""You are an expert in ISO 13485 compliance for medical devices. 
-            Analyze QSP document sections and map them to relevant ISO 13485:2024 clauses.
-            
-            For each mapping, provide:
-            1. The ISO clause number and title
-            2. Confidence score (0.0-1.0) based on relevance
-            3. Evidence text from the QSP that supports the mapping
-            4. Brief explanation of the mapping
-            
-            Return results as a JSON array with this structure:
-            [
-                {
-                    "iso_clause": "4.1 General requirements",
-                    "confidence_score": 0.85,
-                    "evidence_text": "relevant excerpt from QSP",
-                    "explanation": "brief explanation of why this maps"
-                }
-            ]"""
-        ).with_model("openai", "gpt-4o")
-        
-        iso_clauses_text = "\n".join([f"- {clause}" for clause in iso_clauses])
-        
-        user_message = UserMessage(
-            text=f"""Analyze this QSP document content and map it to relevant ISO 13485:2024 clauses:
-
-QSP Document: {qsp_filename}
-Content:
-{qsp_content[:3000]}...
-
-ISO 13485:2024 Key Clauses to consider:
-{iso_clauses_text}
-
-Provide detailed mappings with confidence scores."""
-        )
-        
-        response = await chat.send_message(user_message)
-        
-        # Parse JSON response
-        try:
-            # Clean the response - remove markdown formatting if present
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]  # Remove ```json
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]  # Remove ```
-            clean_response = clean_response.strip()
-            
-            mappings = json.loads(clean_response)
-            return mappings if isinstance(mappings, list) else []
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse AI response as JSON: {response}")
-            return []
-            
+        return await clause_mapping_executor.map_section(qsp_content, qsp_filename, iso_clauses)
     except Exception as e:
         logger.error(f"Error in AI clause mapping: {e}")
         return []
@@ -664,36 +615,47 @@ async def handle_run_clause_mapping(args: dict) -> list[TextContent]:
     else:
         await db.clause_mappings.delete_many({})
     
-    total_mappings = 0
+    # Process QSP documents concurrently, a bounded number at a time
+    semaphore = asyncio.Semaphore(CLAUSE_MAPPING_CONCURRENCY)
     
-    # Process each QSP document
-    for qsp_doc in qsp_docs:
+    async def map_document(qsp_doc):
         qsp_doc = parse_from_mongo(qsp_doc)
+        mapping_docs = []
         
-        # Map each section
-        for section_title, section_content in qsp_doc['sections'].items():
-            if len(section_content) < 50:  # Skip very short sections
-                continue
+        async with semaphore:
+            sections = [
+                (section_title, section_content)
+                for section_title, section_content in qsp_doc['sections'].items()
+                if len(section_content) >= 50  # Skip very short sections
+            ]
             
-            mappings = await analyze_clause_mapping(
-                section_content, qsp_doc['filename'], iso_clauses
+            # Sections are mapped concurrently; unchanged content is served from cache
+            section_mappings = await clause_mapping_executor.map_sections(
+                sections, qsp_doc['filename'], iso_clauses
             )
             
-            for mapping in mappings:
-                if mapping.get('confidence_score', 0) > 0.3:  # Only store high-confidence mappings
-                    clause_mapping = ClauseMapping(
-                        qsp_id=qsp_doc['id'],
-                        qsp_filename=qsp_doc['filename'],
-                        section_title=section_title,
-                        section_content=section_content[:500],  # Truncate for storage
-                        iso_clause=mapping['iso_clause'],
-                        confidence_score=mapping['confidence_score'],
-                        evidence_text=mapping['evidence_text']
-                    )
-                    
-                    mapping_dict = prepare_for_mongo(clause_mapping.model_dump())
-                    await db.clause_mappings.insert_one(mapping_dict)
-                    total_mappings += 1
+            for (section_title, section_content), mappings in zip(sections, section_mappings):
+                for mapping in mappings:
+                    if mapping.get('confidence_score', 0) > 0.3:  # Only store high-confidence mappings
+                        clause_mapping = ClauseMapping(
+                            qsp_id=qsp_doc['id'],
+                            qsp_filename=qsp_doc['filename'],
+                            section_title=section_title,
+                            section_content=section_content[:500],  # Truncate for storage
+                            iso_clause=mapping['iso_clause'],
+                            confidence_score=mapping['confidence_score'],
+                            evidence_text=mapping['evidence_text']
+                        )
+                        mapping_docs.append(prepare_for_mongo(clause_mapping.model_dump()))
+            
+            # One write per document
+            if mapping_docs:
+                await db.clause_mappings.insert_many(mapping_docs, ordered=False)
+        
+        return len(mapping_docs)
+    
+    counts = await asyncio.gather(*(map_document(qsp_doc) for qsp_doc in qsp_docs))
+    total_mappings = sum(counts)
     
     logger.info(f"Generated {total_mappings} clause mappings via MCP")
     
@@ -731,14 +693,9 @@ async def handle_run_compliance_analysis(args: dict) -> list[TextContent]:
     
     # Find gaps
     gaps = []
-    mapped_clauses = {}
     
-    # Group mappings by clause
-    for mapping in mappings:
-        clause = mapping['iso_clause']
-        if clause not in mapped_clauses:
-            mapped_clauses[clause] = []
-        mapped_clauses[clause].append(mapping)
+    # Index mapped clauses once; each changed clause is then a single lookup
+    clause_index = ClauseIndex(mappings, changed_clauses)
     
     # Check for gaps in changed clauses
     for changed_clause in changed_clauses:
@@ -746,16 +703,11 @@ async def handle_run_compliance_analysis(args: dict) -> list[TextContent]:
             continue
             
         # Find if any existing mappings cover this clause
-        found_mapping = False
-        low_confidence = []
+        covering = clause_index.covering_mappings(changed_clause)
+        found_mapping = bool(covering)
         
-        for clause, clause_mappings in mapped_clauses.items():
-            if changed_clause in clause or any(changed_clause in m['iso_clause'] for m in clause_mappings):
-                found_mapping = True
-                # Check confidence scores
-                for mapping in clause_mappings:
-                    if mapping['confidence_score'] < 0.7:
-                        low_confidence.append(mapping)
+        # Check confidence scores
+        low_confidence = [mapping for mapping in covering if mapping['confidence_score'] < 0.7]
         
         if not found_mapping:
             gap = ComplianceGap(
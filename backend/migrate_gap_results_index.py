@@ -0,0 +1,140 @@
+"""
+Make the gap_results (tenant_id, run_id, impact_index) index unique
+Deployments that created the index before it was unique, or that hold
+duplicate rows for a key, can't get the unique index from startup. This
+merges each duplicate group into its most recently updated row - keeping
+reviewer state (is_reviewed, custom_rationale) from every copy - and then
+converts the index without leaving the collection unindexed on that key.
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from core.database import database_provider
+from core.dashboard_metrics import dashboard_metrics
+from core.db_indexes import INDEX_REGISTRY
+
+# Fields set by reviewers, merged into the surviving row of a duplicate group
+REVIEW_FIELDS = ('is_reviewed', 'custom_rationale')
+
+
+def _unique_index() -> IndexModel:
+    """The registry's unique run/impact index of gap_results"""
+    return next(index for index in INDEX_REGISTRY['gap_results'] if index.document.get('unique'))
+
+
+async def _duplicate_groups(collection, keys):
+    """Rows sharing a key, most recently updated first"""
+    pipeline = [
+        {'$sort': {'updated_at': -1}},
+        {'$group': {
+            '_id': {key: f'${key}' for key in keys},
+            'rows': {'$push': {'_id': '$_id', **{field: f'${field}' for field in REVIEW_FIELDS}}},
+            'count': {'$sum': 1}
+        }},
+        {'$match': {'count': {'$gt': 1}}}
+    ]
+    return await collection.aggregate(pipeline, allowDiskUse=True).to_list(length=None)
+
+
+def _merged_review(rows) -> dict:
+    """Reviewer state of a duplicate group: reviewed if any copy was, latest non-empty rationale"""
+    rationale = next((row['custom_rationale'] for row in rows if row.get('custom_rationale')), '')
+    return {
+        'is_reviewed': any(row.get('is_reviewed') for row in rows),
+        'custom_rationale': rationale
+    }
+
+
+async def _merge_duplicates(collection, groups) -> int:
+    """Fold every duplicate group into its first row; returns the number of rows removed"""
+    removed = 0
+    for group in groups:
+        survivor, *duplicates = group['rows']
+        # Reviewer state goes onto the survivor before any copy is deleted
+        await collection.update_one({'_id': survivor['_id']}, {'$set': _merged_review(group['rows'])})
+        result = await collection.delete_many({'_id': {'$in': [row['_id'] for row in duplicates]}})
+        removed += result.deleted_count
+    return removed
+
+
+async def main(dry_run: bool) -> int:
+    db = database_provider.db
+    collection = db.gap_results
+    index = _unique_index()
+    spec = index.document
+    keys = list(spec['key'])
+
+    existing = (await collection.index_information()).get(spec['name'])
+    if existing is not None and existing.get('unique'):
+        print(f"✅ {spec['name']} is already unique")
+        return 0
+
+    # Server 6.0+: make the existing index reject new duplicates before they are
+    # collected, then convert it in place once they are merged
+    prepared = False
+    if existing is not None and not dry_run:
+        try:
+            await db.command('collMod', collection.name, index={'name': spec['name'], 'prepareUnique': True})
+            prepared = True
+        except OperationFailure as e:
+            print(f"⚠️  In-place conversion unavailable ({e}); rebuilding next to a bridge index")
+
+    groups = await _duplicate_groups(collection, keys)
+    duplicate_rows = sum(group['count'] - 1 for group in groups)
+    reviewed_groups = sum(1 for group in groups if any(
+        row.get('is_reviewed') or row.get('custom_rationale') for row in group['rows']
+    ))
+    print(f"🔍 Index {spec['name']}: {'exists, not unique' if existing is not None else 'missing'}")
+    print(f"🔍 {len(groups)} duplicated keys, {duplicate_rows} rows to merge away "
+          f"({reviewed_groups} groups carry reviewer state)")
+    if dry_run:
+        return 0
+
+    removed = await _merge_duplicates(collection, groups)
+    print(f"   Merged {len(groups)} duplicated keys, removed {removed} rows")
+
+    if prepared:
+        try:
+            await db.command('collMod', collection.name, index={'name': spec['name'], 'unique': True})
+        except OperationFailure as e:
+            print(f"❌ Converting {spec['name']} failed ({e}); re-run this script")
+            return 1
+    else:
+        # A bridge index keeps the key indexed while the old index is replaced
+        bridge = IndexModel(list(spec['key'].items()) + [('_id', 1)], name=f"{spec['name']}_bridge")
+        await collection.create_indexes([bridge])
+        if existing is not None:
+            await collection.drop_index(spec['name'])
+        try:
+            await collection.create_indexes([index])
+        except OperationFailure as e:
+            # Rows written since the merge; the bridge index stays until a re-run succeeds
+            print(f"❌ Unique index build failed ({e}); re-run this script")
+            return 1
+        await collection.drop_index(bridge.document['name'])
+
+    dashboard_metrics.set_database(db)
+    for tenant_id in {group['_id']['tenant_id'] for group in groups}:
+        await dashboard_metrics.update_parts(tenant_id)
+
+    print(f"✅ {spec['name']} is now unique")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge duplicate gap results and make their run/impact index unique")
+    parser.add_argument("--dry-run", action="store_true", help="Only report duplicates that would be merged")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
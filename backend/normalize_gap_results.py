@@ -0,0 +1,76 @@
+"""
+Convert gap_results rows written before normalization
+Moves inline QSP/regulatory text, downstream and hierarchy data of every legacy
+row into content-addressed gap_snapshots and replaces it with references
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Add backend directory to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from dotenv import load_dotenv
+
+load_dotenv(Path(__file__).parent / '.env')
+
+from pymongo import UpdateOne
+
+from core.database import database_provider
+from core.gap_result_store import DERIVED_FIELDS, SNAPSHOT_GROUPS, gap_result_store
+
+
+async def main(dry_run: bool) -> int:
+    db = database_provider.db
+    gap_result_store.set_database(db)
+
+    inline_fields = [field for _, fields in SNAPSHOT_GROUPS.values() for field in fields]
+    legacy_filter = {'$or': [{field: {'$exists': True}} for field in inline_fields]}
+
+    total = await db.gap_results.count_documents(legacy_filter)
+    print(f"🔍 {total} gap result rows hold inline text")
+    if dry_run or not total:
+        return 0
+
+    converted = 0
+    batch = []
+
+    async def flush():
+        nonlocal converted
+        snapshots = []
+        operations = []
+        for row in batch:
+            stored, row_snapshots = gap_result_store.normalize(row)
+            snapshots.extend(row_snapshots)
+            removed = [field for field in list(row) if field not in stored]
+            operations.append(UpdateOne(
+                {'_id': row['_id']},
+                {
+                    '$set': {ref_field: stored[ref_field] for ref_field in SNAPSHOT_GROUPS if ref_field in stored},
+                    '$unset': {field: '' for field in removed}
+                }
+            ))
+        await gap_result_store.save_snapshots(snapshots)
+        await db.gap_results.bulk_write(operations, ordered=False)
+        converted += len(batch)
+        batch.clear()
+        print(f"   {converted}/{total} rows converted")
+
+    cursor = db.gap_results.find(legacy_filter, batch_size=gap_result_store.batch_size)
+    async for row in cursor:
+        batch.append(row)
+        if len(batch) >= gap_result_store.batch_size:
+            await flush()
+    if batch:
+        await flush()
+
+    print(f"✅ Normalized {converted} gap result rows ({', '.join(DERIVED_FIELDS)} rebuilt on read)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move inline gap result text into content-addressed snapshots")
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows that would be converted")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
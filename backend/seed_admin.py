@@ -29,12 +29,15 @@ if not DEFAULT_ADMIN_PASSWORD:
     raise ValueError("ADMIN_PASSWORD environment variable is required for seeding admin user")
 
 
-async def seed_default_admin():
+async def seed_default_admin(db=None):
     """
     Seed default admin user and tenant if database is empty
+    Uses the given database (the app's shared client) or opens its own
     """
-    client = AsyncIOMotorClient(MONGO_URL)
-    db = client[DB_NAME]
+    client = None
+    if db is None:
+        client = AsyncIOMotorClient(MONGO_URL)
+        db = client[DB_NAME]
     
     try:
         # Check if any users exist
@@ -99,7 +102,8 @@ async def seed_default_admin():
         logger.error(f"Error seeding admin user: {e}")
         raise
     finally:
-        client.close()
+        if client is not None:
+            client.close()
 
 
 if __name__ == "__main__":
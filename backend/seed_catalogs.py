@@ -6,6 +6,7 @@ import asyncio
 import logging
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorClient
+from core.change_impact_service_mongo import bump_corpus_version
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -104,6 +105,10 @@ async def seed_catalogs(tenant_id: str):
     await db.forms_catalog.create_index([("tenant_id", 1), ("form_id", 1)], unique=True)
     await db.wi_catalog.create_index([("tenant_id", 1), ("wi_id", 1)], unique=True)
     
+    # Impact analyses link forms and WIs from the catalogs
+    if forms_added or wis_added:
+        await bump_corpus_version(db, tenant_id)
+    
     logger.info(f"✅ Seeding complete: {forms_added} forms, {wis_added} WIs added/updated")
     client.close()
 
@@ -20,6 +20,8 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from core.change_impact_service_mongo import bump_corpus_version
+
 # Tulip Medical Document Hierarchy
 # Based on the regulatory mapping provided
 
@@ -413,6 +415,9 @@ async def seed_hierarchy(tenant_id: str):
 
     print(f"  ✅ Level 5 (Reference Docs): {len(DOCUMENT_HIERARCHY['reference_docs'])} documents")
 
+    # Stored impact analyses traced through the replaced hierarchy
+    await bump_corpus_version(db, tenant_id)
+
     print(f"\n{'='*60}")
     print(f"🎉 Document hierarchy seeded successfully!")
     print(f"{'='*60}")
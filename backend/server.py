@@ -1,12 +1,13 @@
 from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Form, WebSocket, Depends
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
@@ -37,6 +38,14 @@ from core.audit_logger import audit_logger
 from core.reference_extractor import reference_extractor
 from core.traceability_engine import TraceabilityEngine
 from core.rag_service import rag_service
+from core.clause_mapping_executor import clause_mapping_executor
+from core.clause_index import ClauseIndex
+from core.dashboard_metrics import dashboard_metrics
+from core.change_impact_service_mongo import bump_corpus_version
+from core.gap_result_store import gap_result_store
+from core.run_memo import run_memo
+from core.database import database_provider
+from core.db_indexes import ensure_indexes
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -67,10 +76,8 @@ def validate_environment_variables():
 # Run validation before starting the app
 validate_environment_variables()
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection (one pooled client shared by every router and service)
+db = database_provider.db
 
 # Create the main app without a prefix
 app = FastAPI(title="QSP Compliance Checker - Multi-Tenant", version="2.0.0")
@@ -101,6 +108,10 @@ rag_router_module.set_database(db)
 regulatory_upload_router_module.set_database(db)
 catalogs_module.set_database(db)  # Catalogs API
 audit_logger.set_database(db)
+clause_mapping_executor.set_database(db)
+dashboard_metrics.set_database(db)
+gap_result_store.set_database(db)
+run_memo.set_database(db)
 
 # Register routers
 # api_router.include_router(auth_router_module.router)  # OLD AUTH - DISABLED
@@ -265,65 +276,9 @@ async def parse_document_sections(content: str, filename: str) -> Dict[str, str]
     return sections
 
 async def analyze_clause_mapping(qsp_content: str, qsp_filename: str, iso_clauses: List[str]) -> List[Dict[str, Any]]:
-    """Use AI to map QSP content to ISO clauses"""
+    """Use AI to map QSP content to ISO clauses (cached, concurrency-bounded)"""
     try:
-        # Initialize LLM chat
-        chat = LlmChat(
-            api_key=os.environ.get('EMERGENT_LLM_KEY'),
-            session_id=f"mapping_{uuid.uuid4()}",
-            system_message="""You are an expert in ISO 13485 compliance for medical devices. 
-            Analyze QSP document sections and map them to relevant ISO 13485:2024 clauses.
-            
-            For each mapping, provide:
-            1. The ISO clause number and title
-            2. Confidence score (0.0-1.0) based on relevance
-            3. Evidence text from the QSP that supports the mapping
-            4. Brief explanation of the mapping
-            
-            Return results as a JSON array with this structure:
-            [
-                {
-                    "iso_clause": "4.1 General requirements",
-                    "confidence_score": 0.85,
-                    "evidence_text": "relevant excerpt from QSP",
-                    "explanation": "brief explanation of why this maps"
-                }
-            ]"""
-        ).with_model("openai", "gpt-4o")
-        
-        iso_clauses_text = "\n".join([f"- {clause}" for clause in iso_clauses])
-        
-        user_message = UserMessage(
-            text=f"""Analyze this QSP document content and map it to relevant ISO 13485:2024 clauses:
-
-QSP Document: {qsp_filename}
-Content:
-{qsp_content[:3000]}...
-
-ISO 13485:2024 Key Clauses to consider:
-{iso_clauses_text}
-
-Provide detailed mappings with confidence scores."""
-        )
-        
-        response = await chat.send_message(user_message)
-        
-        # Parse JSON response
-        try:
-            # Clean the response - remove markdown formatting if present
-            clean_response = response.strip()
-            if clean_response.startswith('```json'):
-                clean_response = clean_response[7:]  # Remove ```json
-            if clean_response.endswith('```'):
-                clean_response = clean_response[:-3]  # Remove ```
-            clean_response = clean_response.strip()
-            
-            mappings = json.loads(clean_response)
-            return mappings if isinstance(mappings, list) else []
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse AI response as JSON: {response}")
-            return []
-            
+        return await clause_mapping_executor.map_section(qsp_content, qsp_filename, iso_clauses)
     except Exception as e:
         logger.error(f"Error in AI clause mapping: {e}")
         return []
@@ -364,6 +319,7 @@ async def health_check():
         return {
             "status": "healthy" if db_status == "healthy" and ai_status == "healthy" else "degraded",
             "database": db_status,
+            "database_pool": database_provider.get_pool_stats(),
             "ai_service": ai_status,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
@@ -546,6 +502,8 @@ async def upload_qsp_document(
                     context=ref.get('context')
                 )
                 await db.document_references.insert_one(doc_ref.model_dump())
+            if doc_refs:
+                await bump_corpus_version(db, tenant_id)
             
             # Store regulatory citations
             for cit in reg_cits:
@@ -851,6 +809,58 @@ async def upload_iso_summary(
         logger.error(f"Error uploading ISO summary: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# QSP documents mapped concurrently by /analysis/run-mapping
+CLAUSE_MAPPING_CONCURRENCY = int(os.environ.get('CLAUSE_MAPPING_CONCURRENCY', '4'))
+
+async def map_qsp_document_sections(tenant_id: str, qsp_doc: Dict[str, Any]) -> int:
+    """
+    Map one QSP document's sections to regulatory requirements
+    
+    All sections are embedded in one batch and searched with a single
+    multi-query; the document's mappings are written with one insert_many.
+    Returns the number of mappings stored.
+    """
+    sections = [
+        (section_title, section_content)
+        for section_title, section_content in qsp_doc['sections'].items()
+        if len(section_content) >= 50  # Skip very short sections
+    ]
+    if not sections:
+        return 0
+    
+    # Embedding and vector search are blocking; keep them off the event loop
+    batch_results = await run_in_threadpool(
+        rag_service.search_regulatory_requirements_batch,
+        tenant_id=tenant_id,
+        query_texts=[section_content for _, section_content in sections],
+        framework=None,  # Search across all frameworks
+        n_results=5
+    )
+    
+    mapping_docs = []
+    for (section_title, section_content), rag_results in zip(sections, batch_results):
+        for result in rag_results:
+            # Calculate confidence based on distance (lower distance = higher confidence)
+            distance = result.get('distance', 1.0)
+            confidence = 1.0 - min(distance, 1.0)  # Convert distance to confidence score
+            
+            if confidence > 0.3:  # Only store high-confidence mappings
+                clause_mapping = ClauseMapping(
+                    tenant_id=tenant_id,
+                    qsp_id=qsp_doc['id'],
+                    qsp_filename=qsp_doc['filename'],
+                    section_title=section_title,
+                    section_content=section_content[:500],  # Truncate for storage
+                    iso_clause=result['metadata'].get('doc_name', 'Unknown'),
+                    confidence_score=confidence,
+                    evidence_text=result['text'][:300]
+                )
+                mapping_docs.append(prepare_for_mongo(clause_mapping.model_dump()))
+    
+    if mapping_docs:
+        await db.clause_mappings.insert_many(mapping_docs, ordered=False)
+    return len(mapping_docs)
+
 @api_router.post("/analysis/run-mapping")
 async def run_clause_mapping(current_user: dict = Depends(get_current_user)):
     """Run AI-powered clause mapping using RAG regulatory documents - Tenant-aware"""
@@ -874,53 +884,23 @@ async def run_clause_mapping(current_user: dict = Depends(get_current_user)):
         # Clear existing mappings for this tenant
         await db.clause_mappings.delete_many({"tenant_id": tenant_id})
         
-        total_mappings = 0
+        # Process QSP documents concurrently, a bounded number at a time
+        semaphore = asyncio.Semaphore(CLAUSE_MAPPING_CONCURRENCY)
         
-        # Process each QSP document using RAG semantic search
-        for qsp_doc in qsp_docs:
+        async def map_document(qsp_doc):
             qsp_doc = parse_from_mongo(qsp_doc)
-            
-            # Map each section using RAG
-            for section_title, section_content in qsp_doc['sections'].items():
-                if len(section_content) < 50:  # Skip very short sections
-                    continue
-                
-                # Use RAG to find relevant regulatory requirements
+            async with semaphore:
                 try:
-                    rag_results = rag_service.search_regulatory_requirements(
-                        tenant_id=tenant_id,
-                        query_text=section_content,
-                        framework=None,  # Search across all frameworks
-                        n_results=5
-                    )
-                    
-                    # Create mappings from RAG results
-                    for result in rag_results:
-                        # Calculate confidence based on distance (lower distance = higher confidence)
-                        distance = result.get('distance', 1.0)
-                        confidence = 1.0 - min(distance, 1.0)  # Convert distance to confidence score
-                        
-                        if confidence > 0.3:  # Only store high-confidence mappings
-                            clause_mapping = ClauseMapping(
-                                tenant_id=tenant_id,
-                                qsp_id=qsp_doc['id'],
-                                qsp_filename=qsp_doc['filename'],
-                                section_title=section_title,
-                                section_content=section_content[:500],  # Truncate for storage
-                                iso_clause=result['metadata'].get('doc_name', 'Unknown'),
-                                confidence_score=confidence,
-                                evidence_text=result['text'][:300]
-                            )
-                            mapping_dict = prepare_for_mongo(clause_mapping.model_dump())
-                            await db.clause_mappings.insert_one(mapping_dict)
-                            total_mappings += 1
-                
+                    return await map_qsp_document_sections(tenant_id, qsp_doc)
                 except Exception as e:
-                    logger.error(f"RAG search failed for section {section_title}: {e}")
-                    continue
+                    logger.error(f"RAG mapping failed for {qsp_doc.get('filename')}: {e}")
+                    return 0
         
-        logger.info(f"Generated {total_mappings} clause mappings")
+        counts = await asyncio.gather(*(map_document(qsp_doc) for qsp_doc in qsp_docs))
+        total_mappings = sum(counts)
         
+        logger.info(f"Generated {total_mappings} clause mappings")
+
         # Prepare report results
         results = {
             "success": True,
@@ -956,6 +936,15 @@ async def run_clause_mapping(current_user: dict = Depends(get_current_user)):
         logger.error(f"Error running clause mapping: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/analysis/mapping-stats")
+async def get_mapping_stats(current_user: dict = Depends(get_current_user)):
+    """LLM clause mapping cache hit rate, call latency and estimated token usage"""
+    try:
+        return {"success": True, "stats": clause_mapping_executor.get_stats()}
+    except Exception as e:
+        logger.error(f"Error getting mapping stats: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.post("/analysis/run-compliance")
 async def run_compliance_analysis(current_user: dict = Depends(get_current_user)):
     """Run compliance gap analysis - Tenant-aware"""
@@ -984,14 +973,9 @@ async def run_compliance_analysis(current_user: dict = Depends(get_current_user)
         
         # Find gaps
         gaps = []
-        mapped_clauses = {}
         
-        # Group mappings by clause
-        for mapping in mappings:
-            clause = mapping['iso_clause']
-            if clause not in mapped_clauses:
-                mapped_clauses[clause] = []
-            mapped_clauses[clause].append(mapping)
+        # Index mapped clauses once; each changed clause is then a single lookup
+        clause_index = ClauseIndex(mappings, changed_clauses)
         
         # Check for gaps in changed clauses
         for changed_clause in changed_clauses:
@@ -999,16 +983,11 @@ async def run_compliance_analysis(current_user: dict = Depends(get_current_user)
                 continue
                 
             # Find if any existing mappings cover this clause
-            found_mapping = False
-            low_confidence = []
+            covering = clause_index.covering_mappings(changed_clause)
+            found_mapping = bool(covering)
             
-            for clause, clause_mappings in mapped_clauses.items():
-                if changed_clause in clause or any(changed_clause in m['iso_clause'] for m in clause_mappings):
-                    found_mapping = True
-                    # Check confidence scores
-                    for mapping in clause_mappings:
-                        if mapping['confidence_score'] < 0.7:
-                            low_confidence.append(mapping)
+            # Check confidence scores
+            low_confidence = [mapping for mapping in covering if mapping['confidence_score'] < 0.7]
             
             if not found_mapping:
                 gap = ComplianceGap(
@@ -1676,35 +1655,45 @@ async def mcp_run_clause_mapping(args: dict) -> str:
             "7.4 Purchasing", "8.1 General", "8.5 Improvement"
         ]
         
-        total_mappings = 0
+        # Process documents concurrently, a bounded number at a time
+        semaphore = asyncio.Semaphore(CLAUSE_MAPPING_CONCURRENCY)
         
-        # Process each document
-        for qsp_doc in qsp_docs:
+        async def map_document(qsp_doc):
             qsp_doc = parse_from_mongo(qsp_doc)
+            sections = [
+                (section_title, section_content)
+                for section_title, section_content in qsp_doc['sections'].items()
+                if len(section_content) >= 50
+            ]
             
-            for section_title, section_content in qsp_doc['sections'].items():
-                if len(section_content) < 50:
-                    continue
-                
-                mappings = await analyze_clause_mapping(
-                    section_content, qsp_doc['filename'], iso_clauses
+            async with semaphore:
+                # Sections are mapped concurrently; unchanged content is served from cache
+                section_mappings = await clause_mapping_executor.map_sections(
+                    sections, qsp_doc['filename'], iso_clauses
                 )
                 
-                for mapping in mappings:
-                    if mapping.get('confidence_score', 0) > 0.3:
-                        clause_mapping = ClauseMapping(
-                            qsp_id=qsp_doc['id'],
-                            qsp_filename=qsp_doc['filename'],
-                            section_title=section_title,
-                            section_content=section_content[:500],
-                            iso_clause=mapping['iso_clause'],
-                            confidence_score=mapping['confidence_score'],
-                            evidence_text=mapping['evidence_text']
-                        )
-                        
-                        mapping_dict = prepare_for_mongo(clause_mapping.model_dump())
-                        await db.clause_mappings.insert_one(mapping_dict)
-                        total_mappings += 1
+                mapping_docs = []
+                for (section_title, section_content), mappings in zip(sections, section_mappings):
+                    for mapping in mappings:
+                        if mapping.get('confidence_score', 0) > 0.3:
+                            clause_mapping = ClauseMapping(
+                                qsp_id=qsp_doc['id'],
+                                qsp_filename=qsp_doc['filename'],
+                                section_title=section_title,
+                                section_content=section_content[:500],
+                                iso_clause=mapping['iso_clause'],
+                                confidence_score=mapping['confidence_score'],
+                                evidence_text=mapping['evidence_text']
+                            )
+                            mapping_docs.append(prepare_for_mongo(clause_mapping.model_dump()))
+                
+                if mapping_docs:
+                    await db.clause_mappings.insert_many(mapping_docs, ordered=False)
+            
+            return len(mapping_docs)
+        
+        counts = await asyncio.gather(*(map_document(qsp_doc) for qsp_doc in qsp_docs))
+        total_mappings = sum(counts)
         
         return f"🤖 **AI Clause Mapping Complete**\n\n**Documents Processed:** {len(qsp_docs)}\n**Mappings Generated:** {total_mappings}\n\nYour QSP documents have been analyzed and mapped to ISO clauses. Run compliance analysis next!"
         
@@ -1736,13 +1725,13 @@ async def mcp_run_compliance_analysis(args: dict) -> str:
         
         # Find gaps
         gaps = []
-        mapped_clauses = {mapping['iso_clause'] for mapping in mappings}
+        clause_index = ClauseIndex(mappings, changed_clauses)
         
         for changed_clause in changed_clauses:
             if not changed_clause:
                 continue
             
-            found_mapping = any(changed_clause in clause for clause in mapped_clauses)
+            found_mapping = bool(clause_index.covering_clauses(changed_clause))
             
             if not found_mapping:
                 gap = ComplianceGap(
@@ -1992,15 +1981,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def startup_db_indexes():
+    """Apply the declarative index registry (idempotent)"""
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.error(f"Failed to ensure database indexes: {e}")
+
 @app.on_event("startup")
 async def startup_db_seed():
     """Seed default admin user and tenant on startup if database is empty"""
     from seed_admin import seed_default_admin
     try:
-        await seed_default_admin()
+        await seed_default_admin(db)
     except Exception as e:
         logger.error(f"Failed to seed admin user: {e}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    database_provider.close()
\ No newline at end of file
@@ -0,0 +1,79 @@
+"""Streamed /impact/analyze framing, memoized replay and run memo row digests"""
+import asyncio
+import json
+
+import api.change_impact as change_impact
+from core.run_memo import rows_digest
+
+
+class SummaryService:
+    def _generate_summary(self, impacts, summary=None):
+        return {'total_impacts': len(impacts)}
+
+
+def replay(monkeypatch, deltas, impacts, stream_format='ndjson'):
+    monkeypatch.setattr(change_impact, 'get_change_impact_service', lambda: SummaryService())
+    memoized = ({'run_id': 'run-1'}, impacts)
+
+    async def collect():
+        return [
+            event async for event in
+            change_impact._stream_analysis('t1', 'u1', deltas, stream_format, 'key', memoized)
+        ]
+    return [json.loads(line) for line in asyncio.run(collect())]
+
+
+def test_ndjson_event_is_one_json_line():
+    line = change_impact._stream_event('ndjson', 'impacts', {'delta_index': 2, 'impacts': []})
+
+    assert line.endswith("\n") and line.count("\n") == 1
+    assert json.loads(line) == {'event': 'impacts', 'delta_index': 2, 'impacts': []}
+
+
+def test_sse_event_names_the_event_and_carries_data():
+    frame = change_impact._stream_event('sse', 'summary', {'run_id': 'r', 'saved_results': 3})
+
+    event_line, data_line, blank, end = frame.split("\n")
+    assert event_line == "event: summary"
+    assert json.loads(data_line[len("data: "):]) == {'run_id': 'r', 'saved_results': 3}
+    assert (blank, end) == ("", "")
+
+
+def test_memoized_replay_emits_every_delta(monkeypatch):
+    impacts = [
+        {'delta_index': 0, 'qsp_id': 'a'},
+        {'delta_index': 0, 'qsp_id': 'b'},
+        {'delta_index': 2, 'qsp_id': 'c'},
+    ]
+
+    events = replay(monkeypatch, [{}, {}, {}, {}], impacts)
+
+    assert [event['event'] for event in events] == ['run', 'impacts', 'impacts', 'impacts', 'impacts', 'summary']
+    assert events[0] == {'event': 'run', 'run_id': 'run-1', 'total_deltas': 4, 'memoized': True}
+    per_delta = [(event['delta_index'], [impact['qsp_id'] for impact in event['impacts']]) for event in events[1:5]]
+    assert per_delta == [(0, ['a', 'b']), (1, []), (2, ['c']), (3, [])]
+    assert [impact['impact_index'] for impact in events[1]['impacts'] + events[3]['impacts']] == [0, 1, 2]
+    assert events[-1]['total_changes_analyzed'] == 4
+    assert events[-1]['total_impacts_found'] == 3
+
+
+def test_memoized_replay_without_impacts(monkeypatch):
+    events = replay(monkeypatch, [{}, {}], [])
+
+    assert [(event['event'], event.get('delta_index')) for event in events] == [
+        ('run', None), ('impacts', 0), ('impacts', 1), ('summary', None)
+    ]
+
+
+def test_rows_digest_tracks_row_identities_only():
+    rows = [{'impact_index': 0, 'id': 'a'}, {'impact_index': 1, 'id': 'b'}]
+    digest = rows_digest(rows)
+
+    # Order and reviewer edits don't matter
+    assert rows_digest(list(reversed(rows))) == digest
+    assert rows_digest([{**rows[0], 'is_reviewed': True}, rows[1]]) == digest
+    # Replaced, removed or added rows invalidate the memo
+    assert rows_digest([rows[0], {'impact_index': 1, 'id': 'c'}]) != digest
+    assert rows_digest(rows[:1]) != digest
+    assert rows_digest(rows + [{'impact_index': 2, 'id': 'd'}]) != digest
+    assert rows_digest([{'impact_index': 1, 'id': 'a'}, {'impact_index': 0, 'id': 'b'}]) != digest
@@ -0,0 +1,72 @@
+"""ClauseIndex must resolve exactly what the per-clause substring scan did"""
+import random
+
+from core.clause_index import ClauseIndex
+
+
+def baseline_covering(mappings, changed_clause):
+    """The substring scan ClauseIndex replaced: mappings grouped by iso_clause, first-seen order"""
+    groups = {}
+    for mapping in mappings:
+        groups.setdefault(mapping['iso_clause'], []).append(mapping)
+    return [
+        mapping
+        for clause, clause_mappings in groups.items()
+        if changed_clause in clause
+        for mapping in clause_mappings
+    ]
+
+
+def mapping(iso_clause, qsp_id='q'):
+    return {'iso_clause': iso_clause, 'qsp_id': qsp_id}
+
+
+def test_substring_matches_across_clause_numbers():
+    mappings = [
+        mapping("17.3 Risk control"),
+        mapping("7.3.2 Design inputs"),
+        mapping("7.30 Other"),
+        mapping("8.2 Monitoring"),
+    ]
+    index = ClauseIndex(mappings, ["7.3", "17.3", "8.2.1"])
+
+    assert index.covering_mappings("7.3") == baseline_covering(mappings, "7.3")
+    assert [m['iso_clause'] for m in index.covering_mappings("7.3")] == [
+        "17.3 Risk control", "7.3.2 Design inputs", "7.30 Other"
+    ]
+    assert [m['iso_clause'] for m in index.covering_mappings("17.3")] == ["17.3 Risk control"]
+    assert index.covering_mappings("8.2.1") == []
+
+
+def test_groups_keep_first_seen_order():
+    mappings = [
+        mapping("7.3 Design", 'a'),
+        mapping("4.2 Documents", 'b'),
+        mapping("7.3 Design", 'c'),
+        mapping("17.3 Risk", 'd'),
+    ]
+    index = ClauseIndex(mappings, ["7.3"])
+
+    assert [m['qsp_id'] for m in index.covering_mappings("7.3")] == ['a', 'c', 'd']
+    assert index.covering_mappings("7.3") == baseline_covering(mappings, "7.3")
+
+
+def test_repeated_substring_in_one_clause_is_reported_once():
+    mappings = [mapping("7.3 and 7.3.1 Design")]
+    index = ClauseIndex(mappings, ["7.3"])
+
+    assert index.covering_mappings("7.3") == mappings
+
+
+def test_randomized_against_substring_scan():
+    rng = random.Random(40)
+
+    def clause_number():
+        return '.'.join(str(rng.randint(1, 20)) for _ in range(rng.randint(1, 3)))
+
+    for _ in range(50):
+        mappings = [mapping(f"{clause_number()} Title", str(i)) for i in range(rng.randint(0, 30))]
+        changed = [clause_number() for _ in range(10)]
+        index = ClauseIndex(mappings, changed)
+        for changed_clause in changed:
+            assert index.covering_mappings(changed_clause) == baseline_covering(mappings, changed_clause)
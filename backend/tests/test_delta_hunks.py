@@ -0,0 +1,58 @@
+"""Sentence-level hunks of modified clauses"""
+from core.delta_hunks import delta_hunk_text, extract_hunks, split_sentences
+
+
+def test_split_sentences_normalizes_line_breaks():
+    assert split_sentences("The organization shall\nplan. Records  shall be kept.") == [
+        "The organization shall plan.", "Records shall be kept."
+    ]
+
+
+def test_replaced_middle_sentence_keeps_one_sentence_of_context():
+    old = "One is here. Two is here. Three is here. Four is here. Five is here."
+    new = "One is here. Two is here. Three changed now. Four is here. Five is here."
+
+    assert extract_hunks(old, new) == ["Two is here. Three changed now. Four is here."]
+
+
+def test_separate_changes_form_separate_hunks():
+    old = "A one. B two. C three. D four. E five. F six."
+    new = "A one. B changed. C three. D four. E five. F changed."
+
+    assert extract_hunks(old, new) == ["A one. B changed. C three.", "E five. F changed."]
+
+
+def test_delete_only_change_takes_removed_text_from_old():
+    old = "One is here. Two is removed. Three is here."
+    new = "One is here. Three is here."
+
+    assert extract_hunks(old, new) == ["One is here. Two is removed. Three is here."]
+    assert extract_hunks(old, new, context=0) == ["Two is removed."]
+
+
+def test_whitespace_only_change_has_no_hunks():
+    assert extract_hunks("One is here.\nTwo is here.", "One  is here. Two is\nhere.") == []
+    assert delta_hunk_text({
+        'change_type': 'modified',
+        'old_text': "One is here.\nTwo is here.",
+        'new_text': "One  is here. Two is\nhere."
+    }) == ''
+
+
+def test_stored_hunk_text_takes_precedence():
+    delta = {
+        'change_type': 'modified',
+        'old_text': "One. Two.",
+        'new_text': "One. Three.",
+        'hunk_text': "stored hunk"
+    }
+
+    assert delta_hunk_text(delta) == "stored hunk"
+
+
+def test_only_modified_deltas_have_hunk_text():
+    assert delta_hunk_text({'change_type': 'added', 'old_text': '', 'new_text': 'New clause.'}) == ''
+    assert delta_hunk_text({'change_type': 'modified', 'change_text': 'No old text.'}) == ''
+    assert delta_hunk_text({
+        'change_type': 'modified', 'old_text': 'One. Two.', 'new_text': 'One. Three.'
+    }) == 'One. Three.'
@@ -0,0 +1,157 @@
+"""Gap result rows split into snapshots on write and hydrated back on read"""
+import asyncio
+import copy
+
+from core.gap_result_store import GapResultStore
+
+
+class FakeSnapshots:
+    """gap_snapshots with the one query hydrate() issues"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def insert(self, snapshots):
+        for snapshot in snapshots:
+            self.docs.setdefault(snapshot['_id'], snapshot)
+
+    async def _cursor(self, ids, tenant_id):
+        for ref in ids:
+            doc = self.docs.get(ref)
+            if doc is not None and doc['tenant_id'] == tenant_id:
+                yield {'_id': ref, 'content': doc['content']}
+
+    def find(self, query, projection=None):
+        return self._cursor(query['_id']['$in'], query['tenant_id'])
+
+
+class FakeDB:
+    def __init__(self):
+        self.gap_snapshots = FakeSnapshots()
+
+
+def full_row(run_id="run-1", impact_index=0, section_text="4.2.3 Control of documents. " * 20, **fields):
+    return {
+        'tenant_id': 't1',
+        'run_id': run_id,
+        'impact_index': impact_index,
+        'clause_id': '4.2.3',
+        'confidence': 0.81,
+        'qsp_text_full': section_text,
+        'qsp_text': section_text[:300],
+        'old_text': 'Documents shall be controlled.',
+        'new_text': 'Documents and records shall be controlled.',
+        'downstream_impacts': [{'doc_id': 'WI-004'}],
+        'hierarchy_trace': {'level': 2},
+        **fields
+    }
+
+
+def store_with(rows):
+    """A store holding the snapshots of rows, and the rows as stored"""
+    store = GapResultStore(FakeDB())
+    stored_rows = []
+    for row in rows:
+        stored, snapshots = store.normalize(row)
+        store.db.gap_snapshots.insert(snapshots)
+        stored_rows.append(stored)
+    return store, stored_rows
+
+
+def test_normalize_then_hydrate_round_trips():
+    row = full_row()
+    store, stored_rows = store_with([copy.deepcopy(row)])
+
+    assert set(stored_rows[0]) == {
+        'tenant_id', 'run_id', 'impact_index', 'clause_id', 'confidence',
+        'section_ref', 'delta_ref', 'downstream_ref', 'hierarchy_ref'
+    }
+    assert asyncio.run(store.hydrate('t1', stored_rows)) == [row]
+
+
+def test_snapshots_are_scoped_to_the_tenant():
+    store, stored_rows = store_with([full_row()])
+
+    hydrated, = asyncio.run(store.hydrate('t2', stored_rows))
+
+    assert hydrated['qsp_text_full'] is None
+    assert hydrated['old_text'] is None
+    assert hydrated['qsp_text'] is None
+
+
+def test_qsp_text_is_rebuilt_only_with_its_section():
+    store, _ = store_with([])
+    # Only the delta text was moved out; the inline qsp_text stays as stored
+    stored, snapshots = store.normalize({
+        'tenant_id': 't1', 'run_id': 'r', 'impact_index': 0, 'qsp_text': 'inline preview',
+        'old_text': 'old', 'new_text': 'new'
+    })
+    store.db.gap_snapshots.insert(snapshots)
+    assert stored['qsp_text'] == 'inline preview'
+
+    hydrated, = asyncio.run(store.hydrate('t1', [stored]))
+    assert hydrated == {
+        'tenant_id': 't1', 'run_id': 'r', 'impact_index': 0, 'qsp_text': 'inline preview',
+        'old_text': 'old', 'new_text': 'new'
+    }
+
+    # A projection without the section reads neither qsp_text nor its source
+    sparse, = asyncio.run(store.hydrate('t1', [{'clause_id': '4.2.3'}]))
+    assert sparse == {'clause_id': '4.2.3'}
+
+
+def test_projection_reads_references_of_requested_fields():
+    store = GapResultStore()
+
+    assert store.projection(['clause_id', 'qsp_text']) == {'clause_id': 1, 'qsp_text': 1, 'section_ref': 1, '_id': 0}
+    assert store.projection(['new_text']) == {'new_text': 1, 'delta_ref': 1, '_id': 0}
+    assert store.projection(['_id', 'downstream_impacts', 'hierarchy_trace']) == {
+        '_id': 1, 'downstream_impacts': 1, 'hierarchy_trace': 1, 'downstream_ref': 1, 'hierarchy_ref': 1
+    }
+    assert store.projection(['confidence']) == {'confidence': 1, '_id': 0}
+
+
+def test_sparse_projection_hydrates_only_the_requested_group():
+    store, stored_rows = store_with([full_row()])
+    projection = store.projection(['clause_id', 'new_text'])
+    sparse = [{field: row[field] for field in projection if projection[field] and field in row} for row in stored_rows]
+
+    hydrated, = asyncio.run(store.hydrate('t1', sparse))
+
+    assert hydrated == {
+        'clause_id': '4.2.3',
+        'old_text': 'Documents shall be controlled.',
+        'new_text': 'Documents and records shall be controlled.'
+    }
+
+
+def test_legacy_inline_rows_pass_through_unchanged():
+    store, _ = store_with([])
+    legacy = {
+        'tenant_id': 't1', 'run_id': 'old-run', 'impact_index': 3,
+        'qsp_text': 'inline', 'qsp_text_full': 'inline section text', 'old_text': 'a', 'new_text': 'b'
+    }
+
+    assert asyncio.run(store.hydrate('t1', [copy.deepcopy(legacy)])) == [legacy]
+    # Already normalized rows pass through normalize too
+    stored, _ = store.normalize(full_row())
+    assert store.normalize(stored) == (stored, [])
+
+
+def test_identical_content_shares_one_snapshot():
+    section = "7.3 Design and development planning. " * 10
+    store, stored_rows = store_with([
+        full_row(run_id="run-1", impact_index=0, section_text=section),
+        full_row(run_id="run-1", impact_index=1, section_text=section, new_text='Other change.'),
+        full_row(run_id="run-2", impact_index=0, section_text=section),
+        full_row(run_id="run-2", impact_index=1, section_text="Another section."),
+    ])
+
+    section_refs = [row['section_ref'] for row in stored_rows]
+    assert section_refs[0] == section_refs[1] == section_refs[2] != section_refs[3]
+    delta_refs = [row['delta_ref'] for row in stored_rows]
+    assert delta_refs[0] == delta_refs[2] != delta_refs[1]
+    assert len([s for s in store.db.gap_snapshots.docs.values() if s['kind'] == 'section']) == 2
+
+    other_tenant, _ = store.normalize(full_row(tenant_id='t2', section_text=section))
+    assert other_tenant['section_ref'] != section_refs[0]
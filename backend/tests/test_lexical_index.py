@@ -0,0 +1,91 @@
+"""Clause-number parsing and lookup, and BM25 ranking of regulatory chunks"""
+from core.lexical_index import LexicalIndex, extract_clauses, parse_clause_query, tokenize
+
+
+def build_index(chunks):
+    """chunks: [(chunk_id, text, section_header)], positioned in document order"""
+    index = LexicalIndex()
+    index.add(
+        [chunk_id for chunk_id, _, _ in chunks],
+        [text for _, text, _ in chunks],
+        [{'chunk_id': position, 'section_header': header} for position, (_, _, header) in enumerate(chunks)]
+    )
+    return index
+
+
+def test_parse_clause_query_accepts_prefixes_and_short_titles():
+    assert parse_clause_query("7.3.2") == ("7.3.2", "")
+    assert parse_clause_query("Clause 7.3.2.") == ("7.3.2", "")
+    assert parse_clause_query("§ 820.30(C) design input") == ("820.30(c)", "design input")
+    assert parse_clause_query("section 4.2 - Documentation requirements") == ("4.2", "Documentation requirements")
+
+
+def test_parse_clause_query_rejects_prose():
+    assert parse_clause_query("design inputs for software") is None
+    assert parse_clause_query("7 steps of risk management") is None
+    assert parse_clause_query("7.3 what does the standard require for design and development planning") is None
+
+
+def test_extract_clauses_qualifies_subparagraphs():
+    text = "7.3.2 Design inputs\nInputs shall be determined.\n(a) functional requirements\n(b) regulatory requirements"
+
+    assert extract_clauses(text) == ["7.3.2", "7.3.2(a)", "7.3.2(b)"]
+    assert extract_clauses("(c) Design input. Each manufacturer shall...", "§ 820.30 Design controls") == [
+        "820.30", "820.30(c)"
+    ]
+    # Sub-paragraphs need an enclosing dotted clause; mid-line numbers are not headings
+    assert extract_clauses("(a) orphan\nSee clause 7.3 for details") == []
+
+
+def test_bm25_ranks_by_term_frequency_and_rarity():
+    index = build_index([
+        ("a", "Risk management file and records", ""),
+        ("b", "Risk control: risk reduction of each risk", ""),
+        ("c", "Design inputs and design outputs", ""),
+    ])
+
+    ranked = index.search("risk records", 10)
+    assert [chunk_id for chunk_id, _ in ranked] == ["a", "b"]
+    assert ranked[0][1] > ranked[1][1] > 0
+    assert [chunk_id for chunk_id, _ in index.search("risk", 10)] == ["b", "a"]
+    assert [chunk_id for chunk_id, _ in index.search("risk", 10, allow=lambda meta: meta['chunk_id'] != 1)] == ["a"]
+    assert index.search("the shall", 10) == []
+    assert tokenize("The ISO 14971 clause 7.3.2 shall") == ["iso", "14971", "clause", "7.3.2"]
+
+
+def test_removed_chunks_leave_the_index():
+    index = build_index([("a", "7.3 Design planning", ""), ("b", "Design review", "")])
+
+    index.remove(["a"])
+
+    assert len(index) == 1
+    assert [chunk_id for chunk_id, _ in index.search("design", 10)] == ["b"]
+    assert index.lookup_clause("7.3") == ([], False)
+
+
+def test_lookup_clause_exact_match():
+    index = build_index([
+        ("plan", "7.3 Design and development planning", ""),
+        ("inputs", "7.3.2 Design inputs", ""),
+        ("other", "7.30 Something else", ""),
+    ])
+
+    assert index.lookup_clause("7.3") == ([("plan", 0.0)], True)
+
+
+def test_lookup_clause_falls_back_to_subclauses():
+    index = build_index([
+        ("c", "820.30(c) Design input. Procedures shall ensure requirements are appropriate.", ""),
+        ("d", "820.30(d) Design output", ""),
+        ("other", "820.300 Unrelated", ""),
+    ])
+
+    assert index.lookup_clause("820.30(c)") == ([("c", 0.0)], True)
+    matches, exact = index.lookup_clause("820.30")
+    assert not exact
+    assert [chunk_id for chunk_id, _ in matches] == ["c", "d"]
+
+    # Trailing words of the query rank the sub-clauses
+    matches, _ = index.lookup_clause("820.30", "output")
+    assert [chunk_id for chunk_id, _ in matches] == ["d", "c"]
+    assert matches[0][1] > 0 == matches[1][1]
@@ -0,0 +1,55 @@
+"""Hybrid search in RAGService: clause lookups and reciprocal-rank fusion"""
+from core.lexical_index import LexicalIndex
+from core.rag_service import CLAUSE_MATCH_DISTANCE, SUBCLAUSE_MATCH_DISTANCE, RAGService
+
+
+def bare_service(index=None):
+    """A RAGService over one private lexical index, without a vector store"""
+    service = RAGService.__new__(RAGService)
+    service.rrf_k = 60
+    service._has_private_documents = lambda tenant_id, framework: True
+    service._collection_name = lambda tenant_id: "private"
+    service._shared_refs = lambda tenant_id, framework: {}
+    service._lexical_index = lambda name: index
+    return service
+
+
+def hit(chunk_id, **fields):
+    return {'chunk_id': chunk_id, 'text': chunk_id, 'metadata': {}, 'distance': None, **fields}
+
+
+def test_fuse_sums_reciprocal_ranks():
+    service = bare_service()
+    vector_hits = [hit("a", distance=0.1), hit("b", distance=0.2), hit("c", distance=0.3)]
+    keyword_hits = [hit("c", keyword_score=5.0), hit("d", keyword_score=4.0)]
+
+    fused = service._fuse(vector_hits, keyword_hits, 10)
+
+    # b and d tie on rank 2 of their lists; b was seen first
+    assert [h['chunk_id'] for h in fused] == ["c", "a", "b", "d"]
+    assert [h['match'] for h in fused] == ["both", "vector", "vector", "keyword"]
+    assert fused[0]['rrf_score'] == round(1 / 63 + 1 / 61, 6)
+    # Both sides: the vector hit's distance plus the keyword score
+    assert fused[0]['distance'] == 0.3
+    assert fused[0]['keyword_score'] == 5.0
+    assert service._fuse(vector_hits, keyword_hits, 2) == fused[:2]
+
+
+def test_fuse_breaks_equal_scores_by_first_seen():
+    fused = bare_service()._fuse([hit("a")], [hit("b")], 10)
+
+    assert [h['chunk_id'] for h in fused] == ["a", "b"]
+    assert fused[0]['rrf_score'] == fused[1]['rrf_score']
+
+
+def test_exact_clause_hits_rank_before_subclause_hits():
+    exact = LexicalIndex()
+    exact.add(["plan"], ["7.3 Design and development planning"], [{'chunk_id': 0}])
+    clause_hits, _ = bare_service(exact)._lexical_search("t", "7.3", None, 20)
+    assert [(h['chunk_id'], h['distance']) for h in clause_hits] == [("plan", CLAUSE_MATCH_DISTANCE)]
+
+    fallback = LexicalIndex()
+    fallback.add(["c"], ["820.30(c) Design input"], [{'chunk_id': 0}])
+    clause_hits, _ = bare_service(fallback)._lexical_search("t", "820.30", None, 20)
+    assert [(h['chunk_id'], h['distance']) for h in clause_hits] == [("c", SUBCLAUSE_MATCH_DISTANCE)]
+    assert SUBCLAUSE_MATCH_DISTANCE > CLAUSE_MATCH_DISTANCE
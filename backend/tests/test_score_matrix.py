@@ -0,0 +1,65 @@
+"""Score matrix encoding: order, top-N cut and match derivation"""
+import numpy as np
+
+from core.score_matrix import decode_scores, derive_matches, encode_scores, find_position
+
+
+def test_round_trip_is_best_first_with_positions():
+    positions = [3, 0, 7, 5]
+    scores = [0.41, 0.92, 0.13, 0.67]
+
+    matrix = encode_scores(positions, scores, 'table')
+    decoded_positions, decoded_scores = decode_scores(matrix)
+
+    assert matrix['table'] == 'table'
+    assert matrix['scored_sections'] == 4
+    assert decoded_positions.tolist() == [0, 5, 3, 7]
+    # float16 keeps ~3 significant digits
+    np.testing.assert_allclose(decoded_scores, [0.92, 0.67, 0.41, 0.13], atol=5e-4)
+
+
+def test_top_n_keeps_the_best_scores():
+    rng = np.random.default_rng(49)
+    scores = rng.random(100)
+    positions = np.arange(100)
+
+    matrix = encode_scores(positions, scores, 'table', top_n=10)
+    decoded_positions, decoded_scores = decode_scores(matrix)
+
+    best = np.argsort(-scores)[:10]
+    assert matrix['scored_sections'] == 100
+    assert decoded_positions.tolist() == best.tolist()
+    np.testing.assert_allclose(decoded_scores, scores[best], atol=5e-4)
+
+
+def test_ties_keep_input_order():
+    matrix = encode_scores([4, 2, 9], [0.5, 0.5, 0.5], 'table')
+
+    assert decode_scores(matrix)[0].tolist() == [4, 2, 9]
+
+
+def test_empty_scores():
+    positions, scores = decode_scores(encode_scores([], [], 'table'))
+
+    assert len(positions) == 0 and len(scores) == 0
+
+
+def test_derive_matches_applies_threshold_then_top_k():
+    scores = np.array([0.9, 0.8, 0.7, 0.6, 0.5], dtype=np.float32)
+
+    assert derive_matches(scores, 0.65, 5) == 3
+    assert derive_matches(scores, 0.65, 2) == 2
+    assert derive_matches(scores, 0.95, 5) == 0
+    assert derive_matches(scores, 0.0, 0) == 0
+
+
+def test_find_position_by_key_or_path():
+    entries = [
+        {'doc_id': 'a', 'section_key': 'k1', 'section_path': '4.1'},
+        {'doc_id': 'b', 'section_key': 'k2', 'section_path': '4.1'},
+    ]
+
+    assert find_position(entries, section_key='k2') == 1
+    assert find_position(entries, section_path='4.1') == 0
+    assert find_position(entries, section_path='4.1', doc_id='b') == 1
+    assert find_position(entries, section_key='missing') is None
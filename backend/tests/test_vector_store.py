@@ -0,0 +1,155 @@
+"""NumPy vector store: row journal, tombstones, compaction and where filters"""
+import json
+import os
+
+import numpy as np
+
+from core.vector_store import NumpyCollection, NumpyVectorStore
+
+
+def vec(*values):
+    return [float(v) for v in values]
+
+
+def open_collection(path, metadata=None):
+    return NumpyCollection(str(path), "docs", metadata)
+
+
+def generation(path):
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)['generation']
+
+
+def test_upsert_overwrites_existing_rows_in_place(tmp_path):
+    collection = open_collection(tmp_path)
+    collection.upsert(["a", "b"], [vec(1, 0), vec(0, 1)], ["doc a", "doc b"], [{'k': 1}, {'k': 2}])
+    collection.upsert(["b", "c"], [vec(2, 2), vec(3, 3)], ["doc b2", "doc c"], [{'k': 20}, {'k': 3}])
+
+    assert collection.count() == 3
+    result = collection.get(ids=["a", "b", "c"], include=("documents", "metadatas", "embeddings"))
+    assert result['documents'] == ["doc a", "doc b2", "doc c"]
+    assert result['metadatas'] == [{'k': 1}, {'k': 20}, {'k': 3}]
+    assert result['embeddings'][1] == vec(2, 2)
+    # The overwrite reused b's row instead of appending one
+    assert len(collection._ids) == 3
+
+
+def test_duplicate_ids_in_one_batch_keep_the_last_occurrence(tmp_path):
+    collection = open_collection(tmp_path)
+    collection.upsert(["a", "a"], [vec(1, 0), vec(0, 1)], ["first", "second"], [{'k': 1}, {'k': 2}])
+
+    assert collection.count() == 1
+    assert collection.get()['documents'] == ["second"]
+    assert collection.get(where={'k': 1})['ids'] == []
+
+    collection.upsert(["a", "a"], [vec(5, 5), vec(6, 6)], ["third", "fourth"], [{'k': 3}, {'k': 4}])
+    assert collection.get(include=("documents", "embeddings")) == {
+        'ids': ["a"], 'documents': ["fourth"], 'embeddings': [vec(6, 6)]
+    }
+
+    reopened = open_collection(tmp_path)
+    assert reopened.get()['documents'] == ["fourth"]
+
+
+def test_delete_tombstones_rows_until_a_quarter_is_dead(tmp_path):
+    collection = open_collection(tmp_path)
+    ids = [f"id{i}" for i in range(8)]
+    collection.upsert(ids, [vec(i, 0) for i in range(8)], ids, [{'n': i} for i in range(8)])
+
+    collection.delete(ids=["id1", "id2"])
+
+    assert collection.count() == 6
+    assert "id1" not in collection.get()['ids']
+    assert collection.get(ids=["id1", "id3"])['ids'] == ["id3"]
+    # Tombstoned only: rows stay in the current generation
+    assert generation(tmp_path) == 0
+    assert len(collection._ids) == 8
+    assert list(collection._alive) == [True, False, False] + [True] * 5
+
+
+def test_compaction_writes_live_rows_into_the_next_generation(tmp_path):
+    collection = open_collection(tmp_path)
+    ids = [f"id{i}" for i in range(8)]
+    collection.upsert(ids, [vec(i, 0) for i in range(8)], ids, [{'n': i} for i in range(8)])
+
+    collection.delete(where={'n': {'$in': [0, 2, 4]}})
+
+    assert generation(tmp_path) == 1
+    assert sorted(os.listdir(tmp_path)) == ["meta.json", "rows.1.jsonl", "vectors.1.f32"]
+    assert collection.get()['ids'] == ["id1", "id3", "id5", "id6", "id7"]
+    assert collection._alive.all()
+    hits = collection.query([vec(5, 0)], n_results=1)
+    assert hits['ids'] == [["id5"]]
+    assert hits['distances'] == [[0.0]]
+
+    reopened = open_collection(tmp_path)
+    assert reopened.get(include=("embeddings",))['embeddings'] == [vec(i, 0) for i in (1, 3, 5, 6, 7)]
+
+
+def test_reopen_replays_the_journal(tmp_path):
+    collection = open_collection(tmp_path, {'hnsw:space': 'cosine'})
+    collection.upsert(["a", "b", "c"], [vec(1, 0), vec(0, 1), vec(1, 1)], ["A", "B", "C"],
+                      [{'k': 'x'}, {'k': 'y'}, {'k': 'z'}])
+    collection.upsert(["b"], [vec(0, 2)], ["B2"], [{'k': 'y2'}])
+    collection.delete(ids=["c"])
+
+    reopened = open_collection(tmp_path)
+
+    assert reopened.metadata == {'hnsw:space': 'cosine'}
+    assert reopened.count() == 2
+    assert reopened.get(include=("documents", "metadatas", "embeddings")) == {
+        'ids': ["a", "b"],
+        'documents': ["A", "B2"],
+        'metadatas': [{'k': 'x'}, {'k': 'y2'}],
+        'embeddings': [vec(1, 0), vec(0, 2)],
+    }
+
+
+def test_reopen_drops_a_torn_journal_line_and_its_vectors(tmp_path):
+    collection = open_collection(tmp_path)
+    collection.upsert(["a"], [vec(1, 0)], ["A"], [{}])
+    # A crash mid-upsert: the vector was appended, its journal line cut short
+    with open(tmp_path / "vectors.0.f32", "ab") as f:
+        f.write(np.array(vec(0, 1), dtype=np.float32).tobytes())
+    with open(tmp_path / "rows.0.jsonl", "a") as f:
+        f.write('{"r": 1, "id": "b", "do')
+
+    reopened = open_collection(tmp_path)
+
+    assert reopened.get()['ids'] == ["a"]
+    assert os.path.getsize(tmp_path / "vectors.0.f32") == 2 * 4
+    reopened.upsert(["b"], [vec(0, 3)], ["B"], [{}])
+    assert open_collection(tmp_path).get(include=("embeddings",))['embeddings'] == [vec(1, 0), vec(0, 3)]
+
+
+def test_rename_moves_an_open_collection(tmp_path):
+    store = NumpyVectorStore(str(tmp_path))
+    collection = store.get_or_create_collection("old")
+    collection.upsert(["a"], [vec(1, 0)], ["A"], [{}])
+
+    store.rename_collection("old", "new")
+    collection.upsert(["b"], [vec(0, 1)], ["B"], [{}])
+
+    assert store.list_collections() == ["new"]
+    assert store.get_collection("new") is collection
+    assert collection.path == os.path.join(store.root, "new")
+    reopened = NumpyVectorStore(str(tmp_path)).get_collection("new")
+    assert reopened.get(include=("documents", "embeddings")) == {
+        'ids': ["a", "b"], 'documents': ["A", "B"], 'embeddings': [vec(1, 0), vec(0, 1)]
+    }
+
+
+def test_where_filters(tmp_path):
+    collection = open_collection(tmp_path)
+    metadatas = [{'tenant': 't1', 'kind': 'qsp'}, {'tenant': 't1', 'kind': 'reg'},
+                 {'tenant': 't2', 'kind': 'qsp'}, {'tenant': 't2'}]
+    collection.upsert(["a", "b", "c", "d"], [vec(i, 1) for i in range(4)], None, metadatas)
+
+    assert collection.get(where={'tenant': 't1'})['ids'] == ["a", "b"]
+    assert collection.get(where={'tenant': {'$eq': 't2'}})['ids'] == ["c", "d"]
+    assert collection.get(where={'kind': {'$ne': 'qsp'}})['ids'] == ["b", "d"]
+    assert collection.get(where={'kind': {'$in': ['reg', None]}})['ids'] == ["b", "d"]
+    assert collection.get(where={'kind': {'$nin': ['qsp']}})['ids'] == ["b", "d"]
+    assert collection.get(where={'$and': [{'tenant': 't2'}, {'kind': 'qsp'}]})['ids'] == ["c"]
+    assert collection.get(where={'$or': [{'tenant': 't1'}, {'kind': 'qsp'}]})['ids'] == ["a", "b", "c"]
+    assert collection.query([vec(0, 1)], n_results=5, where={'tenant': 't2'})['ids'] == [["c", "d"]]